@@ -5,7 +5,7 @@ Robot Expert Agent with A2A Communication
 AI agent specialized in robotics, automation systems, and robotic engineering.
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from datetime import datetime
@@ -14,7 +14,17 @@ import os
 import re
 import httpx
 import logging
-from typing import Optional, Dict, Any
+import asyncio
+import threading
+import time
+import hashlib
+import json
+import math
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from collections import OrderedDict, deque
+from typing import Optional, Dict, Any, Callable, AsyncIterator, Awaitable
+from concurrent.futures import ThreadPoolExecutor
 
 from crewai import Agent, Task, Crew, LLM
 from crewai.tools import BaseTool
@@ -22,6 +32,16 @@ from crewai_tools import FileReadTool, SerperDevTool, WebsiteSearchTool, Youtube
 from pydantic import Field
 from typing import Type
 
+from local_transport import local_transport
+
+# HTTP/2 for the shared outbound client needs the h2 package (httpx[http2]);
+# without it the client falls back to HTTP/1.1 keep-alive
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
 load_dotenv()
 
 # ==============================================================================
@@ -90,12 +110,16 @@ class QueryResponse(BaseModel):
     answer: str
     timestamp: str
     processing_time: float
+    queue_wait_time: float = 0.0  # Seconds spent waiting for an admission slot
 
 class A2AMessage(BaseModel):
     content: Dict[str, Any]
     role: str = "user"
     conversation_id: str
     agent_id: Optional[str] = None  # Which agent sent this message
+    message_id: Optional[str] = None  # Same on every hop (dedupe / tracing)
+    hops: int = 0  # How many times the message has been forwarded
+    visited: list[str] = []  # Agents that forwarded it, in order
 
 class A2AResponse(BaseModel):
     content: Dict[str, Any]
@@ -250,99 +274,821 @@ my_agent_twin = Agent(
 )
 
 # ==============================================================================
-# Registry Helper Functions
+# Crew Setup
 # ==============================================================================
 
-async def fetch_agents_from_registry():
-    """
-    Fetch all registered agents from the central registry
-    Updates the KNOWN_AGENTS dictionary with username -> A2A endpoint mappings
-    """
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(REGISTRY_URL)
+def build_crew() -> Crew:
+    """Build one pooled crew; {question} is filled in at kickoff time"""
+    agent = my_agent_twin.copy()
+    task = Task(
+        description="""
+        As a robotics expert, answer this question: {question}
+        
+        Use your robotics knowledge and tools to provide detailed technical information.
+        Include relevant details like specifications, design considerations, or implementation guidance.
+        Use your memory to recall previous robotics discussions and user projects.
+        """,
+        expected_output="Expert robotics guidance with technical details and practical recommendations",
+        agent=agent,
+    )
+    return Crew(
+        agents=[agent],
+        tasks=[task],
+        memory=True,
+        verbose=False,
+    )
+
+# ==============================================================================
+# Crew Execution Layer
+# ==============================================================================
+# crew.kickoff() is blocking (LLM calls, tool I/O). Calling it directly from an
+# async endpoint freezes the event loop - even /health stops answering. Every
+# crew run is dispatched to a bounded thread pool instead, so the loop stays
+# responsive and the number of concurrent crew runs is capped.
+
+CREW_WORKERS = int(os.getenv("CREW_WORKERS", "4"))
+
+class CrewExecutor:
+    """Runs blocking crew work on a bounded thread pool"""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crew")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _job(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on the pool and await its result"""
+        with self._lock:
+            self.queued += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self._job, fn, args, kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "busy_workers": self.running,
+                "idle_workers": self.max_workers - self.running,
+                "queue_depth": self.queued,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+crew_executor = CrewExecutor(CREW_WORKERS)
+
+# ==============================================================================
+# Crew Pool
+# ==============================================================================
+# Building a Crew with memory=True sets up all of its memory storages, which is
+# too slow to repeat on every request - but one shared crew is not safe to run
+# concurrently. The pool pre-builds crews (memory already attached) and each
+# request checks one out for the duration of its kickoff.
+
+CREW_POOL_SIZE = int(os.getenv("CREW_POOL_SIZE", str(CREW_WORKERS)))
+CREW_POOL_WARM = int(os.getenv("CREW_POOL_WARM", "1"))
+
+class CrewPool:
+    """Bounded pool of pre-built crews"""
+
+    def __init__(self, factory: Callable[[], Crew], max_size: int):
+        self.factory = factory
+        self.max_size = max_size
+        self._idle: list[Crew] = []
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.checkouts = 0
+        self.reused = 0
+        self.build_seconds = 0.0
+
+    def _build(self) -> Crew:
+        start = time.perf_counter()
+        crew = self.factory()
+        with self._lock:
+            self.created += 1
+            self.build_seconds += time.perf_counter() - start
+        return crew
+
+    def warm_up(self, count: int):
+        """Pre-build up to `count` crews so the first requests skip setup"""
+        for _ in range(max(0, min(count, self.max_size - self.created))):
+            crew = self._build()
+            with self._lock:
+                self._idle.append(crew)
+
+    def kickoff(self, inputs: Dict[str, Any]) -> Any:
+        """
+        Check out a crew, run it, and return it to the pool
+
+        Blocking - call it through crew_executor so it runs on a worker thread.
+        """
+        with self._slots:
+            with self._lock:
+                self.checkouts += 1
+                crew = self._idle.pop() if self._idle else None
+                if crew is not None:
+                    self.reused += 1
+            if crew is None:
+                crew = self._build()
+            try:
+                return crew.kickoff(inputs=inputs)
+            finally:
+                with self._lock:
+                    self._idle.append(crew)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            avg_build = self.build_seconds / self.created if self.created else 0.0
+            return {
+                "max_size": self.max_size,
+                "created": self.created,
+                "idle": len(self._idle),
+                "in_use": self.created - len(self._idle),
+                "checkouts": self.checkouts,
+                "reused": self.reused,
+                "avg_build_ms": round(avg_build * 1000, 1),
+                "setup_saved_s": round(self.reused * avg_build, 2),
+            }
+
+crew_pool = CrewPool(build_crew, CREW_POOL_SIZE)
+
+# ==============================================================================
+# Admission Control
+# ==============================================================================
+# Without a limit, requests pile up behind slow LLM calls until every client
+# times out. At most MAX_IN_FLIGHT requests are processed at once and at most
+# MAX_QUEUE wait for a slot; beyond that we fail fast with 429 + Retry-After.
+
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", str(CREW_WORKERS)))
+MAX_QUEUE = int(os.getenv("MAX_QUEUE", "16"))
+
+class AdmissionController:
+    """Bounded in-flight limit with a bounded wait queue"""
+
+    def __init__(self, max_in_flight: int, max_queue: int):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.avg_service_s = 5.0  # EWMA of time spent holding a slot
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up for a new request"""
+        backlog = (self.waiting + 1) / self.max_in_flight
+        return max(1, math.ceil(backlog * self.avg_service_s))
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a slot for the duration of the block; yields queue wait seconds"""
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Server is at capacity, please retry later",
+                headers={"Retry-After": str(self.retry_after())}
+            )
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        admitted_at = time.perf_counter()
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield admitted_at - queued_at
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            service_s = time.perf_counter() - admitted_at
+            self.avg_service_s = 0.8 * self.avg_service_s + 0.2 * service_s
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_service_s": round(self.avg_service_s, 2),
+        }
+
+    def load_hint(self) -> Dict[str, Any]:
+        """Current load, published at GET /load for callers' endpoint resolvers"""
+        busy = self.in_flight + self.waiting
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "capacity": self.max_in_flight,
+            "utilization": round(busy / self.max_in_flight, 2),
+            "avg_service_s": round(self.avg_service_s, 2),
+            "expected_wait_s": round(max(0, busy + 1 - self.max_in_flight) / self.max_in_flight * self.avg_service_s, 2),
+        }
+
+admission = AdmissionController(MAX_IN_FLIGHT, MAX_QUEUE)
+
+async def admit_request() -> AsyncIterator[float]:
+    """FastAPI dependency - holds an admission slot for the whole request"""
+    async with admission.admit() as queue_wait:
+        yield queue_wait
+
+# ==============================================================================
+# Request Coalescing (Single-Flight)
+# ==============================================================================
+# During battle rounds many callers ask the same question within the same
+# second. Identical concurrent questions are coalesced: the first one runs the
+# crew, the rest wait on that same execution and share its response.
+
+# Fingerprint of everything that shapes an answer besides the question itself
+PERSONA_HASH = hashlib.sha256("\n".join([
+    my_agent_twin.role,
+    my_agent_twin.goal,
+    my_agent_twin.backstory,
+    ",".join(sorted(tool.name for tool in available_tools)),
+]).encode()).hexdigest()[:16]
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+def coalesce_key(question: str) -> str:
+    return f"{PERSONA_HASH}:{normalize_question(question)}"
+
+class SingleFlight:
+    """Runs at most one execution per key; concurrent callers share its result"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is None:
+            # Run as its own task so a disconnecting caller can't cancel the
+            # execution the other callers are waiting on
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,  # crew runs (and LLM calls) saved
+        }
+
+single_flight = SingleFlight()
+
+# ==============================================================================
+# Outbound HTTP Client
+# ==============================================================================
+# One application-lifetime httpx client for every outbound call (A2A messages,
+# registry fetches). Its per-host keep-alive pools mean a hop to another agent
+# reuses an open connection instead of paying a new TCP+TLS handshake, and with
+# HTTP/2 concurrent messages to the same agent share one connection. At startup
+# it pre-connects to the agents we talk to most.
+
+HTTP2_ENABLED = H2_AVAILABLE and os.getenv("HTTP2", "true").lower() == "true"
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_PRECONNECT = os.getenv("HTTP_PRECONNECT", "")  # comma-separated agent ids or URLs
+HTTP_PRECONNECT_MAX = int(os.getenv("HTTP_PRECONNECT_MAX", "8"))
+
+class HttpClientManager:
+    """Shared pooled httpx client, tracking connection reuse and handshake time"""
+
+    def __init__(self, http2: bool, max_connections: int, max_keepalive: int, keepalive_expiry: float):
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+        self.connections = 0
+        self.handshake_seconds = 0.0
+        self.hosts: Dict[str, int] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=30.0)
+        return self._client
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        handshake: Dict[str, float] = {}
+
+        async def trace(event: str, info: Dict[str, Any]):
+            # httpcore only emits connect events when it opens a new connection
+            if event == "connection.connect_tcp.started":
+                handshake["start"] = time.perf_counter()
+            elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                handshake["end"] = time.perf_counter()
+
+        extensions = {**kwargs.pop("extensions", {}), "trace": trace}
+        try:
+            return await self.client.request(method, url, extensions=extensions, **kwargs)
+        finally:
+            host = httpx.URL(url).host
+            self.requests += 1
+            self.hosts[host] = self.hosts.get(host, 0) + 1
+            if "start" in handshake:
+                self.connections += 1
+                self.handshake_seconds += handshake.get("end", handshake["start"]) - handshake["start"]
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def preconnect(self, urls: list[str]) -> int:
+        """Open pooled connections to each URL's host (via /health); returns hosts reached"""
+        origins = {str(httpx.URL(url).copy_with(path="/health", query=None, fragment=None)) for url in urls}
+        results = await asyncio.gather(
+            *(self.get(origin, timeout=5.0) for origin in origins),
+            return_exceptions=True
+        )
+        return sum(1 for result in results if not isinstance(result, Exception))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        reused = self.requests - self.connections
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "requests": self.requests,
+            "new_connections": self.connections,
+            "reuse_rate": round(reused / self.requests, 3) if self.requests else 0.0,
+            "avg_handshake_ms": round(self.handshake_seconds / self.connections * 1000, 1) if self.connections else 0.0,
+            "top_hosts": dict(sorted(self.hosts.items(), key=lambda item: -item[1])[:10]),
+        }
+
+http_clients = HttpClientManager(HTTP2_ENABLED, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY)
+
+def preconnect_targets() -> list[str]:
+    """Agents to pre-connect to: HTTP_PRECONNECT, or the first known agents"""
+    names = [name.strip() for name in HTTP_PRECONNECT.split(",") if name.strip()]
+    if not names:
+        names = list(KNOWN_AGENTS)[:HTTP_PRECONNECT_MAX]
+    return [KNOWN_AGENTS.get(name, name) for name in names if name in KNOWN_AGENTS or name.startswith("http")]
+
+# ==============================================================================
+# Circuit Breakers & Health Probing
+# ==============================================================================
+# When a known agent is down, every message to it used to wait out the full
+# request timeout. Each agent gets a circuit breaker:
+# - closed:    requests flow; the last BREAKER_WINDOW outcomes are tracked
+# - open:      too many errors/timeouts - requests fail immediately
+# - half-open: after BREAKER_OPEN_SECONDS one trial request is let through;
+#              success closes the circuit, failure re-opens it
+# A background prober also hits every agent's /health each
+# HEALTH_PROBE_INTERVAL seconds, so dead agents are caught (and revived
+# agents let back in) without a user message paying for it.
+
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "3"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "3"))
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an agent whose circuit is open"""
+
+class CircuitBreaker:
+    """closed / open / half-open breaker for one agent"""
+
+    def __init__(self, window: int, min_calls: int, error_rate: float, open_seconds: float):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.outcomes: deque = deque(maxlen=window)
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.fast_failures = 0
+        self.last_error: Optional[str] = None
+        self.healthy: Optional[bool] = None  # last /health probe result
+        self.probed_at: Optional[float] = None
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - time.time())
+
+    def check(self):
+        """Raise CircuitOpenError unless a request may go through now"""
+        if self.state == "open" and self.retry_in() == 0:
+            self.state = "half_open"
+        if self.state == "open" or (self.state == "half_open" and self.trial_in_flight):
+            self.fast_failures += 1
+            raise CircuitOpenError(f"circuit open after repeated failures (retry in {self.retry_in():.0f}s)")
+        if self.state == "half_open":
+            self.trial_in_flight = True
+
+    def record(self, ok: bool, error: Optional[str] = None):
+        if not ok:
+            self.last_error = error
+        if self.state == "half_open":
+            self.trial_in_flight = False
+            self._close() if ok else self._open()
+            return
+        self.outcomes.append(ok)
+        failures = self.outcomes.count(False)
+        if self.state == "closed" and len(self.outcomes) >= self.min_calls \
+                and failures / len(self.outcomes) >= self.error_rate:
+            self._open()
+
+    def abandon(self):
+        """The request was cancelled before it could tell us anything"""
+        self.trial_in_flight = False
+
+    def probed(self, healthy: bool, error: Optional[str] = None):
+        self.healthy = healthy
+        self.probed_at = time.time()
+        if not healthy:
+            self.record(False, error)
+        elif self.state == "open":
+            # Back up - let the next real request through as the trial
+            self.state = "half_open"
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.time()
+
+    def _close(self):
+        self.state = "closed"
+        self.outcomes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "healthy": self.healthy,
+            "probe_age_s": round(time.time() - self.probed_at, 1) if self.probed_at else None,
+            "error_rate": round(self.outcomes.count(False) / len(self.outcomes), 2) if self.outcomes else 0.0,
+            "retry_in_s": round(self.retry_in(), 1) if self.state == "open" else 0.0,
+            "fast_failures": self.fast_failures,
+            "last_error": self.last_error,
+        }
+
+class AgentHealthMonitor:
+    """Circuit breakers for KNOWN_AGENTS plus the background /health prober"""
+
+    def __init__(self, interval: float, timeout: float):
+        self.interval = interval
+        self.timeout = timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.probes = 0
+
+    def breaker(self, agent_id: str) -> CircuitBreaker:
+        if agent_id not in self.breakers:
+            self.breakers[agent_id] = CircuitBreaker(
+                BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_ERROR_RATE, BREAKER_OPEN_SECONDS
+            )
+        return self.breakers[agent_id]
+
+    @staticmethod
+    def is_failure(error: Exception) -> bool:
+        """Timeouts, connection errors and 5xx/429 count against an agent; other 4xx don't"""
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500 or error.response.status_code == 429
+        return isinstance(error, (httpx.HTTPError, asyncio.TimeoutError))
+
+    async def probe(self, agent_id: str, agent_url: str):
+        health_url = str(httpx.URL(agent_url).copy_with(path="/health", query=None, fragment=None))
+        try:
+            response = await http_clients.get(health_url, timeout=self.timeout)
             response.raise_for_status()
-            data = response.json()
-            
-            # Handle both old and new API formats
-            agents = data.get("agents", [])
-            if not agents and isinstance(data, list):
-                # New API might return list directly
-                agents = data
-            
-            print(f"📥 Fetched {len(agents)} agents from registry")
-            
-            # Update KNOWN_AGENTS with username -> A2A endpoint mapping
-            for agent in agents:
-                # Support both old (username/url) and new (agent_id/endpoint) formats
-                username = agent.get("agent_id") or agent.get("username")
-                url = agent.get("endpoint") or agent.get("url", "")
+            self.breaker(agent_id).probed(True)
+        except Exception as e:
+            self.breaker(agent_id).probed(False, f"health probe: {str(e) or type(e).__name__}")
+        self.probes += 1
+
+    async def probe_all(self):
+        semaphore = asyncio.Semaphore(16)
+
+        async def bounded(agent_id: str, agent_url: str):
+            async with semaphore:
+                await self.probe(agent_id, agent_url)
+
+        await asyncio.gather(*(bounded(agent_id, url) for agent_id, url in list(KNOWN_AGENTS.items())))
+
+    async def _probe_loop(self):
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._probe_loop())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def health(self) -> Dict[str, Any]:
+        return {agent_id: self.breaker(agent_id).stats() for agent_id in KNOWN_AGENTS}
+
+    def stats(self) -> Dict[str, Any]:
+        states = [breaker.state for breaker in self.breakers.values()]
+        return {
+            "closed": states.count("closed"),
+            "open": states.count("open"),
+            "half_open": states.count("half_open"),
+            "fast_failures": sum(breaker.fast_failures for breaker in self.breakers.values()),
+            "probes": self.probes,
+            "probe_interval_s": self.interval,
+        }
+
+agent_health = AgentHealthMonitor(HEALTH_PROBE_INTERVAL, HEALTH_PROBE_TIMEOUT)
+
+# ==============================================================================
+# Registry Helper Functions
+# ==============================================================================
+
+# Registry sync: boot from the last saved snapshot (no waiting on the
+# registry), then refresh in the background every REGISTRY_SYNC_INTERVAL
+# seconds with conditional requests (ETag / If-Modified-Since). If the
+# registry supports deltas, set REGISTRY_DELTA_PARAM (e.g. "updated_since")
+# and only changed entries are fetched. Each refresh builds a new mapping and
+# rebinds KNOWN_AGENTS in one step, so readers never see a half-updated dict.
+REGISTRY_SYNC_INTERVAL = int(os.getenv("REGISTRY_SYNC_INTERVAL", "60"))
+REGISTRY_SNAPSHOT_PATH = os.getenv("REGISTRY_SNAPSHOT_PATH", os.path.join("data", "registry.json"))
+REGISTRY_DELTA_PARAM = os.getenv("REGISTRY_DELTA_PARAM", "")
+
+# Built-in agents and agents added via POST /agents/register survive
+# registry refreshes
+SEED_AGENTS = dict(KNOWN_AGENTS)
+REGISTERED_AGENTS: Dict[str, str] = {}
+
+def registry_entry(agent: Dict[str, Any]) -> tuple[Optional[str], str]:
+    """(username, A2A URL) of a registry entry; username is None if unusable"""
+    # Support both old (username/url) and new (agent_id/endpoint) formats
+    username = agent.get("agent_id") or agent.get("username")
+    url = agent.get("endpoint") or agent.get("url", "")
+    
+    # Skip if no username or if it's this agent
+    if not username or username == MY_AGENT_USERNAME:
+        return None, url
+    
+    # Ensure URL ends with /a2a
+    if not url.endswith("/a2a"):
+        url = url.rstrip("/") + "/a2a"
+    return username, url
+
+class RegistrySync:
+    """Background synchronizer between the central registry and KNOWN_AGENTS"""
+
+    def __init__(self, url: str, interval: int, snapshot_path: str):
+        self.url = url
+        self.interval = interval
+        self.snapshot_path = snapshot_path
+        self.agents: Dict[str, str] = {}  # registry view (without manual registrations)
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.synced_at: Optional[float] = None
+        self.syncs = 0
+        self.not_modified = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def load_snapshot(self) -> bool:
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.agents = snapshot.get("agents", {})
+        self.etag = snapshot.get("etag")
+        self.last_modified = snapshot.get("last_modified")
+        self.synced_at = snapshot.get("synced_at")
+        self._publish()
+        return True
+
+    def _save_snapshot(self):
+        if os.path.dirname(self.snapshot_path):
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "agents": self.agents,
+                "etag": self.etag,
+                "last_modified": self.last_modified,
+                "synced_at": self.synced_at,
+            }, f)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _publish(self):
+        global KNOWN_AGENTS
+        KNOWN_AGENTS = {**SEED_AGENTS, **self.agents, **REGISTERED_AGENTS}
+
+    async def sync(self) -> bool:
+        """One conditional (or delta) fetch; KNOWN_AGENTS is swapped only on success"""
+        headers = {}
+        params = {}
+        if self.agents and self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.agents and self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        delta = bool(REGISTRY_DELTA_PARAM and self.agents and self.synced_at)
+        if delta:
+            params[REGISTRY_DELTA_PARAM] = datetime.fromtimestamp(self.synced_at).isoformat()
+        try:
+            started_at = time.time()
+            response = await http_clients.get(self.url, headers=headers, params=params, timeout=10.0)
+            if response.status_code == 304:
+                self.not_modified += 1
+            else:
+                response.raise_for_status()
+                data = response.json()
                 
-                # Skip if no username or if it's this agent
-                if not username or username == MY_AGENT_USERNAME:
-                    continue
+                # Handle both old and new API formats
+                entries = data.get("agents", []) if isinstance(data, dict) else data
                 
-                # Ensure URL ends with /a2a
-                if not url.endswith("/a2a"):
-                    url = url.rstrip("/") + "/a2a"
+                agents = dict(self.agents) if delta else {}
+                for agent in entries:
+                    username, url = registry_entry(agent)
+                    if not username:
+                        continue
+                    if agent.get("deleted") or agent.get("status") == "deleted":
+                        agents.pop(username, None)
+                    else:
+                        agents[username] = url
                 
-                KNOWN_AGENTS[username] = url
-                print(f"   ✅ Registered: @{username} -> {url}")
-            
+                added = agents.keys() - self.agents.keys()
+                removed = self.agents.keys() - agents.keys()
+                if added or removed:
+                    print(f"📥 Registry sync: {len(agents)} agents (+{len(added)} / -{len(removed)})")
+                self.agents = agents
+                self.etag = response.headers.get("ETag")
+                self.last_modified = response.headers.get("Last-Modified")
+                self.syncs += 1
+                self._publish()
+            self.synced_at = started_at
+            self.last_error = None
+            await asyncio.to_thread(self._save_snapshot)
             return True
-    except Exception as e:
-        print(f"⚠️ Failed to fetch agents from registry: {str(e)}")
-        return False
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            print(f"⚠️ Failed to sync agents from registry (keeping {len(KNOWN_AGENTS)}): {str(e)}")
+            return False
+
+    async def _sync_loop(self):
+        while True:
+            await self.sync()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._sync_loop())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "agents": len(KNOWN_AGENTS),
+            "from_registry": len(self.agents),
+            "registered_here": len(REGISTERED_AGENTS),
+            "age_seconds": round(time.time() - self.synced_at, 1) if self.synced_at else None,
+            "interval": self.interval,
+            "syncs": self.syncs,
+            "not_modified": self.not_modified,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+registry_sync = RegistrySync(REGISTRY_URL, REGISTRY_SYNC_INTERVAL, REGISTRY_SNAPSHOT_PATH)
+
+async def fetch_agents_from_registry():
+    """
+    Fetch registered agents from the central registry (one sync)
+    Updates KNOWN_AGENTS with username -> A2A endpoint mappings
+    """
+    return await registry_sync.sync()
 
 # ==============================================================================
 # A2A Helper Functions
 # ==============================================================================
 
-async def send_message_to_agent(agent_id: str, message: str, conversation_id: str, from_agent_id: Optional[str] = None) -> str:
-    if agent_id not in KNOWN_AGENTS:
+async def deliver_a2a(agent_id: str, agent_url: str, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """
+    Transport under send_message_to_agent: in-process when the target agent is
+    hosted by this runtime (see local_transport.py), HTTP POST otherwise.
+    Both raise httpx errors on failure and return the /a2a response body.
+    """
+    if local_transport.hosts(agent_id):
+        return await local_transport.send(agent_id, payload, timeout=timeout)
+    response = await http_clients.post(agent_url, json=payload, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+async def send_message_to_agent(agent_id: str, message: str, conversation_id: str, from_agent_id: Optional[str] = None, envelope: Optional[Dict[str, Any]] = None) -> str:
+    if agent_id not in KNOWN_AGENTS and not local_transport.hosts(agent_id):
         error_msg = f"❌ Agent '{agent_id}' not found. Known agents: {list(KNOWN_AGENTS.keys())}"
         flow_logger.error(f"SEND_FAILED | target={agent_id} | reason=not_found | conversation_id={conversation_id}")
         return error_msg
     
-    agent_url = KNOWN_AGENTS[agent_id]
+    agent_url = KNOWN_AGENTS.get(agent_id, f"local://{agent_id}/a2a")
+    
+    # Fail fast while the agent's circuit is open
+    breaker = agent_health.breaker(agent_id)
+    try:
+        breaker.check()
+    except CircuitOpenError as e:
+        flow_logger.error(f"CIRCUIT_OPEN | target={agent_id} | conversation_id={conversation_id}")
+        return f"❌ Agent '{agent_id}' is unavailable: {str(e)}"
     
     flow_logger.info(f"📤 SENDING | to={agent_id} | url={agent_url} | conversation_id={conversation_id} | message_preview={message[:100]}...")
     
+    ok = None
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client:  # 2 minutes for CrewAI processing
-            payload = {
-                "content": {
-                    "text": message,
-                    "type": "text"
-                },
-                "role": "user",
-                "conversation_id": conversation_id
-            }
-            if from_agent_id:
-                payload["agent_id"] = from_agent_id
-                flow_logger.info(f"   └─ Including agent_id={from_agent_id} in payload")
-            
-            response = await client.post(agent_url, json=payload)
-            response.raise_for_status()
-            data = response.json()
-            response_text = data.get("content", {}).get("text", str(data))
-            
-            flow_logger.info(f"✅ RECEIVED | from={agent_id} | conversation_id={conversation_id} | response_length={len(response_text)} chars | preview={response_text[:100]}...")
-            
-            return response_text
+        payload = {
+            "content": {
+                "text": message,
+                "type": "text"
+            },
+            "role": "user",
+            "conversation_id": conversation_id
+        }
+        if from_agent_id:
+            payload["agent_id"] = from_agent_id
+            flow_logger.info(f"   └─ Including agent_id={from_agent_id} in payload")
+        if envelope:
+            payload.update(envelope)
+        
+        data = await deliver_a2a(agent_id, agent_url, payload, timeout=120.0)  # 2 minutes for CrewAI processing
+        response_text = data.get("content", {}).get("text", str(data))
+        
+        flow_logger.info(f"✅ RECEIVED | from={agent_id} | conversation_id={conversation_id} | response_length={len(response_text)} chars | preview={response_text[:100]}...")
+        
+        ok = True
+        return response_text
     
     except httpx.TimeoutException:
+        ok = False
+        breaker.last_error = "timeout"
         error_msg = f"❌ Timeout connecting to agent '{agent_id}'"
         flow_logger.error(f"TIMEOUT | target={agent_id} | conversation_id={conversation_id}")
         return error_msg
     except httpx.HTTPError as e:
+        ok = not agent_health.is_failure(e)
+        breaker.last_error = str(e)
         error_msg = f"❌ Error communicating with agent '{agent_id}': {str(e)}"
         flow_logger.error(f"HTTP_ERROR | target={agent_id} | error={str(e)} | conversation_id={conversation_id}")
         return error_msg
     except Exception as e:
+        ok = True  # the agent answered; we couldn't use the reply
         error_msg = f"❌ Unexpected error: {str(e)}"
         flow_logger.error(f"UNEXPECTED_ERROR | target={agent_id} | error={str(e)} | conversation_id={conversation_id}")
         return error_msg
+    finally:
+        if ok is None:
+            breaker.abandon()
+        else:
+            breaker.record(ok, breaker.last_error)
 
 def extract_agent_mentions(text: str) -> list[str]:
     pattern = r'@([\w-]+)'
@@ -466,6 +1212,120 @@ def generate_agent_facts() -> Dict[str, Any]:
     
     return agent_facts
 
+# ==============================================================================
+# Loop Detection
+# ==============================================================================
+# Every agent forwards the @mention it receives, so a message can bounce
+# (@agent_2 -> @agent_1 -> @agent_2 ...) and hold a worker and a connection on
+# each side until the 120s timeouts fire. Forwarded messages carry an envelope
+# (message_id, hops, visited) and /a2a drops them - before taking an admission
+# slot - when:
+# - this agent, or the @mentioned target, is already in visited (409)
+# - forwarding would exceed A2A_MAX_HOPS (409)
+# - the same message_id is already in flight here, or completed within the
+#   last A2A_DEDUPE_TTL seconds (409)
+# A message_id is only recorded once the message has been admitted, and is
+# forgotten again if the request fails, so a retry after a 429, a 500 or a
+# timeout on our side isn't mistaken for a duplicate.
+# These are routing-policy rejections, not failures of this agent, so they are
+# 4xx: the sender's circuit breaker (is_failure) must not count them.
+
+A2A_MAX_HOPS = int(os.getenv("A2A_MAX_HOPS", "3"))
+A2A_DEDUPE_TTL = float(os.getenv("A2A_DEDUPE_TTL", "300"))
+A2A_DEDUPE_SIZE = int(os.getenv("A2A_DEDUPE_SIZE", "1024"))
+
+class LoopGuard:
+    """Hop limit, visited-agent check and a recent message_id cache for /a2a"""
+
+    def __init__(self, max_hops: int, dedupe_ttl: float, dedupe_size: int):
+        self.max_hops = max_hops
+        self.dedupe_ttl = dedupe_ttl
+        self.dedupe_size = dedupe_size
+        self._recent: "OrderedDict[str, float]" = OrderedDict()  # message_id -> admitted at
+        self.checked = 0
+        self.dropped = {"loop": 0, "hop_limit": 0, "duplicate": 0}
+
+    def seen(self, message_id: str) -> bool:
+        """True if message_id is in flight or completed recently"""
+        now = time.time()
+        while self._recent and next(iter(self._recent.values())) <= now - self.dedupe_ttl:
+            self._recent.popitem(last=False)
+        return message_id in self._recent
+
+    def _drop(self, reason: str, status_code: int, detail: str, message: A2AMessage):
+        self.dropped[reason] += 1
+        a2a_logger.warning(
+            f"DROPPED | reason={reason} | conversation_id={message.conversation_id} | "
+            f"message_id={message.message_id} | hops={message.hops} | visited={message.visited}"
+        )
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    def check(self, message: A2AMessage):
+        """Raise HTTPException for looping, too-deep or repeated messages (records nothing)"""
+        self.checked += 1
+        target_agent, _ = parse_a2a_request(message.content.get("text", ""))
+        path = " -> ".join([f"@{agent}" for agent in message.visited] + [f"@{MY_AGENT_USERNAME}"])
+        if MY_AGENT_USERNAME in message.visited or (target_agent and target_agent in message.visited):
+            loop_path = f"{path} -> @{target_agent}" if target_agent else path
+            self._drop("loop", 409, f"❌ Routing loop detected: {loop_path}", message)
+        if target_agent and message.hops >= self.max_hops:
+            self._drop(
+                "hop_limit", 409,
+                f"❌ Hop limit reached ({message.hops}/{self.max_hops}): {path} -> @{target_agent}",
+                message
+            )
+        if message.message_id and self.seen(message.message_id):
+            self._drop(
+                "duplicate", 409,
+                f"❌ Duplicate message {message.message_id} already received by @{MY_AGENT_USERNAME}",
+                message
+            )
+
+    @contextmanager
+    def claim(self, message: A2AMessage):
+        """Record message_id for an admitted message; forget it if handling fails"""
+        message_id = message.message_id
+        if not message_id:
+            yield
+            return
+        # A copy may have been admitted while this one waited for a slot
+        if self.seen(message_id):
+            self._drop(
+                "duplicate", 409,
+                f"❌ Duplicate message {message_id} already received by @{MY_AGENT_USERNAME}",
+                message
+            )
+        self._recent[message_id] = time.time()
+        while len(self._recent) > self.dedupe_size:
+            self._recent.popitem(last=False)
+        try:
+            yield
+        except BaseException:
+            self._recent.pop(message_id, None)
+            raise
+
+    def envelope(self, message: A2AMessage) -> Dict[str, Any]:
+        """Envelope fields for forwarding message one more hop"""
+        return {
+            "message_id": message.message_id or str(uuid.uuid4()),
+            "hops": message.hops + 1,
+            "visited": message.visited + [MY_AGENT_USERNAME],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_hops": self.max_hops,
+            "checked": self.checked,
+            "dropped": dict(self.dropped),
+            "recent_messages": len(self._recent),
+        }
+
+loop_guard = LoopGuard(A2A_MAX_HOPS, A2A_DEDUPE_TTL, A2A_DEDUPE_SIZE)
+
+async def guard_a2a_loops(message: A2AMessage):
+    """FastAPI dependency - rejects looping / repeated messages before admission (see LoopGuard.claim)"""
+    loop_guard.check(message)
+
 # ==============================================================================
 # API Endpoints
 # ==============================================================================
@@ -485,6 +1345,8 @@ async def root():
         "known_agents": list(KNOWN_AGENTS.keys()),
         "endpoints": {
             "health": "GET /health",
+            "metrics": "GET /metrics",
+            "load": "GET /load",
             "query": "POST /query",
             "a2a": "POST /a2a",
             "agentfacts": "GET /agentfacts",
@@ -502,6 +1364,24 @@ async def health_check():
         a2a_enabled=True
     )
 
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "executor": crew_executor.stats(),
+        "crew_pool": crew_pool.stats(),
+        "admission": admission.stats(),
+        "coalescing": single_flight.stats(),
+        "http_client": http_clients.stats(),
+        "circuit_breakers": agent_health.stats(),
+        "registry": registry_sync.stats(),
+        "loop_guard": loop_guard.stats(),
+        "local_transport": local_transport.stats(),
+    }
+
+@app.get("/load")
+async def get_load():
+    return admission.load_hint()
+
 @app.get("/agents")
 async def list_agents():
     return {
@@ -509,6 +1389,7 @@ async def list_agents():
         "my_agent_name": MY_AGENT_NAME,
         "my_agent_username": MY_AGENT_USERNAME,
         "known_agents": KNOWN_AGENTS,
+        "health": agent_health.health(),
         "usage": "Send messages using @agent-id syntax in the /a2a endpoint"
     }
 
@@ -516,49 +1397,47 @@ async def list_agents():
 async def get_agent_facts():
     return generate_agent_facts()
 
+async def run_query(request: QueryRequest) -> QueryResponse:
+    """Wait for an admission slot, then answer the question with a pooled crew"""
+    async with admission.admit() as queue_wait:
+        start_time = datetime.now()
+        
+        try:
+            result = await crew_executor.run(crew_pool.kickoff, {"question": request.question})
+            
+            end_time = datetime.now()
+            processing_time = (end_time - start_time).total_seconds()
+            
+            return QueryResponse(
+                answer=str(result.raw),
+                timestamp=end_time.isoformat(),
+                processing_time=processing_time,
+                queue_wait_time=queue_wait
+            )
+            
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error processing query: {str(e)}"
+            )
+
 @app.post("/query", response_model=QueryResponse)
 async def query_agent(request: QueryRequest):
-    start_time = datetime.now()
-    
-    try:
-        task = Task(
-            description=f"""
-            As a robotics expert, answer this question: {request.question}
-            
-            Use your robotics knowledge and tools to provide detailed technical information.
-            Include relevant details like specifications, design considerations, or implementation guidance.
-            Use your memory to recall previous robotics discussions and user projects.
-            """,
-            expected_output="Expert robotics guidance with technical details and practical recommendations",
-            agent=my_agent_twin,
-        )
-        
-        crew = Crew(
-            agents=[my_agent_twin],
-            tasks=[task],
-            memory=True,
-            verbose=False,
-        )
-        
-        result = crew.kickoff()
-        
-        end_time = datetime.now()
-        processing_time = (end_time - start_time).total_seconds()
-        
-        return QueryResponse(
-            answer=str(result.raw),
-            timestamp=end_time.isoformat(),
-            processing_time=processing_time
-        )
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error processing query: {str(e)}"
-        )
+    # Identical concurrent questions share one crew run
+    return await single_flight.do(coalesce_key(request.question), lambda: run_query(request))
 
 @app.post("/a2a", response_model=A2AResponse)
-async def a2a_endpoint(message: A2AMessage):
+async def a2a_endpoint(
+    message: A2AMessage,
+    _: None = Depends(guard_a2a_loops),
+    queue_wait: float = Depends(admit_request)
+):
+    # Admitted: only now is message_id recorded, and it's forgotten if this fails
+    with loop_guard.claim(message):
+        return await process_a2a(message)
+
+async def process_a2a(message: A2AMessage) -> A2AResponse:
+    """Answer or forward one A2A message (caller holds an admission slot)"""
     try:
         text_content = message.content.get("text", "")
         conversation_id = message.conversation_id
@@ -566,6 +1445,7 @@ async def a2a_endpoint(message: A2AMessage):
         
         flow_logger.info(f"{'='*80}")
         flow_logger.info(f"📨 INCOMING MESSAGE | conversation_id={conversation_id}")
+        flow_logger.info(f"   └─ message_id: {message.message_id} | hops: {message.hops}")
         flow_logger.info(f"   └─ from_agent: {from_agent or 'external'}")
         flow_logger.info(f"   └─ message: {text_content[:200]}...")
         
@@ -596,27 +1476,8 @@ async def a2a_endpoint(message: A2AMessage):
             flow_logger.info(f"   └─ Task: Answer robotics question")
             a2a_logger.info(f"LOCAL_PROCESSING | conversation_id={conversation_id} | from={from_agent} | message={text_content}")
             
-            task = Task(
-                description=f"""
-                As a robotics expert, answer this question: {text_content}
-                
-                Use your robotics knowledge and tools to provide detailed technical information.
-                Include relevant details like specifications, design considerations, or implementation guidance.
-                Use your memory to recall previous robotics discussions and user projects.
-                """,
-                expected_output="Expert robotics guidance with technical details and practical recommendations",
-                agent=my_agent_twin,
-            )
-            
-            crew = Crew(
-                agents=[my_agent_twin],
-                tasks=[task],
-                memory=True,
-                verbose=True,  # Enable verbose to see tool usage
-            )
-            
             flow_logger.info(f"   └─ Starting CrewAI execution...")
-            result = crew.kickoff()
+            result = await crew_executor.run(crew_pool.kickoff, {"question": text_content})
             my_response = str(result.raw)
             
             # Response is sent back via HTTP return (not separate A2A message)
@@ -642,7 +1503,10 @@ async def a2a_endpoint(message: A2AMessage):
         print(f"🔀 Routing message to agent: {target_agent}")
         a2a_logger.info(f"ROUTING | conversation_id={conversation_id} | target={target_agent} | message={clean_message}")
         
-        agent_response = await send_message_to_agent(target_agent, clean_message, conversation_id, from_agent_id=MY_AGENT_ID)
+        agent_response = await send_message_to_agent(
+            target_agent, clean_message, conversation_id,
+            from_agent_id=MY_AGENT_ID, envelope=loop_guard.envelope(message)
+        )
         
         response_text = f"[Forwarded to @{target_agent}]\n\n{agent_response}"
         
@@ -670,8 +1534,23 @@ async def a2a_endpoint(message: A2AMessage):
             detail=f"Error processing A2A message: {str(e)}"
         )
 
+async def handle_local_a2a(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """POST /a2a for colocated agents: same validation, loop guard and admission, no HTTP"""
+    try:
+        message = A2AMessage.model_validate(payload)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    await guard_a2a_loops(message)
+    async with admission.admit() as queue_wait:
+        response = await a2a_endpoint(message, None, queue_wait)
+    return response.model_dump()
+
+# Other agents loaded into this process deliver to us through local_transport
+local_transport.register(MY_AGENT_USERNAME, handle_local_a2a)
+
 @app.post("/agents/register")
 async def register_agent(agent_id: str, agent_url: str):
+    REGISTERED_AGENTS[agent_id] = agent_url
     KNOWN_AGENTS[agent_id] = agent_url
     return {
         "message": f"✅ Agent '{agent_id}' registered successfully",
@@ -695,12 +1574,28 @@ async def startup_event():
     print(f"✅ Model: {llm.model}")
     print("✅ Memory: Enabled (4 types)")
     print(f"✅ Tools: {len(available_tools)} tools loaded")
+    print(f"✅ Crew Workers: {CREW_WORKERS}")
     print("✅ A2A: Enabled (NANDA-style)")
     
-    # Fetch agents from central registry
-    print(f"\n🔍 Fetching agents from registry: {REGISTRY_URL}")
-    await fetch_agents_from_registry()
-    print(f"✅ Known Agents: {len(KNOWN_AGENTS)}")
+    # Pre-build pooled crews so the first requests skip memory setup
+    await asyncio.to_thread(crew_pool.warm_up, CREW_POOL_WARM)
+    print(f"✅ Crew Pool: {crew_pool.created}/{CREW_POOL_SIZE} crews warm")
+    
+    # Known agents: last snapshot now, registry refreshes in the background
+    if registry_sync.load_snapshot():
+        print(f"✅ Known Agents: {len(KNOWN_AGENTS)} (snapshot)")
+    registry_sync.start()
+    print(f"🔍 Syncing agents from registry every {REGISTRY_SYNC_INTERVAL}s: {REGISTRY_URL}")
+    
+    # Warm pooled connections to the agents we message most (in the background)
+    targets = preconnect_targets()
+    if targets:
+        asyncio.create_task(http_clients.preconnect(targets))
+        print(f"✅ Pre-connecting: {len(targets)} agents (HTTP/2: {HTTP2_ENABLED})")
+    
+    # Probe known agents' /health in the background (feeds the circuit breakers)
+    agent_health.start()
+    print(f"✅ Health Probing: every {HEALTH_PROBE_INTERVAL:.0f}s")
     
     print("\n📚 Documentation: http://localhost:8000/docs")
     print("🤖 A2A Endpoint: http://localhost:8000/a2a")
@@ -709,6 +1604,14 @@ async def startup_event():
         print(f"🌐 Public URL: {PUBLIC_URL}")
     print("="*70 + "\n")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    registry_sync.stop()
+    agent_health.stop()
+    local_transport.unregister(MY_AGENT_USERNAME)
+    crew_executor.shutdown()
+    await http_clients.close()
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
@@ -0,0 +1,101 @@
+"""
+Benchmark script for the multi-agent runtime
+
+This script boots the personas in PERSONAS_FILE two ways:
+1. One process per persona (how agent_1 / agent_2 are deployed today)
+2. One runtime process hosting all of them
+
+It reports startup time and resident memory for both. Each boot imports
+main.py, then cold-starts every persona it hosts (builds it and warms its
+crew pool, like a first request would) with the memory budget lifted so
+nothing is evicted. It also times a warm lookup of each persona afterwards,
+the cost a request pays once its persona is in the LRU. No server is
+started and the registry is not contacted.
+
+    python benchmark.py
+    PERSONAS_FILE=class.yaml python benchmark.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Runs in a fresh interpreter; prints the runtime's own stats as the last line
+BOOT = """
+import asyncio, json, time, main
+
+async def run():
+    await main.runtime.preload(len(main.PERSONA_DEFINITIONS))
+    start = time.perf_counter()
+    for persona_id in main.PERSONA_DEFINITIONS:
+        await main.runtime.acquire(persona_id)
+    warm_ms = (time.perf_counter() - start) * 1000 / len(main.PERSONA_DEFINITIONS)
+    return {**main.runtime.stats(), "warm_acquire_ms": warm_ms}
+
+print("BENCH " + json.dumps(asyncio.run(run())))
+"""
+
+def boot(personas: list[str]) -> dict:
+    """Boot one process hosting `personas`; returns its stats plus wall-clock startup"""
+    env = {**os.environ, "PERSONAS": ",".join(personas), "PERSONA_MEMORY_BUDGET_MB": "1e9", "PERSONA_MAX_WARM": "0"}
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", BOOT],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=600
+    )
+    wall = time.perf_counter() - start
+    lines = [line for line in result.stdout.splitlines() if line.startswith("BENCH ")]
+    if result.returncode != 0 or not lines:
+        raise RuntimeError(f"boot of {personas} failed:\n{result.stderr[-2000:]}")
+    stats = json.loads(lines[-1][len("BENCH "):])
+    stats["wall_s"] = wall
+    return stats
+
+def main():
+    """Compare N single-persona processes with one N-persona runtime"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from main import PERSONA_DEFINITIONS, PERSONAS_FILE
+
+    persona_ids = list(PERSONA_DEFINITIONS)
+    print("\n⏱️  Multi-Agent Runtime Benchmark")
+    print("="*70)
+    print(f"Personas: {len(persona_ids)} from {PERSONAS_FILE}")
+    print("="*70)
+
+    separate = []
+    for persona_id in persona_ids:
+        stats = boot([persona_id])
+        separate.append(stats)
+        print(f"  @{persona_id:<20} startup {stats['wall_s']:6.2f}s   RSS {stats['rss_mb']:7.1f} MB")
+
+    shared = boot(persona_ids)
+
+    separate_rss = sum(stats["rss_mb"] for stats in separate)
+    separate_startup = sum(stats["wall_s"] for stats in separate)
+    count = len(persona_ids)
+
+    print(f"\n  {'setup':<22}{'processes':>10}{'startup (sum)':>16}{'RSS total':>12}{'RSS/persona':>14}")
+    print(f"  {'separate processes':<22}{count:>10}{separate_startup:>15.2f}s{separate_rss:>9.1f} MB"
+          f"{separate_rss / count:>11.1f} MB")
+    print(f"  {'one runtime':<22}{1:>10}{shared['wall_s']:>15.2f}s{shared['rss_mb']:>9.1f} MB"
+          f"{shared['rss_mb'] / count:>11.1f} MB")
+    print(f"\n  Baseline per process (imports, tools, clients): {shared['baseline_rss_mb']:.1f} MB")
+    print(f"  Marginal cost of one more persona: {shared['per_persona_rss_mb']:.1f} MB, "
+          f"{shared['per_persona_build_s']:.2f}s")
+    print(f"  Memory saved: {separate_rss - shared['rss_mb']:.1f} MB "
+          f"({1 - shared['rss_mb'] / separate_rss:.0%}); "
+          f"startup saved: {separate_startup - shared['wall_s']:.2f}s of process time")
+    print(f"\n  Cold start (build + warm crew pool): p50 {shared['build_p50_s']:.2f}s, "
+          f"p95 {shared['build_p95_s']:.2f}s")
+    print(f"  Warm lookup (persona already in the LRU): {shared['warm_acquire_ms']:.3f} ms")
+
+    return {"separate": separate, "shared": shared}
+
+if __name__ == "__main__":
+    main()
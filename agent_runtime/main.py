@@ -0,0 +1,1926 @@
+"""
+Multi-Agent Runtime with A2A Communication
+==========================================
+
+One process hosting many agent personas, loaded from personas.yaml (or JSON).
+
+agent_1 and agent_2 are near-identical copies that differ only in identity,
+backstory and temperature, and every deployment pays again for the Python
+interpreter, crewai/crewai_tools, the tool objects and the HTTP clients. Here
+each persona is just a definition: the runtime builds its Agent and crew pool
+and mounts it under /agents/{id}/... while tools, the crew thread pool, the
+outbound HTTP client, circuit breakers, the registry view and the tool result
+cache are shared by all personas.
+
+Per persona:
+- POST /agents/{id}/query       (same as POST /query on agent_1)
+- POST /agents/{id}/a2a         (same as POST /a2a on agent_1)
+- GET  /agents/{id}/agentfacts
+- GET  /agents/{id}/load
+
+Messages between hosted personas go through local_transport (no HTTP).
+GET /metrics reports startup time and memory per persona under "runtime";
+benchmark.py compares them with one process per persona.
+"""
+
+import os
+import sys
+import time
+
+# Measured before the heavy imports so /metrics can report import cost
+BOOT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import re
+import httpx
+import logging
+import asyncio
+import gc
+import threading
+import hashlib
+import json
+import math
+import uuid
+import yaml
+from contextlib import asynccontextmanager, contextmanager
+from collections import OrderedDict, deque
+from typing import Optional, Dict, Any, Callable, Awaitable
+from concurrent.futures import ThreadPoolExecutor
+
+from crewai import Agent, Task, Crew, LLM
+from crewai.tools import BaseTool
+from crewai_tools import FileReadTool, SerperDevTool, WebsiteSearchTool, YoutubeVideoSearchTool
+from pydantic import Field
+from typing import Type
+
+from local_transport import local_transport
+from tool_cache import cache_tools, get_tool_cache
+
+# HTTP/2 for the shared outbound client needs the h2 package (httpx[http2]);
+# without it the client falls back to HTTP/1.1 keep-alive
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+load_dotenv()
+
+IMPORT_SECONDS = time.perf_counter() - BOOT_STARTED
+
+# ==============================================================================
+# Logging Setup
+# ==============================================================================
+
+os.makedirs("logs", exist_ok=True)
+
+# A2A Communication Logger
+a2a_logger = logging.getLogger("a2a")
+a2a_logger.setLevel(logging.INFO)
+
+a2a_file_handler = logging.FileHandler("logs/a2a_messages.log")
+a2a_file_handler.setLevel(logging.INFO)
+
+formatter = logging.Formatter('%(asctime)s | %(levelname)s | %(message)s')
+a2a_file_handler.setFormatter(formatter)
+
+a2a_logger.addHandler(a2a_file_handler)
+
+# Detailed Flow Logger (tracks everything)
+flow_logger = logging.getLogger("flow")
+flow_logger.setLevel(logging.INFO)
+
+flow_file_handler = logging.FileHandler("logs/detailed_flow.log")
+flow_file_handler.setLevel(logging.INFO)
+
+detailed_formatter = logging.Formatter('%(asctime)s | [%(name)s] | %(levelname)s | %(message)s')
+flow_file_handler.setFormatter(detailed_formatter)
+
+flow_logger.addHandler(flow_file_handler)
+
+# Also log to console
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+console_handler.setFormatter(detailed_formatter)
+flow_logger.addHandler(console_handler)
+
+# ==============================================================================
+# FastAPI Application Setup
+# ==============================================================================
+
+app = FastAPI(
+    title="Multi-Agent Runtime API",
+    description="Many A2A agent personas served from one process",
+    version="1.0.0"
+)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# ==============================================================================
+# Request/Response Models
+# ==============================================================================
+
+class QueryRequest(BaseModel):
+    question: str
+    user_id: str = "anonymous"
+
+class QueryResponse(BaseModel):
+    answer: str
+    timestamp: str
+    processing_time: float
+    queue_wait_time: float = 0.0  # Seconds spent waiting for an admission slot
+    cold_start_time: float = 0.0  # Seconds spent building the persona (0 when it was warm)
+
+class A2AMessage(BaseModel):
+    content: Dict[str, Any]
+    role: str = "user"
+    conversation_id: str
+    agent_id: Optional[str] = None  # Which agent sent this message
+    message_id: Optional[str] = None  # Same on every hop (dedupe / tracing)
+    hops: int = 0  # How many times the message has been forwarded
+    visited: list[str] = []  # Agents that forwarded it, in order
+
+class A2AResponse(BaseModel):
+    content: Dict[str, Any]
+    role: str = "assistant"
+    conversation_id: str
+    timestamp: str
+    agent_id: str
+
+class HealthResponse(BaseModel):
+    status: str
+    memory_enabled: bool
+    tools_count: int
+    a2a_enabled: bool
+
+# ==============================================================================
+# Agent Registry
+# ==============================================================================
+
+# Central registry URL
+REGISTRY_URL = os.getenv("REGISTRY_URL", "https://nest.projectnanda.org/api/agents")
+
+# Store known agents - fetched from central registry
+KNOWN_AGENTS: Dict[str, str] = {
+    # Format: "username": "http://agent-url/a2a"
+    # Auto-populated from registry on startup
+}
+
+PUBLIC_URL = os.getenv("PUBLIC_URL") or os.getenv("RAILWAY_PUBLIC_DOMAIN")
+if PUBLIC_URL and not PUBLIC_URL.startswith("http"):
+    PUBLIC_URL = f"https://{PUBLIC_URL}"
+
+# ==============================================================================
+# Persona Definitions
+# ==============================================================================
+# PERSONAS_FILE is YAML or JSON with optional `defaults` and a `personas` list
+# (see personas.yaml). PERSONAS limits the runtime to a comma-separated subset
+# of ids, e.g. to split a large class across a few deployments.
+#
+# The interface registry (../interface/agents.json) works as-is: its entries
+# only have username, name and description, so role, goal, backstory and task
+# come from GENERIC_PERSONA.
+
+PERSONAS_FILE = os.getenv("PERSONAS_FILE", "personas.yaml")
+PERSONAS = os.getenv("PERSONAS", "")
+
+REQUIRED_PERSONA_FIELDS = ("id", "name", "role", "goal", "backstory", "task", "expected_output")
+
+# Filled in for entries that only describe who the agent is; {name} and
+# {description} are replaced with the entry's values
+GENERIC_PERSONA = {
+    "role": "{name}",
+    "goal": "Help users as {name}: {description}",
+    "backstory": (
+        "You are {name}, an AI agent built by a student in the NANDA class.\n"
+        "Your agent ID is: {agent_id}\n\n"
+        "ABOUT YOU:\n{description}\n\n"
+        "A2A COMMUNICATION:\n"
+        "You can collaborate with other specialized agents using @agent-id syntax."
+    ),
+    "task": "As {name}, answer this question: {question}",
+    "expected_output": "A helpful, accurate answer in the voice of {name}",
+}
+
+def complete_definition(entry: Dict[str, Any], defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply defaults, then fill missing persona fields from GENERIC_PERSONA"""
+    definition = {**defaults, **entry}
+    # Interface registry entries: username is the @mention id, id is a timestamp
+    if entry.get("username"):
+        definition["id"] = entry["username"]
+    name = definition.get("name") or definition.get("id", "")
+    description = definition.get("description") or f"{name} is a general-purpose assistant."
+    for field, template in GENERIC_PERSONA.items():
+        if not definition.get(field):
+            definition[field] = template.replace("{name}", name).replace("{description}", description)
+    return definition
+
+def load_persona_definitions(path: str, only: str = "") -> Dict[str, Dict[str, Any]]:
+    """Persona id -> definition (defaults applied), in file order"""
+    with open(path) as f:
+        if path.endswith(".json"):
+            config = json.load(f)
+        else:
+            config = yaml.safe_load(f)
+
+    # A bare list is a list of personas without defaults
+    if isinstance(config, list):
+        config = {"personas": config}
+    defaults = config.get("defaults", {})
+    wanted = {persona_id.strip() for persona_id in only.split(",") if persona_id.strip()}
+
+    definitions = {}
+    for entry in config.get("personas", []):
+        definition = complete_definition(entry, defaults)
+        missing = [field for field in REQUIRED_PERSONA_FIELDS if not definition.get(field)]
+        if missing:
+            raise ValueError(f"Persona {entry.get('id', '?')} in {path} is missing: {', '.join(missing)}")
+        if wanted and definition["id"] not in wanted:
+            continue
+        definitions[definition["id"]] = definition
+    return definitions
+
+PERSONA_DEFINITIONS = load_persona_definitions(PERSONAS_FILE, PERSONAS)
+
+# ==============================================================================
+# Tools Setup
+# ==============================================================================
+# One instance of each tool for the whole runtime. The result cache in front
+# of them is shared too, so a page one persona fetched is a hit for the rest.
+
+class CalculatorInput(BaseModel):
+    expression: str = Field(..., description="Mathematical expression to evaluate")
+
+class CalculatorTool(BaseTool):
+    name: str = "calculator"
+    description: str = "Performs mathematical calculations"
+    args_schema: Type[BaseModel] = CalculatorInput
+
+    def _run(self, expression: str) -> str:
+        try:
+            result = eval(expression, {"__builtins__": {}}, {})
+            return f"Result: {result}"
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+SHARED_TOOLS: Dict[str, BaseTool] = {
+    "calculator": CalculatorTool(),
+    "file_read": FileReadTool(),
+    "website_search": WebsiteSearchTool(),
+    "youtube_search": YoutubeVideoSearchTool(),
+}
+
+if os.getenv('SERPER_API_KEY'):
+    SHARED_TOOLS["serper"] = SerperDevTool()
+
+cache_tools(list(SHARED_TOOLS.values()))
+
+def persona_tools(names: Optional[list[str]]) -> list[BaseTool]:
+    """Shared tool instances for a persona (all available tools by default)"""
+    if not names:
+        return list(SHARED_TOOLS.values())
+    return [SHARED_TOOLS[name] for name in names if name in SHARED_TOOLS]
+
+# ==============================================================================
+# Shared LLM Clients
+# ==============================================================================
+# Personas with the same model and temperature share one LLM client
+
+_llms: Dict[tuple, LLM] = {}
+
+def shared_llm(model: str, temperature: float) -> LLM:
+    key = (model, float(temperature))
+    if key not in _llms:
+        _llms[key] = LLM(model=model, temperature=temperature)
+    return _llms[key]
+
+# ==============================================================================
+# Crew Execution Layer
+# ==============================================================================
+# crew.kickoff() is blocking (LLM calls, tool I/O). Calling it directly from an
+# async endpoint freezes the event loop - even /health stops answering. Every
+# crew run is dispatched to a bounded thread pool instead, so the loop stays
+# responsive and the number of concurrent crew runs is capped.
+
+CREW_WORKERS = int(os.getenv("CREW_WORKERS", "4"))
+
+class CrewExecutor:
+    """Runs blocking crew work on a bounded thread pool"""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crew")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _job(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on the pool and await its result"""
+        with self._lock:
+            self.queued += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self._job, fn, args, kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "busy_workers": self.running,
+                "idle_workers": self.max_workers - self.running,
+                "queue_depth": self.queued,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+crew_executor = CrewExecutor(CREW_WORKERS)
+
+# ==============================================================================
+# Crew Pool
+# ==============================================================================
+# Building a Crew with memory=True sets up all of its memory storages, which is
+# too slow to repeat on every request - but one shared crew is not safe to run
+# concurrently. Each persona's pool pre-builds crews (memory already attached)
+# and each request checks one out for the duration of its kickoff.
+
+CREW_POOL_SIZE = int(os.getenv("CREW_POOL_SIZE", str(CREW_WORKERS)))
+CREW_POOL_WARM = int(os.getenv("CREW_POOL_WARM", "1"))
+
+class CrewPool:
+    """Bounded pool of pre-built crews"""
+
+    def __init__(self, factory: Callable[[], Crew], max_size: int):
+        self.factory = factory
+        self.max_size = max_size
+        self._idle: list[Crew] = []
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.checkouts = 0
+        self.reused = 0
+        self.build_seconds = 0.0
+
+    def _build(self) -> Crew:
+        start = time.perf_counter()
+        crew = self.factory()
+        with self._lock:
+            self.created += 1
+            self.build_seconds += time.perf_counter() - start
+        return crew
+
+    def warm_up(self, count: int):
+        """Pre-build up to `count` crews so the first requests skip setup"""
+        for _ in range(max(0, min(count, self.max_size - self.created))):
+            crew = self._build()
+            with self._lock:
+                self._idle.append(crew)
+
+    def kickoff(self, inputs: Dict[str, Any]) -> Any:
+        """
+        Check out a crew, run it, and return it to the pool
+
+        Blocking - call it through crew_executor so it runs on a worker thread.
+        """
+        with self._slots:
+            with self._lock:
+                self.checkouts += 1
+                crew = self._idle.pop() if self._idle else None
+                if crew is not None:
+                    self.reused += 1
+            if crew is None:
+                crew = self._build()
+            try:
+                return crew.kickoff(inputs=inputs)
+            finally:
+                with self._lock:
+                    self._idle.append(crew)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            avg_build = self.build_seconds / self.created if self.created else 0.0
+            return {
+                "max_size": self.max_size,
+                "created": self.created,
+                "idle": len(self._idle),
+                "in_use": self.created - len(self._idle),
+                "checkouts": self.checkouts,
+                "reused": self.reused,
+                "avg_build_ms": round(avg_build * 1000, 1),
+                "setup_saved_s": round(self.reused * avg_build, 2),
+            }
+
+# ==============================================================================
+# Admission Control
+# ==============================================================================
+# Without a limit, requests pile up behind slow LLM calls until every client
+# times out. Each persona processes at most MAX_IN_FLIGHT requests at once
+# with at most MAX_QUEUE waiting; beyond that we fail fast with 429 +
+# Retry-After.
+#
+# All personas share the CREW_WORKERS crew threads, so per-persona limits alone
+# would admit N x MAX_IN_FLIGHT crew runs into the executor's unbounded queue.
+# Every crew run also takes a runtime-wide slot (RUNTIME_MAX_IN_FLIGHT, sized
+# to the executor, with RUNTIME_MAX_QUEUE waiting). Forwarding an A2A message
+# doesn't use a crew thread and doesn't take one.
+
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", str(CREW_WORKERS)))
+MAX_QUEUE = int(os.getenv("MAX_QUEUE", "16"))
+RUNTIME_MAX_IN_FLIGHT = int(os.getenv("RUNTIME_MAX_IN_FLIGHT", str(CREW_WORKERS)))
+RUNTIME_MAX_QUEUE = int(os.getenv("RUNTIME_MAX_QUEUE", "32"))
+
+class AdmissionController:
+    """Bounded in-flight limit with a bounded wait queue"""
+
+    def __init__(self, max_in_flight: int, max_queue: int):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.avg_service_s = 5.0  # EWMA of time spent holding a slot
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up for a new request"""
+        backlog = (self.waiting + 1) / self.max_in_flight
+        return max(1, math.ceil(backlog * self.avg_service_s))
+
+    def check_capacity(self):
+        """Raise 429 if a new request would find every slot and the queue taken"""
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Server is at capacity, please retry later",
+                headers={"Retry-After": str(self.retry_after())}
+            )
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a slot for the duration of the block; yields queue wait seconds"""
+        self.check_capacity()
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        admitted_at = time.perf_counter()
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield admitted_at - queued_at
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            service_s = time.perf_counter() - admitted_at
+            self.avg_service_s = 0.8 * self.avg_service_s + 0.2 * service_s
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_service_s": round(self.avg_service_s, 2),
+        }
+
+    def load_hint(self) -> Dict[str, Any]:
+        """Current load, published at GET /load for callers' endpoint resolvers"""
+        busy = self.in_flight + self.waiting
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "capacity": self.max_in_flight,
+            "utilization": round(busy / self.max_in_flight, 2),
+            "avg_service_s": round(self.avg_service_s, 2),
+            "expected_wait_s": round(max(0, busy + 1 - self.max_in_flight) / self.max_in_flight * self.avg_service_s, 2),
+        }
+
+# Shared by every persona: bounds crew runs to what the crew executor can serve
+runtime_admission = AdmissionController(RUNTIME_MAX_IN_FLIGHT, RUNTIME_MAX_QUEUE)
+
+# ==============================================================================
+# Request Coalescing (Single-Flight)
+# ==============================================================================
+# During battle rounds many callers ask the same question within the same
+# second. Identical concurrent questions to the same persona are coalesced:
+# the first one runs the crew, the rest wait on that same execution and share
+# its response.
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+class SingleFlight:
+    """Runs at most one execution per key; concurrent callers share its result"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is None:
+            # Run as its own task so a disconnecting caller can't cancel the
+            # execution the other callers are waiting on
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,  # crew runs (and LLM calls) saved
+        }
+
+# ==============================================================================
+# Outbound HTTP Client
+# ==============================================================================
+# One application-lifetime httpx client for every outbound call (A2A messages,
+# registry fetches). Its per-host keep-alive pools mean a hop to another agent
+# reuses an open connection instead of paying a new TCP+TLS handshake, and with
+# HTTP/2 concurrent messages to the same agent share one connection. At startup
+# it pre-connects to the agents we talk to most.
+
+HTTP2_ENABLED = H2_AVAILABLE and os.getenv("HTTP2", "true").lower() == "true"
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_PRECONNECT = os.getenv("HTTP_PRECONNECT", "")  # comma-separated agent ids or URLs
+HTTP_PRECONNECT_MAX = int(os.getenv("HTTP_PRECONNECT_MAX", "8"))
+
+class HttpClientManager:
+    """Shared pooled httpx client, tracking connection reuse and handshake time"""
+
+    def __init__(self, http2: bool, max_connections: int, max_keepalive: int, keepalive_expiry: float):
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+        self.connections = 0
+        self.handshake_seconds = 0.0
+        self.hosts: Dict[str, int] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=30.0)
+        return self._client
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        handshake: Dict[str, float] = {}
+
+        async def trace(event: str, info: Dict[str, Any]):
+            # httpcore only emits connect events when it opens a new connection
+            if event == "connection.connect_tcp.started":
+                handshake["start"] = time.perf_counter()
+            elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                handshake["end"] = time.perf_counter()
+
+        extensions = {**kwargs.pop("extensions", {}), "trace": trace}
+        try:
+            return await self.client.request(method, url, extensions=extensions, **kwargs)
+        finally:
+            host = httpx.URL(url).host
+            self.requests += 1
+            self.hosts[host] = self.hosts.get(host, 0) + 1
+            if "start" in handshake:
+                self.connections += 1
+                self.handshake_seconds += handshake.get("end", handshake["start"]) - handshake["start"]
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def preconnect(self, urls: list[str]) -> int:
+        """Open pooled connections to each URL's host (via /health); returns hosts reached"""
+        origins = {str(httpx.URL(url).copy_with(path="/health", query=None, fragment=None)) for url in urls}
+        results = await asyncio.gather(
+            *(self.get(origin, timeout=5.0) for origin in origins),
+            return_exceptions=True
+        )
+        return sum(1 for result in results if not isinstance(result, Exception))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        reused = self.requests - self.connections
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "requests": self.requests,
+            "new_connections": self.connections,
+            "reuse_rate": round(reused / self.requests, 3) if self.requests else 0.0,
+            "avg_handshake_ms": round(self.handshake_seconds / self.connections * 1000, 1) if self.connections else 0.0,
+            "top_hosts": dict(sorted(self.hosts.items(), key=lambda item: -item[1])[:10]),
+        }
+
+http_clients = HttpClientManager(HTTP2_ENABLED, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY)
+
+def preconnect_targets() -> list[str]:
+    """Agents to pre-connect to: HTTP_PRECONNECT, or the first known agents"""
+    names = [name.strip() for name in HTTP_PRECONNECT.split(",") if name.strip()]
+    if not names:
+        names = list(KNOWN_AGENTS)[:HTTP_PRECONNECT_MAX]
+    return [KNOWN_AGENTS.get(name, name) for name in names if name in KNOWN_AGENTS or name.startswith("http")]
+
+# ==============================================================================
+# Circuit Breakers & Health Probing
+# ==============================================================================
+# When a known agent is down, every message to it used to wait out the full
+# request timeout. Each agent gets a circuit breaker:
+# - closed:    requests flow; the last BREAKER_WINDOW outcomes are tracked
+# - open:      too many errors/timeouts - requests fail immediately
+# - half-open: after BREAKER_OPEN_SECONDS one trial request is let through;
+#              success closes the circuit, failure re-opens it
+# A background prober also hits every agent's /health each
+# HEALTH_PROBE_INTERVAL seconds, so dead agents are caught (and revived
+# agents let back in) without a user message paying for it.
+
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "3"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "3"))
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an agent whose circuit is open"""
+
+class CircuitBreaker:
+    """closed / open / half-open breaker for one agent"""
+
+    def __init__(self, window: int, min_calls: int, error_rate: float, open_seconds: float):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.outcomes: deque = deque(maxlen=window)
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.fast_failures = 0
+        self.last_error: Optional[str] = None
+        self.healthy: Optional[bool] = None  # last /health probe result
+        self.probed_at: Optional[float] = None
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - time.time())
+
+    def check(self):
+        """Raise CircuitOpenError unless a request may go through now"""
+        if self.state == "open" and self.retry_in() == 0:
+            self.state = "half_open"
+        if self.state == "open" or (self.state == "half_open" and self.trial_in_flight):
+            self.fast_failures += 1
+            raise CircuitOpenError(f"circuit open after repeated failures (retry in {self.retry_in():.0f}s)")
+        if self.state == "half_open":
+            self.trial_in_flight = True
+
+    def record(self, ok: bool, error: Optional[str] = None):
+        if not ok:
+            self.last_error = error
+        if self.state == "half_open":
+            self.trial_in_flight = False
+            self._close() if ok else self._open()
+            return
+        self.outcomes.append(ok)
+        failures = self.outcomes.count(False)
+        if self.state == "closed" and len(self.outcomes) >= self.min_calls \
+                and failures / len(self.outcomes) >= self.error_rate:
+            self._open()
+
+    def abandon(self):
+        """The request was cancelled before it could tell us anything"""
+        self.trial_in_flight = False
+
+    def probed(self, healthy: bool, error: Optional[str] = None):
+        self.healthy = healthy
+        self.probed_at = time.time()
+        if not healthy:
+            self.record(False, error)
+        elif self.state == "open":
+            # Back up - let the next real request through as the trial
+            self.state = "half_open"
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.time()
+
+    def _close(self):
+        self.state = "closed"
+        self.outcomes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "healthy": self.healthy,
+            "probe_age_s": round(time.time() - self.probed_at, 1) if self.probed_at else None,
+            "error_rate": round(self.outcomes.count(False) / len(self.outcomes), 2) if self.outcomes else 0.0,
+            "retry_in_s": round(self.retry_in(), 1) if self.state == "open" else 0.0,
+            "fast_failures": self.fast_failures,
+            "last_error": self.last_error,
+        }
+
+class AgentHealthMonitor:
+    """Circuit breakers for KNOWN_AGENTS plus the background /health prober"""
+
+    def __init__(self, interval: float, timeout: float):
+        self.interval = interval
+        self.timeout = timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.probes = 0
+
+    def breaker(self, agent_id: str) -> CircuitBreaker:
+        if agent_id not in self.breakers:
+            self.breakers[agent_id] = CircuitBreaker(
+                BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_ERROR_RATE, BREAKER_OPEN_SECONDS
+            )
+        return self.breakers[agent_id]
+
+    @staticmethod
+    def is_failure(error: Exception) -> bool:
+        """Timeouts, connection errors and 5xx/429 count against an agent; other 4xx don't"""
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500 or error.response.status_code == 429
+        return isinstance(error, (httpx.HTTPError, asyncio.TimeoutError))
+
+    async def probe(self, agent_id: str, agent_url: str):
+        health_url = str(httpx.URL(agent_url).copy_with(path="/health", query=None, fragment=None))
+        try:
+            response = await http_clients.get(health_url, timeout=self.timeout)
+            response.raise_for_status()
+            self.breaker(agent_id).probed(True)
+        except Exception as e:
+            self.breaker(agent_id).probed(False, f"health probe: {str(e) or type(e).__name__}")
+        self.probes += 1
+
+    async def probe_all(self):
+        semaphore = asyncio.Semaphore(16)
+
+        async def bounded(agent_id: str, agent_url: str):
+            async with semaphore:
+                await self.probe(agent_id, agent_url)
+
+        await asyncio.gather(*(bounded(agent_id, url) for agent_id, url in list(KNOWN_AGENTS.items())))
+
+    async def _probe_loop(self):
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._probe_loop())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def health(self) -> Dict[str, Any]:
+        return {agent_id: self.breaker(agent_id).stats() for agent_id in KNOWN_AGENTS}
+
+    def stats(self) -> Dict[str, Any]:
+        states = [breaker.state for breaker in self.breakers.values()]
+        return {
+            "closed": states.count("closed"),
+            "open": states.count("open"),
+            "half_open": states.count("half_open"),
+            "fast_failures": sum(breaker.fast_failures for breaker in self.breakers.values()),
+            "probes": self.probes,
+            "probe_interval_s": self.interval,
+        }
+
+agent_health = AgentHealthMonitor(HEALTH_PROBE_INTERVAL, HEALTH_PROBE_TIMEOUT)
+
+# ==============================================================================
+# Registry Helper Functions
+# ==============================================================================
+
+# Registry sync: boot from the last saved snapshot (no waiting on the
+# registry), then refresh in the background every REGISTRY_SYNC_INTERVAL
+# seconds with conditional requests (ETag / If-Modified-Since). If the
+# registry supports deltas, set REGISTRY_DELTA_PARAM (e.g. "updated_since")
+# and only changed entries are fetched. Each refresh builds a new mapping and
+# rebinds KNOWN_AGENTS in one step, so readers never see a half-updated dict.
+REGISTRY_SYNC_INTERVAL = int(os.getenv("REGISTRY_SYNC_INTERVAL", "60"))
+REGISTRY_SNAPSHOT_PATH = os.getenv("REGISTRY_SNAPSHOT_PATH", os.path.join("data", "registry.json"))
+REGISTRY_DELTA_PARAM = os.getenv("REGISTRY_DELTA_PARAM", "")
+
+# Built-in agents and agents added via POST /agents/register survive
+# registry refreshes
+SEED_AGENTS = dict(KNOWN_AGENTS)
+REGISTERED_AGENTS: Dict[str, str] = {}
+
+def registry_entry(agent: Dict[str, Any]) -> tuple[Optional[str], str]:
+    """(username, A2A URL) of a registry entry; username is None if unusable"""
+    # Support both old (username/url) and new (agent_id/endpoint) formats
+    username = agent.get("agent_id") or agent.get("username")
+    url = agent.get("endpoint") or agent.get("url", "")
+    
+    # Skip if no username or if it's a persona hosted here
+    if not username or username in PERSONA_DEFINITIONS:
+        return None, url
+    
+    # Ensure URL ends with /a2a
+    if not url.endswith("/a2a"):
+        url = url.rstrip("/") + "/a2a"
+    return username, url
+
+class RegistrySync:
+    """Background synchronizer between the central registry and KNOWN_AGENTS"""
+
+    def __init__(self, url: str, interval: int, snapshot_path: str):
+        self.url = url
+        self.interval = interval
+        self.snapshot_path = snapshot_path
+        self.agents: Dict[str, str] = {}  # registry view (without manual registrations)
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.synced_at: Optional[float] = None
+        self.syncs = 0
+        self.not_modified = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def load_snapshot(self) -> bool:
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.agents = snapshot.get("agents", {})
+        self.etag = snapshot.get("etag")
+        self.last_modified = snapshot.get("last_modified")
+        self.synced_at = snapshot.get("synced_at")
+        self._publish()
+        return True
+
+    def _save_snapshot(self):
+        if os.path.dirname(self.snapshot_path):
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "agents": self.agents,
+                "etag": self.etag,
+                "last_modified": self.last_modified,
+                "synced_at": self.synced_at,
+            }, f)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _publish(self):
+        global KNOWN_AGENTS
+        KNOWN_AGENTS = {**SEED_AGENTS, **self.agents, **REGISTERED_AGENTS}
+
+    async def sync(self) -> bool:
+        """One conditional (or delta) fetch; KNOWN_AGENTS is swapped only on success"""
+        headers = {}
+        params = {}
+        if self.agents and self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.agents and self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        delta = bool(REGISTRY_DELTA_PARAM and self.agents and self.synced_at)
+        if delta:
+            params[REGISTRY_DELTA_PARAM] = datetime.fromtimestamp(self.synced_at).isoformat()
+        try:
+            started_at = time.time()
+            response = await http_clients.get(self.url, headers=headers, params=params, timeout=10.0)
+            if response.status_code == 304:
+                self.not_modified += 1
+            else:
+                response.raise_for_status()
+                data = response.json()
+                
+                # Handle both old and new API formats
+                entries = data.get("agents", []) if isinstance(data, dict) else data
+                
+                agents = dict(self.agents) if delta else {}
+                for agent in entries:
+                    username, url = registry_entry(agent)
+                    if not username:
+                        continue
+                    if agent.get("deleted") or agent.get("status") == "deleted":
+                        agents.pop(username, None)
+                    else:
+                        agents[username] = url
+                
+                added = agents.keys() - self.agents.keys()
+                removed = self.agents.keys() - agents.keys()
+                if added or removed:
+                    print(f"📥 Registry sync: {len(agents)} agents (+{len(added)} / -{len(removed)})")
+                self.agents = agents
+                self.etag = response.headers.get("ETag")
+                self.last_modified = response.headers.get("Last-Modified")
+                self.syncs += 1
+                self._publish()
+            self.synced_at = started_at
+            self.last_error = None
+            await asyncio.to_thread(self._save_snapshot)
+            return True
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            print(f"⚠️ Failed to sync agents from registry (keeping {len(KNOWN_AGENTS)}): {str(e)}")
+            return False
+
+    async def _sync_loop(self):
+        while True:
+            await self.sync()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._sync_loop())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "agents": len(KNOWN_AGENTS),
+            "from_registry": len(self.agents),
+            "registered_here": len(REGISTERED_AGENTS),
+            "age_seconds": round(time.time() - self.synced_at, 1) if self.synced_at else None,
+            "interval": self.interval,
+            "syncs": self.syncs,
+            "not_modified": self.not_modified,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+registry_sync = RegistrySync(REGISTRY_URL, REGISTRY_SYNC_INTERVAL, REGISTRY_SNAPSHOT_PATH)
+
+async def fetch_agents_from_registry():
+    """
+    Fetch registered agents from the central registry (one sync)
+    Updates KNOWN_AGENTS with username -> A2A endpoint mappings
+    """
+    return await registry_sync.sync()
+
+# ==============================================================================
+# Loop Detection
+# ==============================================================================
+# Every agent forwards the @mention it receives, so a message can bounce
+# (@agent_2 -> @agent_1 -> @agent_2 ...) and hold a worker and a connection on
+# each side until the 120s timeouts fire. Forwarded messages carry an envelope
+# (message_id, hops, visited) and /a2a drops them - before taking an admission
+# slot - when:
+# - the receiving persona, or the @mentioned target, is already in visited (409)
+# - forwarding would exceed A2A_MAX_HOPS (409)
+# - the same message_id is already in flight for this persona, or completed
+#   within the last A2A_DEDUPE_TTL seconds (409)
+# A message_id is only recorded once the persona is built and the message
+# admitted, and is forgotten again if the request fails, so a retry after a
+# failed cold start (503), a 429 or a 500 isn't mistaken for a duplicate.
+# These are routing-policy rejections, not failures of this agent, so they are
+# 4xx: the sender's circuit breaker (is_failure) must not count them.
+
+A2A_MAX_HOPS = int(os.getenv("A2A_MAX_HOPS", "3"))
+A2A_DEDUPE_TTL = float(os.getenv("A2A_DEDUPE_TTL", "300"))
+A2A_DEDUPE_SIZE = int(os.getenv("A2A_DEDUPE_SIZE", "1024"))
+
+class LoopGuard:
+    """Hop limit, visited-agent check and a recent message_id cache for one persona's /a2a"""
+
+    def __init__(self, agent_id: str, max_hops: int, dedupe_ttl: float, dedupe_size: int):
+        self.agent_id = agent_id
+        self.max_hops = max_hops
+        self.dedupe_ttl = dedupe_ttl
+        self.dedupe_size = dedupe_size
+        self._recent: "OrderedDict[str, float]" = OrderedDict()  # message_id -> admitted at
+        self.checked = 0
+        self.dropped = {"loop": 0, "hop_limit": 0, "duplicate": 0}
+
+    def seen(self, message_id: str) -> bool:
+        """True if message_id is in flight or completed recently"""
+        now = time.time()
+        while self._recent and next(iter(self._recent.values())) <= now - self.dedupe_ttl:
+            self._recent.popitem(last=False)
+        return message_id in self._recent
+
+    def _drop(self, reason: str, status_code: int, detail: str, message: A2AMessage):
+        self.dropped[reason] += 1
+        a2a_logger.warning(
+            f"DROPPED | persona={self.agent_id} | reason={reason} | conversation_id={message.conversation_id} | "
+            f"message_id={message.message_id} | hops={message.hops} | visited={message.visited}"
+        )
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    def check(self, message: A2AMessage):
+        """Raise HTTPException for looping, too-deep or repeated messages (records nothing)"""
+        self.checked += 1
+        target_agent, _ = parse_a2a_request(message.content.get("text", ""))
+        path = " -> ".join([f"@{agent}" for agent in message.visited] + [f"@{self.agent_id}"])
+        if self.agent_id in message.visited or (target_agent and target_agent in message.visited):
+            loop_path = f"{path} -> @{target_agent}" if target_agent else path
+            self._drop("loop", 409, f"❌ Routing loop detected: {loop_path}", message)
+        if target_agent and message.hops >= self.max_hops:
+            self._drop(
+                "hop_limit", 409,
+                f"❌ Hop limit reached ({message.hops}/{self.max_hops}): {path} -> @{target_agent}",
+                message
+            )
+        if message.message_id and self.seen(message.message_id):
+            self._drop(
+                "duplicate", 409,
+                f"❌ Duplicate message {message.message_id} already received by @{self.agent_id}",
+                message
+            )
+
+    @contextmanager
+    def claim(self, message: A2AMessage):
+        """Record message_id for an admitted message; forget it if handling fails"""
+        message_id = message.message_id
+        if not message_id:
+            yield
+            return
+        # A copy may have been admitted while this one waited for a build or a slot
+        if self.seen(message_id):
+            self._drop(
+                "duplicate", 409,
+                f"❌ Duplicate message {message_id} already received by @{self.agent_id}",
+                message
+            )
+        self._recent[message_id] = time.time()
+        while len(self._recent) > self.dedupe_size:
+            self._recent.popitem(last=False)
+        try:
+            yield
+        except BaseException:
+            self._recent.pop(message_id, None)
+            raise
+
+    def envelope(self, message: A2AMessage) -> Dict[str, Any]:
+        """Envelope fields for forwarding message one more hop"""
+        return {
+            "message_id": message.message_id or str(uuid.uuid4()),
+            "hops": message.hops + 1,
+            "visited": message.visited + [self.agent_id],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_hops": self.max_hops,
+            "checked": self.checked,
+            "dropped": dict(self.dropped),
+            "recent_messages": len(self._recent),
+        }
+
+# ==============================================================================
+# Personas
+# ==============================================================================
+
+class Persona:
+    """One hosted agent: its definition plus its Agent, crew pool and limits"""
+
+    def __init__(self, definition: Dict[str, Any], loop_guard: "LoopGuard"):
+        self.definition = definition
+        self.id: str = definition["id"]
+        self.name: str = definition["name"]
+        self.emoji: str = definition.get("emoji", "🤖")
+        self.specialization: str = definition.get("specialization", definition["role"])
+        self.domain: str = definition.get("domain", "domain")
+        self.llm = shared_llm(definition.get("model", "openai/gpt-4o-mini"), definition.get("temperature", 0.5))
+        self.tools = persona_tools(definition.get("tools"))
+        self.agent = Agent(
+            role=definition["role"],
+            goal=definition["goal"],
+            backstory=definition["backstory"].replace("{agent_id}", self.id),
+            tools=self.tools,
+            llm=self.llm,
+            verbose=False,
+        )
+        self.crew_pool = CrewPool(self.build_crew, CREW_POOL_SIZE)
+        self.admission = AdmissionController(MAX_IN_FLIGHT, MAX_QUEUE)
+        self.single_flight = SingleFlight()
+        self.loop_guard = loop_guard  # owned by the runtime, so it outlives eviction
+
+        # Fingerprint of everything that shapes an answer besides the question itself
+        self.persona_hash = hashlib.sha256("\n".join([
+            self.agent.role,
+            self.agent.goal,
+            self.agent.backstory,
+            ",".join(sorted(tool.name for tool in self.tools)),
+        ]).encode()).hexdigest()[:16]
+
+        self.build_seconds = 0.0
+        self.rss_mb = 0.0
+
+    def build_crew(self) -> Crew:
+        """Build one pooled crew; {question} is filled in at kickoff time"""
+        agent = self.agent.copy()
+        task = Task(
+            description=self.definition["task"],
+            expected_output=self.definition["expected_output"],
+            agent=agent,
+        )
+        return Crew(
+            agents=[agent],
+            tasks=[task],
+            memory=True,
+            verbose=False,
+        )
+
+    def coalesce_key(self, question: str) -> str:
+        return f"{self.persona_hash}:{normalize_question(question)}"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "crew_pool": self.crew_pool.stats(),
+            "admission": self.admission.stats(),
+            "coalescing": self.single_flight.stats(),
+            "loop_guard": self.loop_guard.stats(),
+            "build_ms": round(self.build_seconds * 1000, 1),
+            "rss_mb": round(self.rss_mb, 1),
+        }
+
+def rss_mb() -> float:
+    """Resident memory of this process in MB (peak RSS where /proc isn't available)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile (0.0 for no values)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+# ==============================================================================
+# Persona Host (lazy + LRU)
+# ==============================================================================
+# A class registry can hold hundreds of personas, most of them idle most of the
+# time. A persona's Agent and crews are built the first time it is addressed
+# (a cold start) and kept warm in an LRU. Before a cold start, least recently
+# used idle personas are evicted until the new one fits:
+# - PERSONA_MEMORY_BUDGET_MB caps the summed footprint of warm personas
+#   (each one's measured RSS growth while it was built)
+# - PERSONA_MAX_WARM optionally caps how many are warm
+# An evicted persona is rebuilt from its definition the next time it's needed.
+# The first PERSONA_PRELOAD personas are built at startup.
+
+PERSONA_MEMORY_BUDGET_MB = float(os.getenv("PERSONA_MEMORY_BUDGET_MB", "2048"))
+PERSONA_MAX_WARM = int(os.getenv("PERSONA_MAX_WARM", "0"))  # 0 = no count limit
+PERSONA_PRELOAD = int(os.getenv("PERSONA_PRELOAD", "0"))
+PERSONA_DEFAULT_MB = float(os.getenv("PERSONA_DEFAULT_MB", "50"))  # footprint guess until builds are measured
+
+class PersonaRuntime:
+    """Builds personas on first use, keeps them in a memory-budgeted LRU, and reports cold vs warm cost"""
+
+    def __init__(self, definitions: Dict[str, Dict[str, Any]], memory_budget_mb: float, max_warm: int):
+        self.definitions = definitions
+        self.memory_budget_mb = memory_budget_mb
+        self.max_warm = max_warm
+        self.personas: "OrderedDict[str, Persona]" = OrderedDict()  # warm, least recently used first
+        self._building: Dict[str, asyncio.Task] = {}
+        # Per persona id, not per Persona: recent message_ids must survive an
+        # eviction and rebuild, or repeats would be accepted again
+        self.loop_guards: Dict[str, LoopGuard] = {}
+        self._build_lock = threading.Lock()  # one build at a time keeps RSS growth attributable
+        self._built_before: set[str] = set()
+        self.baseline_rss_mb = rss_mb()  # interpreter + libraries + shared tools/clients
+        self.startup_seconds: Optional[float] = None
+        self.warm_hits = 0
+        self.cold_starts = 0
+        self.rebuilds = 0
+        self.evictions = 0
+        self.over_budget = 0
+        self.build_seconds: deque = deque(maxlen=500)
+        self.request_seconds = {"cold": deque(maxlen=500), "warm": deque(maxlen=500)}
+
+    def definition(self, persona_id: str) -> Dict[str, Any]:
+        definition = self.definitions.get(persona_id)
+        if definition is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"❌ Persona '{persona_id}' is not hosted here ({len(self.definitions)} personas hosted)"
+            )
+        return definition
+
+    def loop_guard(self, persona_id: str) -> LoopGuard:
+        guard = self.loop_guards.get(persona_id)
+        if guard is None:
+            guard = self.loop_guards[persona_id] = LoopGuard(persona_id, A2A_MAX_HOPS, A2A_DEDUPE_TTL, A2A_DEDUPE_SIZE)
+        return guard
+
+    def is_warm(self, persona_id: str) -> bool:
+        return persona_id in self.personas
+
+    def _estimate_mb(self) -> float:
+        """Expected footprint of a persona that hasn't been measured"""
+        measured = [persona.rss_mb for persona in self.personas.values() if persona.rss_mb > 0]
+        return sum(measured) / len(measured) if measured else PERSONA_DEFAULT_MB
+
+    def footprint_mb(self, persona: "Persona") -> float:
+        # RSS may not grow when a build reuses memory freed by an eviction
+        return persona.rss_mb if persona.rss_mb > 0 else self._estimate_mb()
+
+    def warm_mb(self) -> float:
+        return sum(self.footprint_mb(persona) for persona in self.personas.values())
+
+    @staticmethod
+    def _idle(persona: "Persona") -> bool:
+        return persona.admission.in_flight == 0 and persona.admission.waiting == 0
+
+    def _make_room(self, incoming_mb: float):
+        """Evict least recently used idle personas until incoming_mb more fits"""
+        while self.personas:
+            over_count = self.max_warm and len(self.personas) >= self.max_warm
+            over_memory = self.warm_mb() + incoming_mb > self.memory_budget_mb
+            if not (over_count or over_memory):
+                return
+            victim = next((persona for persona in self.personas.values() if self._idle(persona)), None)
+            if victim is None:
+                # Everything warm is busy - run over budget rather than fail the request
+                self.over_budget += 1
+                return
+            self.evict(victim.id)
+
+    def evict(self, persona_id: str):
+        persona = self.personas.pop(persona_id, None)
+        if persona is not None:
+            self.evictions += 1
+            gc.collect()  # Agent/Crew objects hold reference cycles
+            flow_logger.info(f"🧹 EVICTED | persona={persona_id} | freed~{self.footprint_mb(persona):.0f}MB | warm={len(self.personas)}")
+
+    def _build(self, persona_id: str) -> "Persona":
+        """Build a persona and warm its crew pool (blocking), measuring time and memory"""
+        with self._build_lock:
+            before = rss_mb()
+            start = time.perf_counter()
+            persona = Persona(self.definitions[persona_id], self.loop_guard(persona_id))
+            persona.crew_pool.warm_up(CREW_POOL_WARM)
+            persona.build_seconds = time.perf_counter() - start
+            persona.rss_mb = max(0.0, rss_mb() - before)
+        return persona
+
+    async def _cold_start(self, persona_id: str) -> "Persona":
+        self._make_room(self._estimate_mb())
+        persona = await asyncio.to_thread(self._build, persona_id)
+        self.cold_starts += 1
+        if persona_id in self._built_before:
+            self.rebuilds += 1
+        self._built_before.add(persona_id)
+        self.build_seconds.append(persona.build_seconds)
+        self.personas[persona_id] = persona
+        flow_logger.info(
+            f"🧊 COLD START | persona={persona_id} | build={persona.build_seconds:.2f}s | "
+            f"rss=+{persona.rss_mb:.0f}MB | warm={len(self.personas)}"
+        )
+        return persona
+
+    async def acquire(self, persona_id: str) -> tuple["Persona", float]:
+        """The warm persona, building it first if it's cold; returns (persona, cold-start seconds)"""
+        self.definition(persona_id)
+        persona = self.personas.get(persona_id)
+        if persona is not None:
+            self.personas.move_to_end(persona_id)
+            self.warm_hits += 1
+            return persona, 0.0
+
+        # Concurrent first requests for the same persona share one build
+        start = time.perf_counter()
+        task = self._building.get(persona_id)
+        if task is None:
+            task = asyncio.ensure_future(self._cold_start(persona_id))
+            self._building[persona_id] = task
+            task.add_done_callback(lambda _: self._building.pop(persona_id, None))
+        try:
+            persona = await asyncio.shield(task)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"❌ Persona '{persona_id}' failed to start: {str(e)}")
+        return persona, time.perf_counter() - start
+
+    def record(self, cold_start_seconds: float, seconds: float):
+        """Request latency, split by whether the request paid for a cold start"""
+        self.request_seconds["cold" if cold_start_seconds else "warm"].append(seconds)
+
+    async def preload(self, count: int):
+        for persona_id in list(self.definitions)[:count]:
+            await self.acquire(persona_id)
+        self.startup_seconds = time.perf_counter() - BOOT_STARTED
+
+    def stats(self) -> Dict[str, Any]:
+        count = len(self.definitions)
+        total_rss = rss_mb()
+        footprints = [self.footprint_mb(persona) for persona in self.personas.values()]
+        per_persona_rss = sum(footprints) / len(footprints) if footprints else 0.0
+        per_persona_build = sum(self.build_seconds) / len(self.build_seconds) if self.build_seconds else 0.0
+        cold, warm = self.request_seconds["cold"], self.request_seconds["warm"]
+        # N separate deployments would each pay the baseline (imports, tools, clients)
+        separate_rss = count * (self.baseline_rss_mb + per_persona_rss)
+        return {
+            "personas": count,
+            "warm": len(self.personas),
+            "warm_mb": round(sum(footprints), 1),
+            "memory_budget_mb": self.memory_budget_mb,
+            "max_warm": self.max_warm or None,
+            "warm_hits": self.warm_hits,
+            "cold_starts": self.cold_starts,
+            "rebuilds": self.rebuilds,  # cold starts of previously evicted personas
+            "evictions": self.evictions,
+            "over_budget": self.over_budget,
+            "build_p50_s": round(percentile(self.build_seconds, 50), 2),
+            "build_p95_s": round(percentile(self.build_seconds, 95), 2),
+            "cold_request_p50_s": round(percentile(cold, 50), 2),
+            "cold_request_p95_s": round(percentile(cold, 95), 2),
+            "warm_request_p50_s": round(percentile(warm, 50), 2),
+            "warm_request_p95_s": round(percentile(warm, 95), 2),
+            "import_s": round(IMPORT_SECONDS, 2),
+            "startup_s": round(self.startup_seconds, 2) if self.startup_seconds else None,
+            "rss_mb": round(total_rss, 1),
+            "baseline_rss_mb": round(self.baseline_rss_mb, 1),
+            "per_persona_rss_mb": round(per_persona_rss, 1),
+            "per_persona_build_s": round(per_persona_build, 2),
+            "separate_processes_estimate": {
+                "rss_mb": round(separate_rss, 1),
+                "startup_s_each": round(IMPORT_SECONDS + per_persona_build, 2),
+                "memory_saved_mb": round(separate_rss - total_rss, 1),
+            },
+        }
+
+runtime = PersonaRuntime(PERSONA_DEFINITIONS, PERSONA_MEMORY_BUDGET_MB, PERSONA_MAX_WARM)
+
+# ==============================================================================
+# A2A Helper Functions
+# ==============================================================================
+
+async def deliver_a2a(agent_id: str, agent_url: str, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """
+    Transport under send_message_to_agent: in-process when the target agent is
+    hosted by this runtime (see local_transport.py), HTTP POST otherwise.
+    Both raise httpx errors on failure and return the /a2a response body.
+    """
+    if local_transport.hosts(agent_id):
+        return await local_transport.send(agent_id, payload, timeout=timeout)
+    response = await http_clients.post(agent_url, json=payload, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+async def send_message_to_agent(agent_id: str, message: str, conversation_id: str, from_agent_id: Optional[str] = None, envelope: Optional[Dict[str, Any]] = None) -> str:
+    if agent_id not in KNOWN_AGENTS and not local_transport.hosts(agent_id):
+        error_msg = f"❌ Agent '{agent_id}' not found. Known agents: {list(KNOWN_AGENTS.keys())}"
+        flow_logger.error(f"SEND_FAILED | target={agent_id} | reason=not_found | conversation_id={conversation_id}")
+        return error_msg
+    
+    agent_url = KNOWN_AGENTS.get(agent_id, f"local://{agent_id}/a2a")
+    
+    # Fail fast while the agent's circuit is open
+    breaker = agent_health.breaker(agent_id)
+    try:
+        breaker.check()
+    except CircuitOpenError as e:
+        flow_logger.error(f"CIRCUIT_OPEN | target={agent_id} | conversation_id={conversation_id}")
+        return f"❌ Agent '{agent_id}' is unavailable: {str(e)}"
+    
+    flow_logger.info(f"📤 SENDING | to={agent_id} | url={agent_url} | conversation_id={conversation_id} | message_preview={message[:100]}...")
+    
+    ok = None
+    try:
+        payload = {
+            "content": {
+                "text": message,
+                "type": "text"
+            },
+            "role": "user",
+            "conversation_id": conversation_id
+        }
+        if from_agent_id:
+            payload["agent_id"] = from_agent_id
+            flow_logger.info(f"   └─ Including agent_id={from_agent_id} in payload")
+        if envelope:
+            payload.update(envelope)
+        
+        data = await deliver_a2a(agent_id, agent_url, payload, timeout=120.0)  # 2 minutes for CrewAI processing
+        response_text = data.get("content", {}).get("text", str(data))
+        
+        flow_logger.info(f"✅ RECEIVED | from={agent_id} | conversation_id={conversation_id} | response_length={len(response_text)} chars | preview={response_text[:100]}...")
+        
+        ok = True
+        return response_text
+    
+    except httpx.TimeoutException:
+        ok = False
+        breaker.last_error = "timeout"
+        error_msg = f"❌ Timeout connecting to agent '{agent_id}'"
+        flow_logger.error(f"TIMEOUT | target={agent_id} | conversation_id={conversation_id}")
+        return error_msg
+    except httpx.HTTPError as e:
+        ok = not agent_health.is_failure(e)
+        breaker.last_error = str(e)
+        error_msg = f"❌ Error communicating with agent '{agent_id}': {str(e)}"
+        flow_logger.error(f"HTTP_ERROR | target={agent_id} | error={str(e)} | conversation_id={conversation_id}")
+        return error_msg
+    except Exception as e:
+        ok = True  # the agent answered; we couldn't use the reply
+        error_msg = f"❌ Unexpected error: {str(e)}"
+        flow_logger.error(f"UNEXPECTED_ERROR | target={agent_id} | error={str(e)} | conversation_id={conversation_id}")
+        return error_msg
+    finally:
+        if ok is None:
+            breaker.abandon()
+        else:
+            breaker.record(ok, breaker.last_error)
+
+def extract_agent_mentions(text: str) -> list[str]:
+    pattern = r'@([\w-]+)'
+    mentions = re.findall(pattern, text)
+    return mentions
+
+def parse_a2a_request(message: str) -> tuple[Optional[str], str]:
+    mentions = extract_agent_mentions(message)
+
+    if not mentions:
+        return None, message
+
+    target_agent = mentions[0]
+    clean_message = re.sub(r'@' + target_agent + r'\s*', '', message, count=1)
+
+    return target_agent, clean_message
+
+def persona_base_url(persona_id: str) -> str:
+    return f"{PUBLIC_URL or 'http://localhost:8000'}/agents/{persona_id}"
+
+def generate_agent_facts(definition: Dict[str, Any]) -> Dict[str, Any]:
+    # Built from the stored definition, so cold personas aren't started just to describe them
+    base_url = persona_base_url(definition["id"])
+    agent_uuid = definition.get("uuid") or str(uuid.uuid5(uuid.NAMESPACE_URL, base_url))
+    provider = definition.get("provider", "NANDA Student")
+    provider_url = definition.get("provider_url", "https://nanda.mit.edu")
+
+    agent_facts = {
+        "id": f"nanda:{agent_uuid}",
+        "agent_name": f"urn:agent:nanda:{definition['id']}",
+        "label": definition["name"],
+        "description": definition.get("description", ""),
+        "version": str(definition.get("version", "1.0.0")),
+        "documentationUrl": f"{PUBLIC_URL or 'http://localhost:8000'}/docs",
+        "jurisdiction": definition.get("jurisdiction", "USA"),
+        "provider": {
+            "name": provider,
+            "url": provider_url,
+            "did": f"did:web:{provider_url.replace('https://', '').replace('http://', '')}"
+        },
+        "endpoints": {
+            "static": [f"{base_url}/a2a"],
+            "adaptive_resolver": {
+                "url": f"{base_url}/a2a",
+                "policies": ["load"]
+            }
+        },
+        "capabilities": {
+            "modalities": ["text"],
+            "streaming": False,
+            "batch": False,
+            "authentication": {
+                "methods": ["none"],
+                "requiredScopes": []
+            }
+        },
+        "skills": [
+            {
+                "id": skill["id"],
+                "description": skill.get("description", ""),
+                "inputModes": ["text"],
+                "outputModes": ["text"],
+                "supportedLanguages": ["en"],
+                "latencyBudgetMs": skill.get("latency_budget_ms", 5000)
+            }
+            for skill in definition.get("skills", [])
+        ],
+        "evaluations": {
+            "performanceScore": definition.get("performance_score", 4.5),
+            "availability90d": "99.0%",
+            "lastAudited": datetime.now().isoformat(),
+            "auditTrail": None,
+            "auditorID": "Self-Reported v1.0"
+        },
+        "telemetry": {
+            "enabled": True,
+            "retention": "7d",
+            "sampling": 1.0,
+            "metrics": {
+                "latency_p95_ms": 2000,
+                "throughput_rps": 10,
+                "error_rate": 0.01,
+                "availability": "99.0%"
+            }
+        },
+        "certification": {
+            "level": "development",
+            "issuer": provider,
+            "issuanceDate": datetime.now().isoformat(),
+            "expirationDate": (datetime.now() + timedelta(days=365)).isoformat()
+        }
+    }
+
+    return agent_facts
+
+# ==============================================================================
+# API Endpoints
+# ==============================================================================
+
+@app.get("/")
+async def root():
+    return {
+        "message": "🧩 Multi-Agent Runtime API with A2A",
+        "version": "1.0.0",
+        "personas": len(PERSONA_DEFINITIONS),
+        "warm_personas": list(runtime.personas),
+        "memory_enabled": True,
+        "tools_enabled": len(SHARED_TOOLS),
+        "a2a_enabled": True,
+        "known_agents": list(KNOWN_AGENTS.keys()),
+        "endpoints": {
+            "health": "GET /health",
+            "metrics": "GET /metrics",
+            "agents": "GET /agents",
+            "persona": "GET /agents/{id}",
+            "query": "POST /agents/{id}/query",
+            "a2a": "POST /agents/{id}/a2a",
+            "agentfacts": "GET /agents/{id}/agentfacts",
+            "load": "GET /agents/{id}/load",
+            "docs": "GET /docs"
+        }
+    }
+
+@app.get("/health", response_model=HealthResponse)
+async def health_check():
+    return HealthResponse(
+        status="healthy",
+        memory_enabled=True,
+        tools_count=len(SHARED_TOOLS),
+        a2a_enabled=True
+    )
+
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "runtime": runtime.stats(),
+        "admission": runtime_admission.stats(),
+        "executor": crew_executor.stats(),
+        "http_client": http_clients.stats(),
+        "circuit_breakers": agent_health.stats(),
+        "registry": registry_sync.stats(),
+        "local_transport": local_transport.stats(),
+        "tool_cache": get_tool_cache().stats(),
+        "personas": {persona.id: persona.stats() for persona in runtime.personas.values()},  # warm only
+    }
+
+@app.get("/agents")
+async def list_agents():
+    return {
+        "hosted_personas": {persona_id: definition["name"] for persona_id, definition in PERSONA_DEFINITIONS.items()},
+        "warm_personas": list(runtime.personas),
+        "known_agents": KNOWN_AGENTS,
+        "health": agent_health.health(),
+        "usage": "Send messages using @agent-id syntax to POST /agents/{id}/a2a"
+    }
+
+@app.post("/agents/register")
+async def register_agent(agent_id: str, agent_url: str):
+    REGISTERED_AGENTS[agent_id] = agent_url
+    KNOWN_AGENTS[agent_id] = agent_url
+    return {
+        "message": f"✅ Agent '{agent_id}' registered successfully",
+        "agent_id": agent_id,
+        "agent_url": agent_url,
+        "total_known_agents": len(KNOWN_AGENTS)
+    }
+
+@app.get("/agents/{persona_id}")
+async def get_persona(persona_id: str):
+    definition = runtime.definition(persona_id)
+    return {
+        "message": f"{definition.get('emoji', '🤖')} {definition['name']} API with A2A",
+        "agent_id": persona_id,
+        "agent_name": definition["name"],
+        "agent_username": persona_id,
+        "specialization": definition.get("specialization", definition["role"]),
+        "model": definition.get("model", "openai/gpt-4o-mini"),
+        "tools_enabled": len(persona_tools(definition.get("tools"))),
+        "warm": runtime.is_warm(persona_id),
+        "endpoints": {
+            "query": f"POST /agents/{persona_id}/query",
+            "a2a": f"POST /agents/{persona_id}/a2a",
+            "agentfacts": f"GET /agents/{persona_id}/agentfacts",
+            "load": f"GET /agents/{persona_id}/load",
+        }
+    }
+
+@app.get("/agents/{persona_id}/agentfacts")
+async def get_agent_facts(persona_id: str):
+    return generate_agent_facts(runtime.definition(persona_id))
+
+@app.get("/agents/{persona_id}/load")
+async def get_load(persona_id: str):
+    runtime.definition(persona_id)
+    shared = runtime_admission.load_hint()
+    persona = runtime.personas.get(persona_id)
+    if persona is not None:
+        hint = {**persona.admission.load_hint(), "cold": False}
+    else:
+        # Idle, but the first request pays for a build
+        hint = {
+            "in_flight": 0,
+            "waiting": 0,
+            "capacity": MAX_IN_FLIGHT,
+            "utilization": 0.0,
+            "avg_service_s": 0.0,
+            "expected_wait_s": round(percentile(runtime.build_seconds, 50), 2),
+            "cold": True,
+        }
+    # A quiet persona still waits when other personas keep the shared crew threads busy
+    return {
+        **hint,
+        "utilization": max(hint["utilization"], shared["utilization"]),
+        "expected_wait_s": round(hint["expected_wait_s"] + shared["expected_wait_s"], 2),
+        "runtime": shared,
+    }
+
+async def run_query(persona: Persona, request: QueryRequest) -> QueryResponse:
+    """Wait for the persona's and a runtime-wide admission slot, then answer with a pooled crew"""
+    # Fail fast when the shared crew threads are saturated, before queueing for the persona
+    runtime_admission.check_capacity()
+    async with persona.admission.admit() as queue_wait, runtime_admission.admit() as shared_wait:
+        start_time = datetime.now()
+
+        try:
+            result = await crew_executor.run(persona.crew_pool.kickoff, {"question": request.question})
+
+            end_time = datetime.now()
+            processing_time = (end_time - start_time).total_seconds()
+
+            return QueryResponse(
+                answer=str(result.raw),
+                timestamp=end_time.isoformat(),
+                processing_time=processing_time,
+                queue_wait_time=queue_wait + shared_wait
+            )
+
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error processing query: {str(e)}"
+            )
+
+@app.post("/agents/{persona_id}/query", response_model=QueryResponse)
+async def query_agent(persona_id: str, request: QueryRequest):
+    started = time.perf_counter()
+    persona, cold_start = await runtime.acquire(persona_id)
+    # Identical concurrent questions share one crew run
+    response = await persona.single_flight.do(persona.coalesce_key(request.question), lambda: run_query(persona, request))
+    runtime.record(cold_start, time.perf_counter() - started)
+    if cold_start:
+        response = response.model_copy(update={"cold_start_time": cold_start})
+    return response
+
+async def process_a2a(persona: Persona, message: A2AMessage) -> A2AResponse:
+    """Answer or forward one A2A message for persona (caller holds an admission slot)"""
+    try:
+        text_content = message.content.get("text", "")
+        conversation_id = message.conversation_id
+        from_agent = message.agent_id
+
+        flow_logger.info(f"{'='*80}")
+        flow_logger.info(f"📨 INCOMING MESSAGE | persona={persona.id} | conversation_id={conversation_id}")
+        flow_logger.info(f"   └─ message_id: {message.message_id} | hops: {message.hops}")
+        flow_logger.info(f"   └─ from_agent: {from_agent or 'external'}")
+        flow_logger.info(f"   └─ message: {text_content[:200]}...")
+
+        a2a_logger.info(f"INCOMING | persona={persona.id} | conversation_id={conversation_id} | from={from_agent} | message={text_content}")
+
+        target_agent, clean_message = parse_a2a_request(text_content)
+
+        if target_agent:
+            flow_logger.info(f"🎯 ROUTING DETECTED | target=@{target_agent} | clean_message={clean_message[:100]}...")
+
+        if not target_agent:
+            # No @agent-id - this message is FOR THIS PERSONA to process
+            if not from_agent:
+                # No agent_id either - reject (must come from another agent)
+                error_msg = (
+                    "❌ ERROR: /a2a endpoint requires @agent-id for routing OR agent_id for processing.\n\n"
+                    f"Your message: '{text_content}'\n\n"
+                    "This endpoint is ONLY for agent-to-agent communication.\n"
+                    "You must include @agent-id to route to another agent.\n\n"
+                    f"For direct {persona.domain} queries to THIS agent, use POST /agents/{persona.id}/query instead."
+                )
+                a2a_logger.error(f"NO_TARGET_NO_AGENT | persona={persona.id} | conversation_id={conversation_id} | message={text_content}")
+                raise HTTPException(status_code=400, detail=error_msg)
+
+            # Process locally and send response back to sender
+            print(f"💬 @{persona.id} processing message from @{from_agent}")
+            flow_logger.info(f"🤖 LOCAL PROCESSING | persona={persona.id} | from=@{from_agent} | conversation_id={conversation_id}")
+            flow_logger.info(f"   └─ Task: Answer {persona.domain} question")
+            a2a_logger.info(f"LOCAL_PROCESSING | persona={persona.id} | conversation_id={conversation_id} | from={from_agent} | message={text_content}")
+
+            flow_logger.info(f"   └─ Starting CrewAI execution...")
+            async with runtime_admission.admit():
+                result = await crew_executor.run(persona.crew_pool.kickoff, {"question": text_content})
+            my_response = str(result.raw)
+
+            # Response is sent back via HTTP return (not separate A2A message)
+            print(f"✅ @{persona.id} processed request from @{from_agent}")
+            flow_logger.info(f"✅ PROCESSING COMPLETE | response_length={len(my_response)} chars")
+            flow_logger.info(f"   └─ Response preview: {my_response[:200]}...")
+            a2a_logger.info(f"LOCAL_SUCCESS | persona={persona.id} | conversation_id={conversation_id} | from={from_agent} | response_length={len(my_response)}")
+
+            end_time = datetime.now()
+
+            return A2AResponse(
+                content={
+                    "text": my_response,
+                    "type": "text"
+                },
+                role="assistant",
+                conversation_id=conversation_id,
+                timestamp=end_time.isoformat(),
+                agent_id=persona.id
+            )
+
+        # Has @agent-id - route to another agent
+        print(f"🔀 @{persona.id} routing message to agent: {target_agent}")
+        a2a_logger.info(f"ROUTING | persona={persona.id} | conversation_id={conversation_id} | target={target_agent} | message={clean_message}")
+
+        agent_response = await send_message_to_agent(
+            target_agent, clean_message, conversation_id,
+            from_agent_id=persona.id, envelope=persona.loop_guard.envelope(message)
+        )
+
+        response_text = f"[Forwarded to @{target_agent}]\n\n{agent_response}"
+
+        a2a_logger.info(f"SUCCESS | persona={persona.id} | conversation_id={conversation_id} | target={target_agent} | response_length={len(agent_response)}")
+
+        end_time = datetime.now()
+
+        return A2AResponse(
+            content={
+                "text": response_text,
+                "type": "text"
+            },
+            role="assistant",
+            conversation_id=conversation_id,
+            timestamp=end_time.isoformat(),
+            agent_id=persona.id
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        a2a_logger.error(f"ERROR | persona={persona.id} | conversation_id={message.conversation_id} | error={str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing A2A message: {str(e)}"
+        )
+
+@app.post("/agents/{persona_id}/a2a", response_model=A2AResponse)
+async def a2a_endpoint(persona_id: str, message: A2AMessage):
+    started = time.perf_counter()
+    runtime.definition(persona_id)
+    loop_guard = runtime.loop_guard(persona_id)
+    # Drop loops/repeats before they cost a cold start or an admission slot
+    loop_guard.check(message)
+    persona, cold_start = await runtime.acquire(persona_id)
+    async with persona.admission.admit():
+        # Built and admitted: only now is message_id recorded (forgotten if this fails)
+        with loop_guard.claim(message):
+            response = await process_a2a(persona, message)
+    runtime.record(cold_start, time.perf_counter() - started)
+    return response
+
+def persona_a2a_handler(persona_id: str) -> Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]:
+    """POST /agents/{id}/a2a for local_transport: same validation, cold start, loop guard and admission, no HTTP"""
+    async def handle_local_a2a(payload: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            message = A2AMessage.model_validate(payload)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        response = await a2a_endpoint(persona_id, message)
+        return response.model_dump()
+    return handle_local_a2a
+
+# Every defined persona is addressable in-process; it's built on its first message
+for persona_id in PERSONA_DEFINITIONS:
+    local_transport.register(persona_id, persona_a2a_handler(persona_id))
+
+# ==============================================================================
+# Startup Event
+# ==============================================================================
+
+@app.on_event("startup")
+async def startup_event():
+    print("\n" + "="*70)
+    print("🧩 Multi-Agent Runtime Starting...")
+    print("="*70)
+    print(f"\n✅ Personas: {len(PERSONA_DEFINITIONS)} from {PERSONAS_FILE}")
+    print("✅ Memory: Enabled (4 types)")
+    print(f"✅ Tools: {len(SHARED_TOOLS)} shared tools loaded")
+    print(f"✅ Crew Workers: {CREW_WORKERS} (shared)")
+    print("✅ A2A: Enabled (NANDA-style)")
+
+    # Preload the first few personas; the rest are built on first use
+    await runtime.preload(PERSONA_PRELOAD)
+    for persona in runtime.personas.values():
+        print(f"   {persona.emoji} @{persona.id}: {persona.name} "
+              f"({persona.build_seconds:.1f}s, +{persona.rss_mb:.0f} MB)")
+    print(f"✅ Persona Memory Budget: {PERSONA_MEMORY_BUDGET_MB:.0f} MB"
+          + (f", max {PERSONA_MAX_WARM} warm" if PERSONA_MAX_WARM else "")
+          + f" ({len(runtime.personas)} preloaded, others built on first use)")
+    stats = runtime.stats()
+    print(f"✅ Startup: {stats['startup_s']}s (imports {stats['import_s']}s), RSS {stats['rss_mb']} MB")
+
+    # Known agents: last snapshot now, registry refreshes in the background
+    if registry_sync.load_snapshot():
+        print(f"✅ Known Agents: {len(KNOWN_AGENTS)} (snapshot)")
+    registry_sync.start()
+    print(f"🔍 Syncing agents from registry every {REGISTRY_SYNC_INTERVAL}s: {REGISTRY_URL}")
+
+    # Warm pooled connections to the agents we message most (in the background)
+    targets = preconnect_targets()
+    if targets:
+        asyncio.create_task(http_clients.preconnect(targets))
+        print(f"✅ Pre-connecting: {len(targets)} agents (HTTP/2: {HTTP2_ENABLED})")
+
+    # Probe known agents' /health in the background (feeds the circuit breakers)
+    agent_health.start()
+    print(f"✅ Health Probing: every {HEALTH_PROBE_INTERVAL:.0f}s")
+
+    print("\n📚 Documentation: http://localhost:8000/docs")
+    print("🤖 A2A Endpoints: http://localhost:8000/agents/{id}/a2a")
+    if PUBLIC_URL:
+        print(f"🌐 Public URL: {PUBLIC_URL}")
+    print("="*70 + "\n")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    registry_sync.stop()
+    agent_health.stop()
+    for persona_id in PERSONA_DEFINITIONS:
+        local_transport.unregister(persona_id)
+    crew_executor.shutdown()
+    await http_clients.close()
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.getenv("PORT", 8000))
+    uvicorn.run(app, host="0.0.0.0", port=port)
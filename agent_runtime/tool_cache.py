@@ -0,0 +1,250 @@
+"""
+Tool Result Cache
+=================
+
+A caching layer for CrewAI tools (any BaseTool).
+
+Web, search and RAG tools go back to the network on every call, even when
+the agent asked for the same URL or query seconds ago. This module wraps a
+tool's _run() method so repeated calls are served from:
+1. an in-memory LRU (fast, per process)
+2. an on-disk SQLite tier (survives restarts)
+
+Entries are keyed on the tool (class, name, description) plus its
+canonicalized arguments, and expire after a per-tool TTL: short for search
+results, long for YouTube transcripts and PDFs. Tools without a TTL
+(calculator, file reading, image generation) are left untouched.
+
+Usage:
+    from tool_cache import cache_tools, get_tool_cache
+    available_tools = cache_tools([web_rag_tool, youtube_tool, calculator_tool])
+    print(get_tool_cache().stats())
+"""
+
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE", "true").lower() == "true"
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "256"))
+TOOL_CACHE_DB = os.getenv("TOOL_CACHE_DB", os.path.join("data", "tool_cache.db"))
+TOOL_CACHE_DB_MAX_ROWS = int(os.getenv("TOOL_CACHE_DB_MAX_ROWS", "5000"))
+
+# Default TTLs in seconds, by tool class name
+DEFAULT_TOOL_TTLS = {
+    "SerperDevTool": 300,                    # search results change quickly
+    "FirecrawlSearchTool": 300,
+    "WebsiteSearchTool": 3600,
+    "FirecrawlScrapeWebsiteTool": 3600,
+    "FirecrawlCrawlWebsiteTool": 6 * 3600,
+    "PDFSearchTool": 24 * 3600,
+    "YoutubeVideoSearchTool": 7 * 24 * 3600,  # transcripts don't change
+}
+
+def load_tool_ttls() -> Dict[str, int]:
+    """DEFAULT_TOOL_TTLS with overrides from TOOL_CACHE_TTLS (e.g. "SerperDevTool=60,PDFSearchTool=0")"""
+    ttls = dict(DEFAULT_TOOL_TTLS)
+    for item in os.getenv("TOOL_CACHE_TTLS", "").split(","):
+        if "=" in item:
+            name, ttl = item.split("=", 1)
+            ttls[name.strip()] = int(ttl)
+    return ttls
+
+TOOL_TTLS = load_tool_ttls()
+
+def canonicalize(value: Any) -> Any:
+    """Normalize tool arguments so equivalent calls share a key"""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {str(k): canonicalize(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(v) for v in value]
+    return value
+
+class ToolResultCache:
+    """In-memory LRU in front of a SQLite tier, with per-tool hit/miss stats"""
+
+    def __init__(self, max_entries: int, path: Optional[str], max_rows: int):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            with self._lock, self._db:
+                self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS tool_results (
+                        key TEXT PRIMARY KEY,
+                        tool TEXT,
+                        result TEXT NOT NULL,
+                        latency REAL,
+                        expires_at REAL
+                    )
+                """)
+                self._db.execute("CREATE INDEX IF NOT EXISTS tool_results_expires ON tool_results (expires_at)")
+        self.tools: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    def key(tool: Any, args: tuple, kwargs: dict) -> str:
+        raw = json.dumps(
+            {
+                "tool": type(tool).__name__,
+                "name": getattr(tool, "name", ""),
+                "description": getattr(tool, "description", ""),
+                "args": canonicalize(list(args)),
+                "kwargs": canonicalize(kwargs),
+            },
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _tool(self, tool_name: str) -> Dict[str, float]:
+        return self.tools.setdefault(tool_name, {
+            "calls": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "saved_seconds": 0.0
+        })
+
+    def get(self, key: str, tool_name: str) -> Any:
+        """Cached result or None, promoting disk hits into memory"""
+        now = time.time()
+        with self._lock:
+            stats = self._tool(tool_name)
+            stats["calls"] += 1
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                stats["memory_hits"] += 1
+                stats["saved_seconds"] += entry[2]
+                return entry[1]
+            self._memory.pop(key, None)
+
+            row = None
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT result, latency, expires_at FROM tool_results WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+            if not row:
+                stats["misses"] += 1
+                return None
+            result = json.loads(row[0])
+            self._remember(key, (row[2], result, row[1] or 0.0))
+            stats["disk_hits"] += 1
+            stats["saved_seconds"] += row[1] or 0.0
+            return result
+
+    def put(self, key: str, tool_name: str, result: Any, ttl: int, latency: float):
+        try:
+            encoded = json.dumps(result)
+        except (TypeError, ValueError):
+            return  # not serializable - don't cache
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, (expires_at, result, latency))
+            if self._db is None:
+                return
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO tool_results (key, tool, result, latency, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, tool_name, encoded, latency, expires_at)
+                )
+                self._db.execute("DELETE FROM tool_results WHERE expires_at <= ?", (time.time(),))
+                rows = self._db.execute("SELECT COUNT(*) FROM tool_results").fetchone()[0]
+                if rows > self.max_rows:
+                    self._db.execute(
+                        "DELETE FROM tool_results WHERE key IN "
+                        "(SELECT key FROM tool_results ORDER BY expires_at LIMIT ?)",
+                        (rows - self.max_rows,)
+                    )
+
+    def _remember(self, key: str, entry: tuple):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db.execute("SELECT COUNT(*) FROM tool_results").fetchone()[0] if self._db else 0
+            tools = {}
+            for tool_name, stats in self.tools.items():
+                hits = stats["memory_hits"] + stats["disk_hits"]
+                tools[tool_name] = {
+                    **stats,
+                    "saved_seconds": round(stats["saved_seconds"], 2),
+                    "hit_rate": round(hits / stats["calls"], 3) if stats["calls"] else 0.0,
+                    "ttl": TOOL_TTLS.get(tool_name),
+                }
+            return {
+                "enabled": TOOL_CACHE_ENABLED,
+                "memory_entries": len(self._memory),
+                "max_memory_entries": self.max_entries,
+                "disk_entries": rows,
+                "max_disk_entries": self.max_rows,
+                "tools": tools,
+            }
+
+_cache: Optional[ToolResultCache] = None
+_cache_lock = threading.Lock()
+
+def get_tool_cache() -> ToolResultCache:
+    """The process-wide cache (opened on first use)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ToolResultCache(TOOL_CACHE_SIZE, TOOL_CACHE_DB or None, TOOL_CACHE_DB_MAX_ROWS)
+        return _cache
+
+def cache_tool(tool: Any, ttl: Optional[int] = None) -> Any:
+    """
+    Serve tool._run() from the result cache
+
+    Args:
+        tool: A crewai BaseTool instance (patched in place and returned)
+        ttl: Seconds to keep results (default: TOOL_TTLS for the tool's class)
+
+    Returns:
+        The same tool, for chaining
+    """
+    tool_name = type(tool).__name__
+    ttl = ttl if ttl is not None else TOOL_TTLS.get(tool_name, 0)
+    if not TOOL_CACHE_ENABLED or ttl <= 0:
+        return tool
+
+    cache = get_tool_cache()
+    original_run = tool._run
+
+    @functools.wraps(original_run)
+    def cached_run(*args, **kwargs):
+        key = cache.key(tool, args, kwargs)
+        cached = cache.get(key, tool_name)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        result = original_run(*args, **kwargs)
+        # Tools report failures as strings - don't pin those for the whole TTL
+        if result and not (isinstance(result, str) and result.lstrip().lower().startswith("error")):
+            cache.put(key, tool_name, result, ttl, time.perf_counter() - start)
+        return result
+
+    # BaseTool is a pydantic model; object.__setattr__ puts the wrapper on the
+    # instance, where it shadows the class method (tool.run() and the agent's
+    # structured tool both call self._run)
+    object.__setattr__(tool, "_run", cached_run)
+    return tool
+
+def cache_tools(tools: List[Any]) -> List[Any]:
+    """Apply cache_tool() to every tool that has a TTL; other tools pass through"""
+    return [cache_tool(tool) for tool in tools]
@@ -17,6 +17,7 @@ from crewai_tools import DirectoryReadTool, FileReadTool, SerperDevTool, Website
 from pydantic import BaseModel, Field
 from typing import Type
 from dotenv import load_dotenv
+from tool_cache import cache_tools, get_tool_cache
 import os
 
 load_dotenv()
@@ -109,6 +110,10 @@ available_tools = [
 if search_tool:
     available_tools.append(search_tool)
 
+# Cache web/search/RAG results so repeated questions skip the network
+# (per-tool TTLs - see tool_cache.py)
+available_tools = cache_tools(available_tools)
+
 my_agent_twin = Agent(
     role="Personal Digital Twin with Memory and Tools",
     
@@ -225,6 +230,9 @@ if __name__ == "__main__":
         question = input("You: ").strip()
         
         if question.lower() in ['quit', 'exit', 'q']:
+            for tool_name, stats in get_tool_cache().stats()["tools"].items():
+                print(f"Tool cache - {tool_name}: {stats['memory_hits'] + stats['disk_hits']}/{stats['calls']} hits, "
+                      f"{stats['saved_seconds']}s saved")
             print("\nGoodbye! I'll remember this conversation.\n")
             break
         
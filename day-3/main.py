@@ -16,12 +16,23 @@ Architecture:
 - They communicate via Railway's private network
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from datetime import datetime
 from dotenv import load_dotenv
 import os
+import asyncio
+import threading
+import time
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+import math
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
 
 from crewai import Agent, Task, Crew, LLM
 from crewai.tools import BaseTool
@@ -65,6 +76,8 @@ class QueryResponse(BaseModel):
     answer: str
     timestamp: str
     processing_time: float
+    queue_wait_time: float = 0.0  # Seconds spent waiting for an admission slot
+    cached: bool = False  # True when served from the response cache
 
 class HealthResponse(BaseModel):
     """Health check response"""
@@ -180,23 +193,424 @@ my_agent_twin = Agent(
 )
 
 # ==============================================================================
-# Crew Setup (Create once, reuse for all requests)
+# Crew Setup (Built once per pool slot, reused across requests)
 # ==============================================================================
 
-# Create a generic task that will be reused
-answer_task = Task(
-    description="Answer the user's question: {question}. Use memory to recall context and tools when needed.",
-    expected_output="A clear, context-aware answer using memory and tools as needed",
-    agent=my_agent_twin,
-)
+def build_crew() -> Crew:
+    """
+    Build one crew for the pool
 
-# Create crew with memory enabled - this persists across requests!
-my_crew = Crew(
-    agents=[my_agent_twin],
-    tasks=[answer_task],
-    memory=True,  # This enables all 4 memory types!
-    verbose=False,
-)
+    Each crew gets its own copy of the agent (the tools and LLM are shared)
+    and a generic task that is filled in with the question at kickoff time.
+    """
+    agent = my_agent_twin.copy()
+    answer_task = Task(
+        description="Answer the user's question: {question}. Use memory to recall context and tools when needed.",
+        expected_output="A clear, context-aware answer using memory and tools as needed",
+        agent=agent,
+    )
+    # Create crew with memory enabled - this persists across requests!
+    return Crew(
+        agents=[agent],
+        tasks=[answer_task],
+        memory=True,  # This enables all 4 memory types!
+        verbose=False,
+    )
+
+# ==============================================================================
+# Crew Execution Layer
+# ==============================================================================
+# crew.kickoff() is blocking (LLM calls, tool I/O). Calling it directly from an
+# async endpoint freezes the event loop - even /health stops answering. Every
+# crew run is dispatched to a bounded thread pool instead, so the loop stays
+# responsive and the number of concurrent crew runs is capped.
+
+CREW_WORKERS = int(os.getenv("CREW_WORKERS", "4"))
+
+class CrewExecutor:
+    """Runs blocking crew work on a bounded thread pool"""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crew")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _job(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on the pool and await its result"""
+        with self._lock:
+            self.queued += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self._job, fn, args, kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "busy_workers": self.running,
+                "idle_workers": self.max_workers - self.running,
+                "queue_depth": self.queued,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+crew_executor = CrewExecutor(CREW_WORKERS)
+
+# ==============================================================================
+# Crew Pool
+# ==============================================================================
+# Building a Crew with memory=True sets up all of its memory storages, which is
+# too slow to repeat on every request - but one shared crew is not safe to run
+# concurrently. The pool pre-builds crews (memory already attached) and each
+# request checks one out for the duration of its kickoff.
+
+CREW_POOL_SIZE = int(os.getenv("CREW_POOL_SIZE", str(CREW_WORKERS)))
+CREW_POOL_WARM = int(os.getenv("CREW_POOL_WARM", "1"))
+
+class CrewPool:
+    """Bounded pool of pre-built crews"""
+
+    def __init__(self, factory: Callable[[], Crew], max_size: int):
+        self.factory = factory
+        self.max_size = max_size
+        self._idle: list[Crew] = []
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.checkouts = 0
+        self.reused = 0
+        self.build_seconds = 0.0
+
+    def _build(self) -> Crew:
+        start = time.perf_counter()
+        crew = self.factory()
+        with self._lock:
+            self.created += 1
+            self.build_seconds += time.perf_counter() - start
+        return crew
+
+    def warm_up(self, count: int):
+        """Pre-build up to `count` crews so the first requests skip setup"""
+        for _ in range(max(0, min(count, self.max_size - self.created))):
+            crew = self._build()
+            with self._lock:
+                self._idle.append(crew)
+
+    def kickoff(self, inputs: Dict[str, Any]) -> Any:
+        """
+        Check out a crew, run it, and return it to the pool
+
+        Blocking - call it through crew_executor so it runs on a worker thread.
+        """
+        with self._slots:
+            with self._lock:
+                self.checkouts += 1
+                crew = self._idle.pop() if self._idle else None
+                if crew is not None:
+                    self.reused += 1
+            if crew is None:
+                crew = self._build()
+            try:
+                return crew.kickoff(inputs=inputs)
+            finally:
+                with self._lock:
+                    self._idle.append(crew)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            avg_build = self.build_seconds / self.created if self.created else 0.0
+            return {
+                "max_size": self.max_size,
+                "created": self.created,
+                "idle": len(self._idle),
+                "in_use": self.created - len(self._idle),
+                "checkouts": self.checkouts,
+                "reused": self.reused,
+                "avg_build_ms": round(avg_build * 1000, 1),
+                "setup_saved_s": round(self.reused * avg_build, 2),
+            }
+
+crew_pool = CrewPool(build_crew, CREW_POOL_SIZE)
+
+# ==============================================================================
+# Admission Control
+# ==============================================================================
+# Without a limit, requests pile up behind slow LLM calls until every client
+# times out. At most MAX_IN_FLIGHT requests are processed at once and at most
+# MAX_QUEUE wait for a slot; beyond that we fail fast with 429 + Retry-After.
+
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", str(CREW_WORKERS)))
+MAX_QUEUE = int(os.getenv("MAX_QUEUE", "16"))
+
+class AdmissionController:
+    """Bounded in-flight limit with a bounded wait queue"""
+
+    def __init__(self, max_in_flight: int, max_queue: int):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.avg_service_s = 5.0  # EWMA of time spent holding a slot
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up for a new request"""
+        backlog = (self.waiting + 1) / self.max_in_flight
+        return max(1, math.ceil(backlog * self.avg_service_s))
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a slot for the duration of the block; yields queue wait seconds"""
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Server is at capacity, please retry later",
+                headers={"Retry-After": str(self.retry_after())}
+            )
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        admitted_at = time.perf_counter()
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield admitted_at - queued_at
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            service_s = time.perf_counter() - admitted_at
+            self.avg_service_s = 0.8 * self.avg_service_s + 0.2 * service_s
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_service_s": round(self.avg_service_s, 2),
+        }
+
+admission = AdmissionController(MAX_IN_FLIGHT, MAX_QUEUE)
+
+# ==============================================================================
+# Request Coalescing (Single-Flight)
+# ==============================================================================
+# During battle rounds many callers ask the same question within the same
+# second. Identical concurrent questions are coalesced: the first one runs the
+# crew, the rest wait on that same execution and share its response.
+
+# Fingerprint of everything that shapes an answer besides the question itself
+PERSONA_HASH = hashlib.sha256("\n".join([
+    my_agent_twin.role,
+    my_agent_twin.goal,
+    my_agent_twin.backstory,
+    ",".join(sorted(tool.name for tool in available_tools)),
+]).encode()).hexdigest()[:16]
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+def coalesce_key(question: str) -> str:
+    return f"{PERSONA_HASH}:{normalize_question(question)}"
+
+class SingleFlight:
+    """Runs at most one execution per key; concurrent callers share its result"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is None:
+            # Run as its own task so a disconnecting caller can't cancel the
+            # execution the other callers are waiting on
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,  # crew runs (and LLM calls) saved
+        }
+
+single_flight = SingleFlight()
+
+# ==============================================================================
+# Response Cache
+# ==============================================================================
+# Repeated questions ("What are my interests?") don't need a new crew run.
+# Answers are cached per (persona, user, normalized question) with a TTL, in
+# an LRU-bounded memory tier and - when RESPONSE_CACHE_DB is set - a SQLite
+# tier that survives restarts. Clients can skip the cache with
+# "Cache-Control: no-cache" (don't read) or "no-store" (don't read or write).
+
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB", "")  # e.g. "response_cache.db"
+RESPONSE_CACHE_DB_MAX_ROWS = int(os.getenv("RESPONSE_CACHE_DB_MAX_ROWS", "10000"))
+
+class ResponseCache:
+    """TTL + LRU response cache with an optional SQLite tier"""
+
+    def __init__(self, max_entries: int, ttl: int, db_path: str = "", db_max_rows: int = 10000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_max_rows = db_max_rows
+        self._entries: OrderedDict[str, tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            with self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires_at REAL, payload TEXT)"
+                )
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bypasses = 0
+
+    @staticmethod
+    def key(question: str, user_id: str) -> str:
+        raw = f"{PERSONA_HASH}:{user_id}:{normalize_question(question)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry:
+            expires_at, payload = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return payload
+            del self._entries[key]
+            self.expirations += 1
+
+        if self._db:
+            row = self._db.execute(
+                "SELECT expires_at, payload FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row:
+                payload = json.loads(row[1])
+                self._remember(key, row[0], payload)
+                self.disk_hits += 1
+                return payload
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, payload: Dict[str, Any], ttl: Optional[int] = None):
+        expires_at = time.time() + (ttl or self.ttl)
+        self._remember(key, expires_at, payload)
+        if self._db:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, expires_at, payload) VALUES (?, ?, ?)",
+                    (key, expires_at, json.dumps(payload))
+                )
+                # Keep the disk tier bounded: drop expired rows, then the soonest to expire
+                self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+                self._db.execute(
+                    "DELETE FROM responses WHERE key NOT IN "
+                    "(SELECT key FROM responses ORDER BY expires_at DESC LIMIT ?)", (self.db_max_rows,)
+                )
+
+    def _remember(self, key: str, expires_at: float, payload: Dict[str, Any]):
+        self._entries[key] = (expires_at, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl,
+            "disk_tier": self._db is not None,
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "bypasses": self.bypasses,
+        }
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_DB, RESPONSE_CACHE_DB_MAX_ROWS)
+
+def cache_directives(cache_control: Optional[str]) -> set[str]:
+    return {part.strip().lower() for part in (cache_control or "").split(",") if part.strip()}
+
+async def cached_query(request: QueryRequest, cache_control: Optional[str] = None) -> tuple[QueryResponse, str]:
+    """Answer from the cache when possible; returns (response, "HIT" | "MISS" | "BYPASS")"""
+    directives = cache_directives(cache_control)
+    bypass = "no-cache" in directives or "no-store" in directives
+    key = ResponseCache.key(request.question, request.user_id)
+
+    if bypass:
+        response_cache.bypasses += 1
+    else:
+        start = time.perf_counter()
+        cached = response_cache.get(key)
+        if cached:
+            return QueryResponse(**{
+                **cached,
+                "processing_time": time.perf_counter() - start,
+                "queue_wait_time": 0.0,
+                "cached": True,
+            }), "HIT"
+
+    # Identical concurrent misses share one crew run
+    response = await single_flight.do(coalesce_key(request.question), lambda: run_query(request))
+    if "no-store" not in directives:
+        response_cache.put(key, response.model_dump())
+    return response, "BYPASS" if bypass else "MISS"
 
 # ==============================================================================
 # API Endpoints
@@ -212,6 +626,7 @@ async def root():
         "tools_enabled": len(available_tools),
         "endpoints": {
             "health": "GET /health",
+            "metrics": "GET /metrics",
             "query": "POST /query",
             "docs": "GET /docs"
         }
@@ -230,8 +645,49 @@ async def health_check():
         tools_count=len(available_tools)
     )
 
+@app.get("/metrics")
+async def get_metrics():
+    """Runtime metrics - crew executor queue depth and crew pool usage"""
+    return {
+        "executor": crew_executor.stats(),
+        "crew_pool": crew_pool.stats(),
+        "admission": admission.stats(),
+        "coalescing": single_flight.stats(),
+        "response_cache": response_cache.stats(),
+    }
+
+async def run_query(request: QueryRequest) -> QueryResponse:
+    """Wait for an admission slot, then answer the question with a pooled crew"""
+    async with admission.admit() as queue_wait:
+        start_time = datetime.now()
+        
+        try:
+            # Execute with a pooled crew (reuses memory across requests!)
+            # Pass the question directly - the agent will handle it
+            result = await crew_executor.run(crew_pool.kickoff, {
+                "question": request.question,
+                "description": f"Answer the following question: {request.question}. Use your memory to recall relevant context and your tools when needed."
+            })
+            
+            # Calculate processing time
+            end_time = datetime.now()
+            processing_time = (end_time - start_time).total_seconds()
+            
+            return QueryResponse(
+                answer=str(result.raw),
+                timestamp=end_time.isoformat(),
+                processing_time=processing_time,
+                queue_wait_time=queue_wait
+            )
+            
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error processing query: {str(e)}"
+            )
+
 @app.post("/query", response_model=QueryResponse)
-async def query_agent(request: QueryRequest):
+async def query_agent(request: QueryRequest, response: Response, cache_control: Optional[str] = Header(None)):
     """
     Query the agent with memory and tools
     
@@ -246,31 +702,10 @@ async def query_agent(request: QueryRequest):
           -H "Content-Type: application/json" \\
           -d '{"question": "What is 123 * 456?"}'
     """
-    start_time = datetime.now()
-    
-    try:
-        # Execute with the persistent crew (reuses memory across requests!)
-        # Pass the question directly - the agent will handle it
-        result = my_crew.kickoff(inputs={
-            "question": request.question,
-            "description": f"Answer the following question: {request.question}. Use your memory to recall relevant context and your tools when needed."
-        })
-        
-        # Calculate processing time
-        end_time = datetime.now()
-        processing_time = (end_time - start_time).total_seconds()
-        
-        return QueryResponse(
-            answer=str(result.raw),
-            timestamp=end_time.isoformat(),
-            processing_time=processing_time
-        )
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error processing query: {str(e)}"
-        )
+    # Cached answers return in milliseconds; misses go through coalescing + the crew
+    result, cache_status = await cached_query(request, cache_control)
+    response.headers["X-Cache"] = cache_status
+    return result
 
 # ==============================================================================
 # Startup Event
@@ -285,10 +720,20 @@ async def startup_event():
     print(f"\n✅ Model: {llm.model}")
     print(f"✅ Memory: Enabled (4 types)")
     print(f"✅ Tools: {len(available_tools)} tools loaded")
+    print(f"✅ Crew Workers: {CREW_WORKERS}")
+    
+    # Pre-build pooled crews so the first requests skip memory setup
+    await asyncio.to_thread(crew_pool.warm_up, CREW_POOL_WARM)
+    print(f"✅ Crew Pool: {crew_pool.created}/{CREW_POOL_SIZE} crews warm")
     print("✅ Agent: Initialized")
     print("\n📚 Documentation: http://localhost:8000/docs")
     print("="*70 + "\n")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Run when the API stops"""
+    crew_executor.shutdown()
+
 # ==============================================================================
 # Run Instructions
 # ==============================================================================
@@ -0,0 +1,366 @@
+"""
+Benchmark script for the agent server
+
+This script measures how the server behaves under concurrent load:
+1. Throughput (requests/second) of /query at several client concurrencies
+2. /health latency while crew runs are in flight (is the event loop free?)
+3. Crew setup time saved by the crew pool
+4. Overload behaviour - 429 rejections vs queue wait under a burst
+5. Semantic cache hit rate and lookup latency as the index grows (in-process)
+6. Vector router latency and accuracy up to 10k agents (in-process)
+7. A2A p50/p99 with request hedging off and on (in-process)
+
+Run it against servers started with different CREW_WORKERS values to see
+requests/second scale with the crew executor pool size:
+
+    CREW_WORKERS=1 uvicorn main:app --port 8000
+    python benchmark.py
+
+    CREW_WORKERS=8 uvicorn main:app --port 8000
+    python benchmark.py
+"""
+
+import requests
+import json
+import time
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+# Configuration
+BASE_URL = "http://localhost:8000"  # Change to your Railway URL when deployed
+CONCURRENCY_LEVELS = [1, 2, 4, 8]
+REQUESTS_PER_LEVEL = 8
+QUESTION = "What is 12 * 12?"
+
+# The load benchmarks measure crew runs, so they skip the response and semantic caches
+NO_CACHE_HEADERS = {"Cache-Control": "no-store"}
+
+_question_numbers = itertools.count(1)
+
+def unique_question() -> str:
+    """QUESTION with a request number - identical questions would be coalesced into one crew run"""
+    return f"{QUESTION} (request #{next(_question_numbers)})"
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def timed_query(question: str) -> tuple[bool, float]:
+    """Send one /query request and return (success, latency in seconds)"""
+    start = time.perf_counter()
+    try:
+        response = requests.post(f"{BASE_URL}/query", json={"question": question},
+                                 headers=NO_CACHE_HEADERS, timeout=300)
+        return response.status_code == 200, time.perf_counter() - start
+    except requests.RequestException:
+        return False, time.perf_counter() - start
+
+def probe_health(stop: threading.Event, latencies: list[float]):
+    """Poll /health until stopped, recording each round trip"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            requests.get(f"{BASE_URL}/health", timeout=30)
+            latencies.append(time.perf_counter() - start)
+        except requests.RequestException:
+            latencies.append(30.0)
+        time.sleep(0.2)
+
+def bench_concurrency():
+    """Measure /query throughput and /health latency at each concurrency level"""
+    print("\n" + "="*70)
+    print("Benchmark: Crew Executor Concurrency")
+    print("="*70)
+
+    metrics = requests.get(f"{BASE_URL}/metrics").json()
+    print(f"Server executor: {json.dumps(metrics.get('executor', {}))}")
+
+    results = []
+    for concurrency in CONCURRENCY_LEVELS:
+        stop = threading.Event()
+        health_latencies: list[float] = []
+        prober = threading.Thread(target=probe_health, args=(stop, health_latencies), daemon=True)
+        prober.start()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(timed_query, [unique_question() for _ in range(REQUESTS_PER_LEVEL)]))
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        prober.join()
+
+        ok = sum(1 for success, _ in outcomes if success)
+        latencies = [latency for _, latency in outcomes]
+        row = {
+            "concurrency": concurrency,
+            "ok": ok,
+            "rps": ok / elapsed if elapsed else 0.0,
+            "p50_s": percentile(latencies, 50),
+            "p95_s": percentile(latencies, 95),
+            "health_p95_ms": percentile(health_latencies, 95) * 1000,
+        }
+        results.append(row)
+        print(f"  concurrency={concurrency:<3} ok={ok}/{REQUESTS_PER_LEVEL} "
+              f"rps={row['rps']:.2f} p50={row['p50_s']:.2f}s p95={row['p95_s']:.2f}s "
+              f"health_p95={row['health_p95_ms']:.0f}ms")
+
+    return results
+
+def bench_crew_pool():
+    """Report how much crew setup time the crew pool saves"""
+    print("\n" + "="*70)
+    print("Benchmark: Crew Pool Setup Savings")
+    print("="*70)
+
+    before = requests.get(f"{BASE_URL}/metrics").json().get("crew_pool", {})
+    latencies = [timed_query(unique_question())[1] for _ in range(REQUESTS_PER_LEVEL)]
+    after = requests.get(f"{BASE_URL}/metrics").json().get("crew_pool", {})
+
+    reused = after.get("reused", 0) - before.get("reused", 0)
+    built = after.get("created", 0) - before.get("created", 0)
+    print(f"  sequential queries: {len(latencies)} (p50={percentile(latencies, 50):.2f}s)")
+    print(f"  crews reused: {reused}, crews built on demand: {built}")
+    print(f"  avg crew build time: {after.get('avg_build_ms', 0)}ms")
+    print(f"  setup saved this run: {reused * after.get('avg_build_ms', 0) / 1000:.2f}s")
+    print(f"  setup saved since start: {after.get('setup_saved_s', 0)}s")
+
+    return after
+
+def bench_overload(burst: int = 32):
+    """Fire a burst larger than the admission limits and report how it degrades"""
+    print("\n" + "="*70)
+    print("Benchmark: Admission Control Under Overload")
+    print("="*70)
+
+    def one(question):
+        start = time.perf_counter()
+        response = requests.post(f"{BASE_URL}/query", json={"question": question},
+                                 headers=NO_CACHE_HEADERS, timeout=300)
+        body = response.json() if response.status_code == 200 else {}
+        return (response.status_code, time.perf_counter() - start,
+                body.get("queue_wait_time", 0.0), response.headers.get("Retry-After"))
+
+    with ThreadPoolExecutor(max_workers=burst) as pool:
+        outcomes = list(pool.map(one, [unique_question() for _ in range(burst)]))
+
+    accepted = [o for o in outcomes if o[0] == 200]
+    rejected = [o for o in outcomes if o[0] == 429]
+    print(f"  burst={burst} accepted={len(accepted)} rejected(429)={len(rejected)}")
+    if accepted:
+        print(f"  accepted p95 latency={percentile([o[1] for o in accepted], 95):.2f}s "
+              f"p95 queue wait={percentile([o[2] for o in accepted], 95):.2f}s")
+    if rejected:
+        print(f"  rejected p95 latency={percentile([o[1] for o in rejected], 95) * 1000:.0f}ms "
+              f"Retry-After={rejected[0][3]}s")
+
+    return outcomes
+
+def bench_semantic_index(sizes: tuple = (100, 1000, 10000), dim: int = 1536, lookups: int = 500):
+    """
+    Hit rate and lookup latency of the semantic cache index as entries grow
+
+    Runs in-process on synthetic embeddings: half of the lookups are
+    "paraphrases" (a stored vector plus noise, cosine ~0.95), half are new
+    questions. Needs to run from the day-4 directory (imports main.py).
+    """
+    import numpy as np
+    from main import SemanticCache, SEMANTIC_CACHE_THRESHOLD
+
+    print("\n" + "="*70)
+    print("Benchmark: Semantic Cache Index")
+    print("="*70)
+
+    rng = np.random.default_rng(0)
+
+    def unit(vectors):
+        return (vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)).astype(np.float32)
+
+    results = []
+    for size in sizes:
+        cache = SemanticCache(SEMANTIC_CACHE_THRESHOLD, size, ttl=3600)
+        stored = unit(rng.standard_normal((size, dim)))
+        for row, vector in enumerate(stored):
+            cache.put("bench", vector, {"answer": str(row)})
+
+        paraphrases = unit(stored[rng.integers(0, size, lookups // 2)]
+                           + 0.3 * unit(rng.standard_normal((lookups // 2, dim))))
+        novel = unit(rng.standard_normal((lookups - lookups // 2, dim)))
+
+        start = time.perf_counter()
+        paraphrase_hits = sum(cache.get("bench", vector) is not None for vector in paraphrases)
+        novel_hits = sum(cache.get("bench", vector) is not None for vector in novel)
+        elapsed = time.perf_counter() - start
+
+        row = {
+            "entries": size,
+            "paraphrase_hit_rate": paraphrase_hits / len(paraphrases),
+            "false_hit_rate": novel_hits / len(novel),
+            "lookup_ms": elapsed / lookups * 1000,
+        }
+        results.append(row)
+        print(f"  entries={size:<6} paraphrase_hits={row['paraphrase_hit_rate']:.0%} "
+              f"false_hits={row['false_hit_rate']:.0%} lookup={row['lookup_ms']:.3f}ms")
+
+    return results
+
+def bench_vector_router(sizes: tuple = (100, 1000, 10000), dim: int = 1536, queries: int = 500):
+    """
+    Routing latency and accuracy of the vector router as the directory grows
+
+    Runs in-process on synthetic embeddings. Agents come in topic clusters of
+    10 similar agents (cosine ~0.83 to each other) so near-misses are
+    realistic; each query is its target agent's vector plus noise of varying
+    strength.
+    Accuracy counts confident picks that hit the target; the rest fall back to
+    the LLM, which would see only the top candidates (recall@k). The LLM-only
+    prompt size is shown for comparison. Needs to run from the day-4 directory.
+    """
+    import numpy as np
+    from main import VectorRouter, ROUTER_MIN_SCORE, ROUTER_MIN_MARGIN, ROUTER_FALLBACK_K
+
+    print("\n" + "="*70)
+    print("Benchmark: Vector Router")
+    print("="*70)
+
+    rng = np.random.default_rng(0)
+
+    def unit(vectors):
+        return (vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)).astype(np.float32)
+
+    results = []
+    for size in sizes:
+        topics = unit(rng.standard_normal((max(1, size // 10), dim)))
+        matrix = unit(topics[np.arange(size) // 10] + 0.45 * unit(rng.standard_normal((size, dim))))
+        agents = [{"id": f"agent-{i}", "label": f"Agent {i}", "description": "x" * 120,
+                   "skills": [{"id": "skill"}], "endpoints": {"static": [f"https://agent-{i}.example.com"]}}
+                  for i in range(size)]
+        router = VectorRouter(ROUTER_MIN_SCORE, ROUTER_MIN_MARGIN, ROUTER_FALLBACK_K)
+        router.load(agents, matrix)
+
+        targets = rng.integers(0, size, queries)
+        # Noise varies per query: clear requests through vague ones
+        noise = rng.uniform(1.0, 3.0, (queries, 1))
+        query_vectors = unit(matrix[targets] + noise * unit(rng.standard_normal((queries, dim))))
+
+        correct = fallbacks = recalled = 0
+        latencies = []
+        for target, vector in zip(targets, query_vectors):
+            start = time.perf_counter()
+            agent, candidates = router.route(vector)
+            latencies.append(time.perf_counter() - start)
+            if agent is None:
+                fallbacks += 1
+                recalled += any(c["id"] == f"agent-{target}" for c, _ in candidates)
+            elif agent["id"] == f"agent-{target}":
+                correct += 1
+
+        confident = queries - fallbacks
+        prompt_chars = len(json.dumps(agents, indent=2))
+        row = {
+            "agents": size,
+            "route_p50_ms": percentile(latencies, 50) * 1000,
+            "route_p95_ms": percentile(latencies, 95) * 1000,
+            "confident_accuracy": correct / confident if confident else 0.0,
+            "fallback_rate": fallbacks / queries,
+            "fallback_recall": recalled / fallbacks if fallbacks else 1.0,
+            "matrix_mb": matrix.nbytes / 1e6,
+            "llm_prompt_tokens": prompt_chars // 4,
+        }
+        results.append(row)
+        print(f"  agents={size:<6} route p50={row['route_p50_ms']:.3f}ms p95={row['route_p95_ms']:.3f}ms "
+              f"accuracy={row['confident_accuracy']:.0%} fallback={row['fallback_rate']:.0%} "
+              f"(recall@{ROUTER_FALLBACK_K}={row['fallback_recall']:.0%}) matrix={row['matrix_mb']:.1f}MB "
+              f"llm-only prompt≈{row['llm_prompt_tokens']:,} tokens")
+
+    return results
+
+def bench_hedging(requests_per_mode: int = 400, concurrency: int = 20, stall_rate: float = 0.03):
+    """
+    p50/p99 of A2A calls with hedging off and on (in-process simulation)
+
+    Runs main.HedgePolicy against simulated endpoints: ~50ms typical replies,
+    with stall_rate of requests stalling for 2s (time scaled down from the
+    tens of seconds seen on Railway). Needs to run from the day-4 directory.
+    """
+    import asyncio
+    import random
+    import main
+
+    print("\n" + "="*70)
+    print("Benchmark: Hedged A2A Requests")
+    print("="*70)
+
+    async def simulate(enabled: bool) -> dict:
+        main.endpoint_resolver = main.EndpointResolver(
+            main.LOAD_EWMA_ALPHA, main.LOAD_PRIOR_LATENCY, main.LOAD_HINT_TTL, main.LOAD_FAILURE_PENALTY
+        )
+        policy = main.HedgePolicy(enabled, main.HEDGE_BUDGET, main.HEDGE_PERCENTILE,
+                                  min_delay=0.01, min_samples=main.HEDGE_MIN_SAMPLES)
+        rng = random.Random(0)
+
+        async def send(url: str) -> str:
+            start = time.perf_counter()
+            ok = False
+            main.endpoint_resolver.started(url)
+            try:
+                stall = 2.0 if rng.random() < stall_rate else 0.0
+                await asyncio.sleep(rng.lognormvariate(-3.0, 0.3) + stall)
+                ok = True
+                return "ok"
+            except asyncio.CancelledError:
+                ok = True
+                raise
+            finally:
+                main.endpoint_resolver.finished(url, time.perf_counter() - start, ok)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                await policy.run(["http://replica-a/a2a", "http://replica-b/a2a"], send)
+
+        await asyncio.gather(*(one() for _ in range(requests_per_mode)))
+        return policy.stats()
+
+    results = {}
+    for enabled in (False, True):
+        stats = asyncio.run(simulate(enabled))
+        results["on" if enabled else "off"] = stats
+        print(f"  hedging={'on ' if enabled else 'off'} p50={stats['p50_s'] * 1000:.0f}ms "
+              f"p99={stats['p99_s'] * 1000:.0f}ms hedge_rate={stats['hedge_rate']:.1%} "
+              f"hedge_wins={stats['hedge_wins']}")
+
+    return results
+
+def main():
+    """Run all benchmarks"""
+    print("\n⏱️  Agent Benchmark Suite")
+    print("="*70)
+    print(f"Benchmarking agent at: {BASE_URL}")
+    print("="*70)
+
+    benchmarks = [
+        ("Concurrency", bench_concurrency),
+        ("Crew Pool", bench_crew_pool),
+        ("Overload", bench_overload),
+        ("Semantic Index", bench_semantic_index),
+        ("Vector Router", bench_vector_router),
+        ("Hedging", bench_hedging),
+    ]
+
+    for bench_name, bench_func in benchmarks:
+        try:
+            bench_func()
+        except Exception as e:
+            print(f"\n❌ Error in {bench_name}: {str(e)}")
+
+if __name__ == "__main__":
+    # Note: Make sure your agent is running first!
+    # Run: uvicorn main:app
+    main()
@@ -4,16 +4,26 @@ Day 4: Google A2A Protocol - Agent-to-Agent Communication
 
 This implements a simple version of Google's Agent-to-Agent (A2A)
 communication protocol for standardized agent interaction.
+
+Workflows run as a DAG: each A2A request lists the correlation ids it
+depends on, and independent requests run at the same time on a worker
+pool. A workflow takes about as long as its longest chain of steps
+(the critical path), not the sum of all of them.
 """
 
 from crewai import Agent, Task, Crew, LLM
 from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import json
+import os
+import time
 
 from dotenv import load_dotenv
 
+from llm_cache import enable_completion_cache, get_completion_cache
+
 load_dotenv()
 
 # ==============================================================================
@@ -30,6 +40,7 @@ class A2AMessage(BaseModel):
     task: Dict[str, Any]
     timestamp: str = datetime.now().isoformat()
     correlation_id: Optional[str] = None
+    depends_on: list[str] = []  # correlation ids whose results this request needs
 
 class A2ACapabilities(BaseModel):
     """Agent capabilities declaration"""
@@ -43,7 +54,13 @@ class A2ACapabilities(BaseModel):
 # Create A2A-Enabled Agents
 # ==============================================================================
 
-llm = LLM(model="openai/gpt-4o-mini", temperature=0.7)
+# Workflow prompts are cached on disk (see llm_cache.py), so replaying the same
+# question reuses earlier completions instead of calling the LLM again
+llm = enable_completion_cache(
+    LLM(model="openai/gpt-4o-mini", temperature=0.7),
+    call_site="google_a2a_workflow",
+    cacheable=True
+)
 
 # Agent 1: Research Specialist
 research_agent = Agent(
@@ -90,7 +107,8 @@ def create_a2a_request(
     to_agent: str,
     task_description: str,
     task_input: Dict[str, Any],
-    correlation_id: Optional[str] = None
+    correlation_id: Optional[str] = None,
+    depends_on: Optional[list[str]] = None
 ) -> A2AMessage:
     """Create an A2A request message"""
     return A2AMessage(
@@ -102,7 +120,8 @@ def create_a2a_request(
             "input": task_input,
             "deadline": (datetime.now()).isoformat()
         },
-        correlation_id=correlation_id or datetime.now().isoformat()
+        correlation_id=correlation_id or datetime.now().isoformat(),
+        depends_on=depends_on or []
     )
 
 def process_a2a_request(message: A2AMessage, agent: Agent) -> A2AMessage:
@@ -145,97 +164,220 @@ def process_a2a_request(message: A2AMessage, agent: Agent) -> A2AMessage:
     
     return response
 
+# ==============================================================================
+# A2A Workflow Engine (DAG)
+# ==============================================================================
+# Steps are A2A requests. A step starts as soon as every correlation id in its
+# depends_on has a response. Up to A2A_WORKFLOW_WORKERS steps run at a time.
+# Placeholders like {task-001} in a step's task description are replaced with
+# that dependency's result.
+
+A2A_WORKFLOW_WORKERS = int(os.getenv("A2A_WORKFLOW_WORKERS", "4"))
+
+class A2AWorkflow:
+    """Runs A2A requests as a dependency graph, with per-step timing"""
+
+    def __init__(self, max_workers: int = A2A_WORKFLOW_WORKERS):
+        self.max_workers = max_workers
+        self.steps: Dict[str, tuple[A2AMessage, Agent]] = {}
+        self.responses: Dict[str, A2AMessage] = {}
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self.wall_seconds = 0.0
+
+    def add(self, message: A2AMessage, agent: Agent) -> A2AMessage:
+        """Add a step; its dependencies must already be in the workflow (so there are no cycles)"""
+        correlation_id = message.correlation_id
+        if correlation_id in self.steps:
+            raise ValueError(f"Duplicate correlation_id: {correlation_id}")
+        missing = [dep for dep in message.depends_on if dep not in self.steps]
+        if missing:
+            raise ValueError(f"Step {correlation_id} depends on unknown steps: {', '.join(missing)}")
+        self.steps[correlation_id] = (message, agent)
+        return message
+
+    def _run_step(self, message: A2AMessage, agent: Agent, started: float) -> A2AMessage:
+        description = message.task["description"]
+        for dep in message.depends_on:
+            description = description.replace("{" + dep + "}", self.responses[dep].task["result"])
+        request = message.model_copy(update={"task": {**message.task, "description": description}})
+
+        step_start = time.perf_counter()
+        # Steps for the same agent can run at once; each gets its own copy
+        response = process_a2a_request(request, agent.copy())
+        step_end = time.perf_counter()
+
+        self.timings[message.correlation_id] = {
+            "start_s": step_start - started,
+            "end_s": step_end - started,
+            "seconds": step_end - step_start,
+        }
+        return response
+
+    def run(self) -> Dict[str, A2AMessage]:
+        """Run every step, each as soon as its dependencies are done; returns correlation_id -> response"""
+        pending = dict(self.steps)
+        running = {}
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="a2a-step") as pool:
+            while pending or running:
+                ready = [cid for cid, (message, _) in pending.items()
+                         if all(dep in self.responses for dep in message.depends_on)]
+                for correlation_id in ready:
+                    message, agent = pending.pop(correlation_id)
+                    print(f"📤 Coordinator → {message.to_agent} [{correlation_id}]")
+                    running[pool.submit(self._run_step, message, agent, started)] = correlation_id
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    correlation_id = running.pop(future)
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        for other in running:
+                            other.cancel()
+                        raise RuntimeError(f"A2A step {correlation_id} failed: {str(e)}") from e
+                    self.responses[correlation_id] = response
+                    print(f"📥 {response.from_agent} → Coordinator [{correlation_id}] "
+                          f"({self.timings[correlation_id]['seconds']:.1f}s)")
+
+        self.wall_seconds = time.perf_counter() - started
+        return self.responses
+
+    def critical_path(self) -> list[str]:
+        """The chain of steps that decided the total time: last to finish, then its latest dependency, ..."""
+        if not self.timings:
+            return []
+        path = [max(self.timings, key=lambda cid: self.timings[cid]["end_s"])]
+        while True:
+            deps = self.steps[path[-1]][0].depends_on
+            if not deps:
+                break
+            path.append(max(deps, key=lambda cid: self.timings[cid]["end_s"]))
+        return list(reversed(path))
+
+    def stats(self) -> Dict[str, Any]:
+        path = self.critical_path()
+        step_seconds = sum(timing["seconds"] for timing in self.timings.values())
+        return {
+            "workers": self.max_workers,
+            "steps": {
+                cid: {
+                    "agent": self.steps[cid][0].to_agent,
+                    "depends_on": self.steps[cid][0].depends_on,
+                    **{key: round(value, 2) for key, value in timing.items()},
+                }
+                for cid, timing in self.timings.items()
+            },
+            "critical_path": path,
+            "critical_path_s": round(sum(self.timings[cid]["seconds"] for cid in path), 2),
+            "wall_s": round(self.wall_seconds, 2),
+            "sum_of_steps_s": round(step_seconds, 2),
+            "parallel_speedup": round(step_seconds / self.wall_seconds, 2) if self.wall_seconds else 0.0,
+        }
+
+    def print_report(self):
+        stats = self.stats()
+        print(f"⏱️  Workflow timing ({stats['workers']} workers)")
+        print(f"   {'step':<12}{'agent':<22}{'start':>7}{'end':>8}{'seconds':>9}  depends on")
+        for cid, step in stats["steps"].items():
+            print(f"   {cid:<12}{step['agent']:<22}{step['start_s']:>6.1f}s{step['end_s']:>7.1f}s"
+                  f"{step['seconds']:>8.1f}s  {', '.join(step['depends_on']) or '-'}")
+        print(f"   Critical path: {' → '.join(stats['critical_path'])} = {stats['critical_path_s']:.1f}s")
+        print(f"   Wall clock: {stats['wall_s']:.1f}s, sum of steps: {stats['sum_of_steps_s']:.1f}s "
+              f"({stats['parallel_speedup']:.2f}x from running steps in parallel)\n")
+
 # ==============================================================================
 # Multi-Agent A2A Workflow
 # ==============================================================================
 
+# Research sub-questions, one A2A request each; they don't depend on each
+# other, so they run in parallel
+RESEARCH_ANGLES = [
+    "current state and recent developments",
+    "key drivers, players and technologies",
+    "risks, limitations and open challenges",
+]
+
 def a2a_workflow(question: str):
     """
     Solve a question using A2A coordination
-    
+
+    Research (one step per angle, in parallel) → analysis → synthesis
+
     Args:
         question: The question to answer
-        
+
     Returns:
         Final synthesized answer
     """
-    
+
     print("\n" + "="*70)
     print("🌐 A2A PROTOCOL COORDINATION")
     print("="*70)
     print(f"\nQuestion: {question}\n")
-    
-    # Step 1: Coordinator creates research request
-    research_request = create_a2a_request(
+
+    workflow = A2AWorkflow()
+
+    # Step 1: Coordinator sends one research request per angle
+    research_ids = []
+    for index, angle in enumerate(RESEARCH_ANGLES, start=1):
+        correlation_id = f"task-{index:03d}"
+        workflow.add(create_a2a_request(
+            from_agent="coordinator",
+            to_agent="research_specialist",
+            task_description=f"Research the following question, focusing on {angle}: {question}",
+            task_input={"question": question, "angle": angle},
+            correlation_id=correlation_id
+        ), research_agent)
+        research_ids.append(correlation_id)
+
+    research_findings = "\n\n".join(f"{{{cid}}}" for cid in research_ids)
+
+    # Step 2: Analysis waits for all of the research
+    analysis_id = f"task-{len(research_ids) + 1:03d}"
+    workflow.add(create_a2a_request(
         from_agent="coordinator",
-        to_agent="research_specialist",
-        task_description=f"Research the following question: {question}",
+        to_agent="analysis_specialist",
+        task_description=f"Analyze these research findings:\n\n{research_findings}",
         task_input={"question": question},
-        correlation_id="task-001"
-    )
-    
-    print("📤 Coordinator → Research Specialist")
-    print(f"   Request: {research_request.task['description']}\n")
-    
-    # Step 2: Research agent processes request
-    research_response = process_a2a_request(research_request, research_agent)
-    
-    print("📥 Research Specialist → Coordinator")
-    print(f"   Status: {research_response.task['status']}")
-    print(f"   Result preview: {research_response.task['result'][:100]}...\n")
-    
-    # Step 3: Coordinator creates analysis request
-    analysis_request = create_a2a_request(
+        correlation_id=analysis_id,
+        depends_on=research_ids
+    ), analysis_agent)
+
+    # Step 3: Coordinator synthesizes research and analysis
+    synthesis_id = f"task-{len(research_ids) + 2:03d}"
+    workflow.add(create_a2a_request(
         from_agent="coordinator",
-        to_agent="analysis_specialist",
-        task_description=f"Analyze these research findings: {research_response.task['result']}",
-        task_input={"research": research_response.task['result']},
-        correlation_id="task-002"
-    )
-    
-    print("📤 Coordinator → Analysis Specialist")
-    print(f"   Request: Analyze research findings\n")
-    
-    # Step 4: Analysis agent processes request
-    analysis_response = process_a2a_request(analysis_request, analysis_agent)
-    
-    print("📥 Analysis Specialist → Coordinator")
-    print(f"   Status: {analysis_response.task['status']}")
-    print(f"   Result preview: {analysis_response.task['result'][:100]}...\n")
-    
-    # Step 5: Coordinator synthesizes
-    synthesis_task = Task(
-        description=f"""
+        to_agent="coordinator",
+        task_description=f"""
         Synthesize the following into a final answer for: {question}
-        
+
         Research findings:
-        {research_response.task['result']}
-        
+        {research_findings}
+
         Analysis insights:
-        {analysis_response.task['result']}
-        
+        {{{analysis_id}}}
+
         Provide a comprehensive, well-structured answer.
         """,
-        expected_output="Final synthesized answer",
-        agent=coordinator_agent,
-    )
-    
-    print("🔄 Coordinator: Synthesizing results...\n")
-    
-    crew = Crew(
-        agents=[coordinator_agent],
-        tasks=[synthesis_task],
-        verbose=False,
-    )
-    
-    final_result = crew.kickoff()
-    
+        task_input={"question": question},
+        correlation_id=synthesis_id,
+        depends_on=research_ids + [analysis_id]
+    ), coordinator_agent)
+
+    responses = workflow.run()
+    final_result = responses[synthesis_id].task["result"]
+
+    print()
+    workflow.print_report()
+
     print("="*70)
     print("✅ FINAL ANSWER (via A2A Coordination)")
     print("="*70)
     print(final_result)
     print("="*70 + "\n")
-    
+
     return final_result
 
 # ==============================================================================
@@ -253,6 +395,9 @@ if __name__ == "__main__":
     # question = input("Enter your question: ")
     
     result = a2a_workflow(question)
+    
+    # Completion cache hit rate and LLM time saved by replayed prompts
+    print(f"💾 LLM cache: {json.dumps(get_completion_cache().stats()['call_sites'], indent=2)}")
 
 # ==============================================================================
 # Tips for Students
@@ -266,7 +411,7 @@ EXPERIMENT WITH:
    
 2. Complex workflows:
    - Chain multiple agents together
-   - Create branching workflows
+   - Create branching workflows (A2AWorkflow + depends_on)
    - Implement conditional delegation
    
 3. Real A2A integration:
@@ -0,0 +1,188 @@
+"""
+LLM Completion Cache
+====================
+
+A disk-backed cache for LLM completions, shared by main.py (agent router)
+and google_a2a.py (workflow prompts).
+
+Many of our LLM calls are exact repeats: the same router prompt for the same
+query, the same workflow prompts when a test script is replayed. The cache
+wraps an LLM's call() method and stores completions in SQLite, keyed on
+model, temperature, messages and tools.
+
+Only safe calls are served from the cache:
+- deterministic calls (temperature 0), or
+- calls on an LLM explicitly marked cacheable=True
+Calls that execute tools (available_functions) are never cached.
+
+Usage:
+    from llm_cache import enable_completion_cache
+    router_llm = enable_completion_cache(LLM(model="openai/gpt-4o-mini", temperature=0), "router")
+"""
+
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", os.path.join("data", "llm_cache.db"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "true").lower() == "true"
+
+class CompletionCache:
+    """SQLite completion store, evicting least recently used rows past max_bytes"""
+
+    def __init__(self, path: str, max_bytes: int):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    call_site TEXT,
+                    response TEXT NOT NULL,
+                    latency REAL,
+                    size INTEGER,
+                    last_used REAL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used)")
+            self.total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+        self.sites: Dict[str, Dict[str, float]] = {}
+        self.evictions = 0
+
+    @staticmethod
+    def key(model: str, temperature: Any, messages: Any, tools: Any) -> str:
+        raw = json.dumps(
+            {"model": model, "temperature": temperature, "messages": messages, "tools": tools},
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _site(self, call_site: str) -> Dict[str, float]:
+        return self.sites.setdefault(call_site, {
+            "calls": 0, "uncacheable": 0, "hits": 0, "misses": 0, "saved_seconds": 0.0
+        })
+
+    def count(self, call_site: str, field: str):
+        with self._lock:
+            self._site(call_site)[field] += 1
+
+    def get(self, key: str, call_site: str) -> Any:
+        with self._lock:
+            row = self._db.execute("SELECT response, latency FROM completions WHERE key = ?", (key,)).fetchone()
+            site = self._site(call_site)
+            if not row:
+                site["misses"] += 1
+                return None
+            with self._db:
+                self._db.execute("UPDATE completions SET last_used = ? WHERE key = ?", (time.time(), key))
+            site["hits"] += 1
+            site["saved_seconds"] += row[1] or 0.0
+            return row[0]
+
+    def put(self, key: str, call_site: str, response: str, latency: float):
+        size = len(response.encode())
+        with self._lock, self._db:
+            old = self._db.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO completions (key, call_site, response, latency, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, call_site, response, latency, size, time.time())
+            )
+            self.total_bytes += size - (old[0] if old else 0)
+            while self.total_bytes > self.max_bytes:
+                oldest = self._db.execute(
+                    "SELECT key, size FROM completions ORDER BY last_used LIMIT 1"
+                ).fetchone()
+                if not oldest:
+                    break
+                self._db.execute("DELETE FROM completions WHERE key = ?", (oldest[0],))
+                self.total_bytes -= oldest[1]
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            sites = {}
+            for call_site, site in self.sites.items():
+                lookups = site["hits"] + site["misses"]
+                sites[call_site] = {
+                    **site,
+                    "saved_seconds": round(site["saved_seconds"], 2),
+                    "hit_rate": round(site["hits"] / lookups, 3) if lookups else 0.0,
+                }
+            return {
+                "enabled": LLM_CACHE_ENABLED,
+                "entries": rows,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "call_sites": sites,
+            }
+
+_cache: Optional[CompletionCache] = None
+_cache_lock = threading.Lock()
+
+def get_completion_cache() -> CompletionCache:
+    """The process-wide cache (opened on first use)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CompletionCache(LLM_CACHE_DB, LLM_CACHE_MAX_BYTES)
+        return _cache
+
+def enable_completion_cache(llm: Any, call_site: str, cacheable: bool = False) -> Any:
+    """
+    Route llm.call() through the completion cache
+
+    Args:
+        llm: A crewai LLM instance (patched in place and returned)
+        call_site: Name used to report hit rate / saved latency
+        cacheable: Cache even when temperature isn't 0 (the caller accepts
+            that repeated calls return the same completion)
+
+    Returns:
+        The same llm, for chaining
+    """
+    if not LLM_CACHE_ENABLED:
+        return llm
+
+    cache = get_completion_cache()
+    original_call = llm.call
+
+    @functools.wraps(original_call)
+    def cached_call(messages, *args, **kwargs):
+        cache.count(call_site, "calls")
+        # LLM.call(messages, tools=None, callbacks=None, available_functions=None, ...)
+        tools = kwargs.get("tools", args[0] if len(args) > 0 else None)
+        available_functions = kwargs.get("available_functions", args[2] if len(args) > 2 else None)
+        temperature = getattr(llm, "temperature", None)
+        deterministic = temperature == 0
+        if not (deterministic or cacheable) or available_functions:
+            cache.count(call_site, "uncacheable")
+            return original_call(messages, *args, **kwargs)
+
+        key = cache.key(getattr(llm, "model", ""), temperature, messages, tools)
+        cached = cache.get(key, call_site)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        response = original_call(messages, *args, **kwargs)
+        if isinstance(response, str):
+            cache.put(key, call_site, response, time.perf_counter() - start)
+        return response
+
+    # object.__setattr__ also works on pydantic-based LLM classes; the instance
+    # attribute shadows the class method (and survives agent.copy())
+    object.__setattr__(llm, "call", cached_call)
+    return llm
@@ -34,8 +34,9 @@ Logging:
 - Check logs to debug A2A routing issues
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from datetime import datetime
 from dotenv import load_dotenv
@@ -43,18 +44,55 @@ import os
 import re
 import httpx
 import logging
+import asyncio
+import threading
+import time
+import hashlib
+import math
+import random
+from contextlib import asynccontextmanager, contextmanager
 import json
-from typing import Optional, Dict, Any
+import sqlite3
+import uuid
+import numpy as np
+from collections import deque, OrderedDict
+from typing import Optional, Dict, Any, Callable, AsyncIterator, Awaitable
+from concurrent.futures import ThreadPoolExecutor
 
 from crewai import Agent, Task, Crew, LLM
+from openai import OpenAI
+
+from llm_cache import enable_completion_cache, get_completion_cache
+from tool_cache import cache_tools, get_tool_cache
 from crewai.tools import BaseTool
 from crewai_tools import DirectoryReadTool, FileReadTool, SerperDevTool, WebsiteSearchTool, YoutubeVideoSearchTool, FirecrawlSearchTool, FirecrawlCrawlWebsiteTool, FirecrawlScrapeWebsiteTool, DallETool, PDFSearchTool
 from pydantic import Field
 from typing import Type
 
+# CrewAI's event bus (LLM token chunks, tool events) powers /query/stream.
+# It lives in crewai.events since crewai 1.0 (crewai.utilities.events before);
+# versions without it turn streaming off.
+try:
+    from crewai.events import crewai_event_bus, LLMStreamChunkEvent, ToolUsageStartedEvent, ToolUsageFinishedEvent
+except ImportError:
+    try:
+        from crewai.utilities.events import crewai_event_bus, LLMStreamChunkEvent, ToolUsageStartedEvent, ToolUsageFinishedEvent
+    except ImportError:
+        crewai_event_bus = None
+
+# HTTP/2 for the shared outbound client needs the h2 package (httpx[http2]);
+# without it the client falls back to HTTP/1.1 keep-alive
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
 # Load environment variables
 load_dotenv()
 
+STREAMING_ENABLED = crewai_event_bus is not None and os.getenv("QUERY_STREAMING", "true").lower() == "true"
+
 # ==============================================================================
 # Logging Setup
 # ==============================================================================
@@ -110,12 +148,39 @@ class QueryResponse(BaseModel):
     answer: str
     timestamp: str
     processing_time: float
+    queue_wait_time: float = 0.0  # Seconds spent waiting for an admission slot
+    cached: bool = False  # True when served from the response cache
+
+class BatchQueryRequest(BaseModel):
+    """Batch of queries answered concurrently"""
+    queries: list[QueryRequest]
+    parallelism: Optional[int] = None  # Default (and cap): BATCH_MAX_PARALLELISM
+    stream: bool = False  # True: send each result as an SSE event as soon as it completes
+
+class BatchItemResult(BaseModel):
+    """Result for one query of a batch"""
+    index: int
+    question: str
+    ok: bool
+    answer: Optional[str] = None
+    error: Optional[str] = None
+    processing_time: float
+    queue_wait_time: float = 0.0
+
+class BatchQueryResponse(BaseModel):
+    """Batch results, in request order"""
+    results: list[BatchItemResult]
+    succeeded: int
+    failed: int
+    timestamp: str
+    processing_time: float
 
 class A2AMessage(BaseModel):
     """A2A message format (NEST-style)"""
     content: Dict[str, Any]  # {"text": "message", "type": "text"}
     role: str = "user"
     conversation_id: str
+    fanout_strategy: Optional[str] = None  # concatenate | first_success | llm_merge (several @mentions)
 
 class A2AResponse(BaseModel):
     """A2A response format"""
@@ -124,6 +189,7 @@ class A2AResponse(BaseModel):
     conversation_id: str
     timestamp: str
     agent_id: str
+    fanout: Optional[list[Dict[str, Any]]] = None  # per-target results when fanned out
 
 class HealthResponse(BaseModel):
     """Health check response"""
@@ -144,6 +210,26 @@ class SearchResponse(BaseModel):
     agent_response: str
     timestamp: str
     processing_time: float
+    routing: Dict[str, Any] = {}
+
+class JobRequest(BaseModel):
+    """Async job request - returns a job id right away"""
+    question: str
+    user_id: str = "anonymous"
+    callback_url: Optional[str] = None  # POSTed the finished JobResponse
+    idempotency_key: Optional[str] = None  # Retries with the same key reuse the job
+
+class JobResponse(BaseModel):
+    """Async job status"""
+    job_id: str
+    status: str  # "queued", "running", "succeeded", "failed"
+    question: str
+    answer: Optional[str] = None
+    error: Optional[str] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    processing_time: Optional[float] = None
 
 # ==============================================================================
 # Agent Registry
@@ -244,14 +330,18 @@ available_tools = [
 if search_tool:
     available_tools.append(search_tool)
 
+# Serve repeated web/search/RAG calls from the tool result cache (per-tool TTLs)
+available_tools = cache_tools(available_tools)
+
 # ==============================================================================
 # Agent Setup (from Day 3)
 # ==============================================================================
 
-# Initialize LLM
+# Initialize LLM (stream=True makes it publish token chunks for /query/stream)
 llm = LLM(
     model="openai/gpt-4o-mini",
     temperature=0.7,
+    stream=STREAMING_ENABLED,
 )
 
 # Create agent with memory and tools
@@ -318,54 +408,1676 @@ my_agent_twin = Agent(
 )
 
 # ==============================================================================
-# Registry Helper Functions
+# Crew Setup (Built once per pool slot, reused across requests)
 # ==============================================================================
 
-async def fetch_agents_from_registry():
+def build_crew() -> Crew:
     """
-    Fetch all registered agents from the central registry
-    Updates the KNOWN_AGENTS dictionary with username -> A2A endpoint mappings
+    Build one crew for the pool
+
+    Each crew gets its own copy of the agent (the tools and LLM are shared)
+    and a task template that is filled in with the question at kickoff time.
     """
+    agent = my_agent_twin.copy()
+    task = Task(
+        description="""
+        Answer the following question: {question}
+        
+        Use your memory to recall relevant context.
+        Use your tools when you need external information or calculations.
+        Provide accurate, helpful responses.
+        """,
+        expected_output="A clear, context-aware answer using memory and tools as needed",
+        agent=agent,
+    )
+    return Crew(
+        agents=[agent],
+        tasks=[task],
+        memory=True,
+        verbose=False,
+    )
+
+# ==============================================================================
+# Crew Execution Layer
+# ==============================================================================
+# crew.kickoff() is blocking (LLM calls, tool I/O). Calling it directly from an
+# async endpoint freezes the event loop - even /health stops answering. Every
+# crew run is dispatched to a bounded thread pool instead, so the loop stays
+# responsive and the number of concurrent crew runs is capped.
+
+CREW_WORKERS = int(os.getenv("CREW_WORKERS", "4"))
+
+class CrewExecutor:
+    """Runs blocking crew work on a bounded thread pool"""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crew")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _job(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on the pool and await its result"""
+        with self._lock:
+            self.queued += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self._job, fn, args, kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "busy_workers": self.running,
+                "idle_workers": self.max_workers - self.running,
+                "queue_depth": self.queued,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+crew_executor = CrewExecutor(CREW_WORKERS)
+
+# ==============================================================================
+# Crew Pool
+# ==============================================================================
+# Building a Crew with memory=True sets up all of its memory storages, which is
+# too slow to repeat on every request - but one shared crew is not safe to run
+# concurrently. The pool pre-builds crews (memory already attached) and each
+# request checks one out for the duration of its kickoff.
+
+CREW_POOL_SIZE = int(os.getenv("CREW_POOL_SIZE", str(CREW_WORKERS)))
+CREW_POOL_WARM = int(os.getenv("CREW_POOL_WARM", "1"))
+
+class CrewPool:
+    """Bounded pool of pre-built crews"""
+
+    def __init__(self, factory: Callable[[], Crew], max_size: int):
+        self.factory = factory
+        self.max_size = max_size
+        self._idle: list[Crew] = []
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.checkouts = 0
+        self.reused = 0
+        self.build_seconds = 0.0
+
+    def _build(self) -> Crew:
+        start = time.perf_counter()
+        crew = self.factory()
+        with self._lock:
+            self.created += 1
+            self.build_seconds += time.perf_counter() - start
+        return crew
+
+    def warm_up(self, count: int):
+        """Pre-build up to `count` crews so the first requests skip setup"""
+        for _ in range(max(0, min(count, self.max_size - self.created))):
+            crew = self._build()
+            with self._lock:
+                self._idle.append(crew)
+
+    @contextmanager
+    def checkout(self):
+        """Hold a crew for the duration of the block (blocks while all are in use)"""
+        with self._slots:
+            with self._lock:
+                self.checkouts += 1
+                crew = self._idle.pop() if self._idle else None
+                if crew is not None:
+                    self.reused += 1
+            if crew is None:
+                crew = self._build()
+            try:
+                yield crew
+            finally:
+                with self._lock:
+                    self._idle.append(crew)
+
+    def kickoff(self, inputs: Dict[str, Any]) -> Any:
+        """
+        Check out a crew, run it, and return it to the pool
+
+        Blocking - call it through crew_executor so it runs on a worker thread.
+        """
+        with self.checkout() as crew:
+            return crew.kickoff(inputs=inputs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            avg_build = self.build_seconds / self.created if self.created else 0.0
+            return {
+                "max_size": self.max_size,
+                "created": self.created,
+                "idle": len(self._idle),
+                "in_use": self.created - len(self._idle),
+                "checkouts": self.checkouts,
+                "reused": self.reused,
+                "avg_build_ms": round(avg_build * 1000, 1),
+                "setup_saved_s": round(self.reused * avg_build, 2),
+            }
+
+crew_pool = CrewPool(build_crew, CREW_POOL_SIZE)
+
+# ==============================================================================
+# Admission Control
+# ==============================================================================
+# Without a limit, requests pile up behind slow LLM calls until every client
+# times out. At most MAX_IN_FLIGHT requests are processed at once and at most
+# MAX_QUEUE wait for a slot; beyond that we fail fast with 429 + Retry-After.
+
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", str(CREW_WORKERS)))
+MAX_QUEUE = int(os.getenv("MAX_QUEUE", "16"))
+
+class AdmissionController:
+    """Bounded in-flight limit with a bounded wait queue"""
+
+    def __init__(self, max_in_flight: int, max_queue: int):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.avg_service_s = 5.0  # EWMA of time spent holding a slot
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up for a new request"""
+        backlog = (self.waiting + 1) / self.max_in_flight
+        return max(1, math.ceil(backlog * self.avg_service_s))
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a slot for the duration of the block; yields queue wait seconds"""
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Server is at capacity, please retry later",
+                headers={"Retry-After": str(self.retry_after())}
+            )
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        admitted_at = time.perf_counter()
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield admitted_at - queued_at
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            service_s = time.perf_counter() - admitted_at
+            self.avg_service_s = 0.8 * self.avg_service_s + 0.2 * service_s
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_service_s": round(self.avg_service_s, 2),
+        }
+
+    def load_hint(self) -> Dict[str, Any]:
+        """Current load, published at GET /load for callers' endpoint resolvers"""
+        busy = self.in_flight + self.waiting
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "capacity": self.max_in_flight,
+            "utilization": round(busy / self.max_in_flight, 2),
+            "avg_service_s": round(self.avg_service_s, 2),
+            "expected_wait_s": round(max(0, busy + 1 - self.max_in_flight) / self.max_in_flight * self.avg_service_s, 2),
+        }
+
+admission = AdmissionController(MAX_IN_FLIGHT, MAX_QUEUE)
+
+async def admit_request() -> AsyncIterator[float]:
+    """FastAPI dependency - holds an admission slot for the whole request"""
+    async with admission.admit() as queue_wait:
+        yield queue_wait
+
+# ==============================================================================
+# Request Coalescing (Single-Flight)
+# ==============================================================================
+# During battle rounds many callers ask the same question within the same
+# second. Identical concurrent questions are coalesced: the first one runs the
+# crew, the rest wait on that same execution and share its response.
+
+# Fingerprint of everything that shapes an answer besides the question itself
+PERSONA_HASH = hashlib.sha256("\n".join([
+    my_agent_twin.role,
+    my_agent_twin.goal,
+    my_agent_twin.backstory,
+    ",".join(sorted(tool.name for tool in available_tools)),
+]).encode()).hexdigest()[:16]
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+def coalesce_key(question: str, user_id: str, store: bool = True) -> str:
+    """Single-flight key: same persona, user and storage directive only"""
+    key = f"{PERSONA_HASH}:{user_id}:{normalize_question(question)}"
+    return key if store else f"{key}:no-store"
+
+class SingleFlight:
+    """Runs at most one execution per key; concurrent callers share its result"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is None:
+            # Run as its own task so a disconnecting caller can't cancel the
+            # execution the other callers are waiting on
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,  # crew runs (and LLM calls) saved
+        }
+
+single_flight = SingleFlight()
+
+# ==============================================================================
+# Response Cache
+# ==============================================================================
+# Repeated questions ("What are my interests?") don't need a new crew run.
+# Answers are cached per (persona, user, normalized question) with a TTL, in
+# an LRU-bounded memory tier and - when RESPONSE_CACHE_DB is set - a SQLite
+# tier that survives restarts. Clients can skip the cache with
+# "Cache-Control: no-cache" (don't read) or "no-store" (don't read or write).
+
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB", "")  # e.g. "response_cache.db"
+RESPONSE_CACHE_DB_MAX_ROWS = int(os.getenv("RESPONSE_CACHE_DB_MAX_ROWS", "10000"))
+
+class ResponseCache:
+    """TTL + LRU response cache with an optional SQLite tier"""
+
+    def __init__(self, max_entries: int, ttl: int, db_path: str = "", db_max_rows: int = 10000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_max_rows = db_max_rows
+        self._entries: OrderedDict[str, tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            with self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires_at REAL, payload TEXT)"
+                )
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bypasses = 0
+
+    @staticmethod
+    def key(question: str, user_id: str) -> str:
+        raw = f"{PERSONA_HASH}:{user_id}:{normalize_question(question)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry:
+            expires_at, payload = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return payload
+            del self._entries[key]
+            self.expirations += 1
+
+        if self._db:
+            row = self._db.execute(
+                "SELECT expires_at, payload FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row:
+                payload = json.loads(row[1])
+                self._remember(key, row[0], payload)
+                self.disk_hits += 1
+                return payload
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, payload: Dict[str, Any], ttl: Optional[int] = None):
+        expires_at = time.time() + (ttl or self.ttl)
+        self._remember(key, expires_at, payload)
+        if self._db:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, expires_at, payload) VALUES (?, ?, ?)",
+                    (key, expires_at, json.dumps(payload))
+                )
+                # Keep the disk tier bounded: drop expired rows, then the soonest to expire
+                self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+                self._db.execute(
+                    "DELETE FROM responses WHERE key NOT IN "
+                    "(SELECT key FROM responses ORDER BY expires_at DESC LIMIT ?)", (self.db_max_rows,)
+                )
+
+    def _remember(self, key: str, expires_at: float, payload: Dict[str, Any]):
+        self._entries[key] = (expires_at, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl,
+            "disk_tier": self._db is not None,
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "bypasses": self.bypasses,
+        }
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_DB, RESPONSE_CACHE_DB_MAX_ROWS)
+
+def cache_directives(cache_control: Optional[str]) -> set[str]:
+    return {part.strip().lower() for part in (cache_control or "").split(",") if part.strip()}
+
+# ==============================================================================
+# Semantic Answer Cache
+# ==============================================================================
+# The response cache only matches identical questions, so "where's my hometown"
+# and "what town did I grow up in" both miss. The semantic cache embeds each
+# question and keeps a nearest-neighbour index of past questions per persona
+# and user (like the response cache key); a past question above SEMANTIC_CACHE_THRESHOLD cosine similarity serves its
+# stored answer. Each index is bounded and evicts its least recently used entry.
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "2048"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+class VectorIndex:
+    """Bounded in-memory cosine-similarity index over unit vectors"""
+
+    def __init__(self, dim: int, max_entries: int):
+        self.max_entries = max_entries
+        self.size = 0
+        capacity = min(64, max_entries)
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.expires_at = np.zeros(capacity)
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.payloads: list[Any] = [None] * capacity
+        self.evictions = 0
+
+    def search(self, vector: np.ndarray, now: float) -> tuple[int, float]:
+        """Return (row, similarity) of the nearest live entry, or (-1, 0.0)"""
+        if not self.size:
+            return -1, 0.0
+        similarities = self.vectors[:self.size] @ vector
+        similarities[self.expires_at[:self.size] <= now] = -1.0
+        row = int(np.argmax(similarities))
+        return row, float(similarities[row])
+
+    def add(self, vector: np.ndarray, payload: Any, expires_at: float, tick: int):
+        if self.size < self.max_entries:
+            if self.size == len(self.vectors):
+                self._grow()
+            row = self.size
+            self.size += 1
+        else:
+            row = int(np.argmin(self.last_used))
+            self.evictions += 1
+        self.vectors[row] = vector
+        self.expires_at[row] = expires_at
+        self.last_used[row] = tick
+        self.payloads[row] = payload
+
+    def _grow(self):
+        capacity = min(len(self.vectors) * 2, self.max_entries)
+        extra = capacity - len(self.vectors)
+        self.vectors = np.vstack([self.vectors, np.zeros((extra, self.vectors.shape[1]), dtype=np.float32)])
+        self.expires_at = np.concatenate([self.expires_at, np.zeros(extra)])
+        self.last_used = np.concatenate([self.last_used, np.zeros(extra, dtype=np.int64)])
+        self.payloads.extend([None] * extra)
+
+class SemanticCache:
+    """Per-namespace (persona + user) semantic answer cache"""
+
+    def __init__(self, threshold: float, max_entries: int, ttl: int):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._indexes: Dict[str, VectorIndex] = {}
+        self._tick = 0
+        self.hits = 0
+        self.misses = 0
+        self.search_seconds = 0.0
+
+    def get(self, namespace: str, vector: np.ndarray) -> Optional[Dict[str, Any]]:
+        start = time.perf_counter()
+        index = self._indexes.get(namespace)
+        row, similarity = index.search(vector, time.time()) if index else (-1, 0.0)
+        self.search_seconds += time.perf_counter() - start
+        if row < 0 or similarity < self.threshold:
+            self.misses += 1
+            return None
+        self._tick += 1
+        index.last_used[row] = self._tick
+        self.hits += 1
+        return index.payloads[row]
+
+    def put(self, namespace: str, vector: np.ndarray, payload: Dict[str, Any]):
+        index = self._indexes.get(namespace)
+        if index is None:
+            index = self._indexes[namespace] = VectorIndex(len(vector), self.max_entries)
+        self._tick += 1
+        index.add(vector, payload, time.time() + self.ttl, self._tick)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": SEMANTIC_CACHE_ENABLED,
+            "threshold": self.threshold,
+            "namespaces": len(self._indexes),
+            "entries": sum(index.size for index in self._indexes.values()),
+            "max_entries_per_namespace": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": sum(index.evictions for index in self._indexes.values()),
+            "avg_search_ms": round(self.search_seconds / lookups * 1000, 3) if lookups else 0.0,
+            "avg_embed_ms": round(embedding_stats["seconds"] / embedding_stats["calls"] * 1000, 1) if embedding_stats["calls"] else 0.0,
+        }
+
+semantic_cache = SemanticCache(SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+_embedding_client: Optional[OpenAI] = None
+embedding_stats = {"calls": 0, "failures": 0, "seconds": 0.0}
+
+def embed_texts(texts: list[str], batch_size: int = 256) -> np.ndarray:
+    """Unit-length embeddings of texts, one row each (blocking - call via asyncio.to_thread)"""
+    global _embedding_client
+    if _embedding_client is None:
+        _embedding_client = OpenAI()
+    rows = []
+    for offset in range(0, len(texts), batch_size):
+        start = time.perf_counter()
+        data = _embedding_client.embeddings.create(model=EMBEDDING_MODEL, input=texts[offset:offset + batch_size]).data
+        embedding_stats["calls"] += 1
+        embedding_stats["seconds"] += time.perf_counter() - start
+        rows.extend(item.embedding for item in sorted(data, key=lambda item: item.index))
+    vectors = np.asarray(rows, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+def embed_text(text: str) -> np.ndarray:
+    """Unit-length embedding of text (blocking - call via asyncio.to_thread)"""
+    return embed_texts([text])[0]
+
+async def embed_question(question: str) -> Optional[np.ndarray]:
+    """Embed a question for the semantic cache; None if embeddings are unavailable"""
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(REGISTRY_URL)
+        return await asyncio.to_thread(embed_text, normalize_question(question))
+    except Exception as e:
+        embedding_stats["failures"] += 1
+        print(f"⚠️ Embedding failed, skipping semantic cache: {str(e)}")
+        return None
+
+async def cached_query(request: QueryRequest, cache_control: Optional[str] = None) -> tuple[QueryResponse, str]:
+    """Answer from the caches when possible; returns (response, "HIT" | "SEMANTIC-HIT" | "MISS" | "BYPASS")"""
+    directives = cache_directives(cache_control)
+    bypass = "no-cache" in directives or "no-store" in directives
+    store = "no-store" not in directives
+    key = ResponseCache.key(request.question, request.user_id)
+    # Same scope as the exact key, so one user's answers never reach another
+    namespace = f"{PERSONA_HASH}:{request.user_id}"
+    vector = None
+
+    if bypass:
+        response_cache.bypasses += 1
+    else:
+        start = time.perf_counter()
+        cached = response_cache.get(key)
+        cache_status = "HIT"
+        if not cached:
+            # Exact miss - try a paraphrase of a question we already answered
+            vector = await embed_question(request.question)
+            if vector is not None:
+                cached = semantic_cache.get(namespace, vector)
+                cache_status = "SEMANTIC-HIT"
+        if cached:
+            return QueryResponse(**{
+                **cached,
+                "processing_time": time.perf_counter() - start,
+                "queue_wait_time": 0.0,
+                "cached": True,
+            }), cache_status
+
+    async def run_and_store() -> QueryResponse:
+        nonlocal vector
+        response = await run_query(request)
+        if store:
+            payload = response.model_dump()
+            response_cache.put(key, payload)
+            if vector is None:
+                vector = await embed_question(request.question)
+            if vector is not None:
+                semantic_cache.put(namespace, vector, payload)
+        return response
+
+    # Identical concurrent misses from the same user share one crew run; only
+    # the caller that started it stores the answer (followers would insert
+    # duplicates). no-store callers get their own flight so they never join a
+    # leader that is about to store
+    response = await single_flight.do(coalesce_key(request.question, request.user_id, store), run_and_store)
+    return response, "BYPASS" if bypass else "MISS"
+
+# ==============================================================================
+# Async Job API
+# ==============================================================================
+# Research-style questions (Firecrawl, website RAG) can outlive any HTTP
+# timeout. POST /jobs stores the question in a durable SQLite table and returns
+# a job id right away; a bounded set of workers runs the jobs and callers poll
+# GET /jobs/{id} (or get a callback). Retrying with the same idempotency_key
+# returns the existing job instead of running the work again.
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+os.makedirs(DATA_DIR, exist_ok=True)
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(DATA_DIR, "jobs.db"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+
+class JobStore:
+    """SQLite-backed job table"""
+
+    COLUMNS = ["job_id", "idempotency_key", "question", "user_id", "callback_url",
+               "status", "answer", "error", "created_at", "started_at", "finished_at"]
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    idempotency_key TEXT UNIQUE,
+                    question TEXT NOT NULL,
+                    user_id TEXT,
+                    callback_url TEXT,
+                    status TEXT NOT NULL,
+                    answer TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+            """)
+
+    def create(self, request: JobRequest) -> tuple[Dict[str, Any], bool]:
+        """Insert a queued job; returns (job, created) - existing job on a repeated idempotency_key"""
+        with self._lock, self._db:
+            if request.idempotency_key:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE idempotency_key = ?", (request.idempotency_key,)
+                ).fetchone()
+                if row:
+                    return dict(row), False
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "idempotency_key": request.idempotency_key,
+                "question": request.question,
+                "user_id": request.user_id,
+                "callback_url": request.callback_url,
+                "status": "queued",
+                "answer": None,
+                "error": None,
+                "created_at": datetime.now().isoformat(),
+                "started_at": None,
+                "finished_at": None,
+            }
+            self._db.execute(
+                f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                [job[column] for column in self.COLUMNS]
+            )
+            return job, True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            return dict(row) if row else None
+
+    def update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock, self._db:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", [*fields.values(), job_id])
+
+    def delete(self, job_id: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def unfinished(self) -> list[str]:
+        """Ids of jobs that were queued or running when the server last stopped"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT job_id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+            return [row["job_id"] for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+            return {row["status"]: row["n"] for row in rows}
+
+class JobRunner:
+    """Bounded pool of asyncio workers that execute queued jobs"""
+
+    def __init__(self, store: JobStore, workers: int, queue_size: int):
+        self.store = store
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # Jobs interrupted by a restart; unbounded, since up to
+        # queue_size + workers jobs can be unfinished
+        self._recovered: deque = deque()
+        self._tasks: list[asyncio.Task] = []
+        self.busy = 0
+
+    def start(self):
+        for job_id in self.store.unfinished():
+            # Interrupted jobs are picked up again after a restart, ahead of new ones
+            self.store.update(job_id, status="queued", started_at=None)
+            self._recovered.append(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def submit(self, job_id: str) -> bool:
+        """Queue a job; returns False if the queue is full"""
+        try:
+            self._queue.put_nowait(job_id)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _worker(self):
+        while True:
+            recovered = bool(self._recovered)
+            job_id = self._recovered.popleft() if recovered else await self._queue.get()
+            self.busy += 1
+            try:
+                await self._run(job_id)
+            finally:
+                self.busy -= 1
+                if not recovered:
+                    self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        if not job or job["status"] != "queued":
+            return
+        self.store.update(job_id, status="running", started_at=datetime.now().isoformat())
+        try:
+            result = await crew_executor.run(crew_pool.kickoff, {"question": job["question"]})
+            self.store.update(job_id, status="succeeded", answer=str(result.raw),
+                              finished_at=datetime.now().isoformat())
+        except Exception as e:
+            self.store.update(job_id, status="failed", error=str(e),
+                              finished_at=datetime.now().isoformat())
+
+        if job["callback_url"]:
+            await self._send_callback(job["callback_url"], job_to_response(self.store.get(job_id)))
+
+    async def _send_callback(self, callback_url: str, job: JobResponse):
+        try:
+            response = await http_clients.post(callback_url, json=job.model_dump(), timeout=10.0)
             response.raise_for_status()
-            data = response.json()
-            
-            # Handle both old and new API formats
-            agents = data.get("agents", [])
-            if not agents and isinstance(data, list):
-                # New API might return list directly
-                agents = data
-            
-            print(f"📥 Fetched {len(agents)} agents from registry")
-            
-            # Update KNOWN_AGENTS with username -> A2A endpoint mapping
-            for agent in agents:
-                # Support both old (username/url) and new (agent_id/endpoint) formats
-                username = agent.get("agent_id") or agent.get("username")
-                url = agent.get("endpoint") or agent.get("url", "")
+        except Exception as e:
+            print(f"⚠️ Job callback to {callback_url} failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "busy_workers": self.busy,
+            "queue_depth": self._queue.qsize() + len(self._recovered),
+            "jobs": self.store.counts(),
+        }
+
+def job_to_response(job: Dict[str, Any]) -> JobResponse:
+    processing_time = None
+    if job["started_at"] and job["finished_at"]:
+        processing_time = (datetime.fromisoformat(job["finished_at"])
+                           - datetime.fromisoformat(job["started_at"])).total_seconds()
+    return JobResponse(
+        job_id=job["job_id"],
+        status=job["status"],
+        question=job["question"],
+        answer=job["answer"],
+        error=job["error"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+        processing_time=processing_time
+    )
+
+job_store = JobStore(JOBS_DB_PATH)
+job_runner = JobRunner(job_store, JOB_WORKERS, JOB_QUEUE_SIZE)
+
+# ==============================================================================
+# Streaming (Server-Sent Events)
+# ==============================================================================
+# POST /query only answers once the whole crew run is done. POST /query/stream
+# sends progress as SSE instead: LLM tokens as they arrive, tool start/finish
+# events and finally the answer. CrewAI publishes these on a global event bus,
+# so each stream registers a sink under the id of its pooled crew's agent (every
+# pooled crew has its own agent copy) and the bus handlers route events by the
+# agent they came from. crewai 1.x runs most handlers on the bus's own thread
+# pool, so the emitting thread can't be used; it is only the fallback for
+# older versions, whose token events carry no agent but run handlers inline.
+
+_stream_sinks: Dict[str, Callable[[str, Dict[str, Any]], None]] = {}
+_stream_tasks: set = set()
+
+def _stream_sink_for(event: Any) -> Optional[Callable[[str, Dict[str, Any]], None]]:
+    agent = getattr(event, "agent", None)
+    agent_id = getattr(event, "agent_id", None) or (str(agent.id) if getattr(agent, "id", None) else None)
+    sink = _stream_sinks.get(f"agent:{agent_id}") if agent_id else None
+    return sink or _stream_sinks.get(f"thread:{threading.get_ident()}")
+
+def _emit_stream_event(event: Any, kind: str, data: Dict[str, Any]):
+    sink = _stream_sink_for(event)
+    if sink:
+        sink(kind, data)
+
+if STREAMING_ENABLED:
+    @crewai_event_bus.on(LLMStreamChunkEvent)
+    def _on_llm_chunk(source, event):
+        _emit_stream_event(event, "token", {"text": event.chunk})
+
+    @crewai_event_bus.on(ToolUsageStartedEvent)
+    def _on_tool_started(source, event):
+        _emit_stream_event(event, "tool_started", {"tool": event.tool_name})
+
+    @crewai_event_bus.on(ToolUsageFinishedEvent)
+    def _on_tool_finished(source, event):
+        _emit_stream_event(event, "tool_finished", {"tool": event.tool_name})
+
+def kickoff_with_sink(question: str, sink: Callable[[str, Dict[str, Any]], None]) -> Any:
+    """Run a pooled crew, forwarding its events to sink (runs on a worker thread)"""
+    with crew_pool.checkout() as crew:
+        keys = [f"agent:{agent.id}" for agent in crew.agents] + [f"thread:{threading.get_ident()}"]
+        for key in keys:
+            _stream_sinks[key] = sink
+        try:
+            return crew.kickoff(inputs={"question": question})
+        finally:
+            for key in keys:
+                _stream_sinks.pop(key, None)
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class StreamMetrics:
+    """Time-to-first-token and total latency of recent streams"""
+
+    def __init__(self, window: int = 200):
+        self.streams = 0
+        self._ttft = deque(maxlen=window)
+        self._total = deque(maxlen=window)
+
+    def record(self, ttft: Optional[float], total: float):
+        self.streams += 1
+        if ttft is not None:
+            self._ttft.append(ttft)
+        self._total.append(total)
+
+    @staticmethod
+    def _pct(values, pct: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))], 3)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": STREAMING_ENABLED,
+            "streams": self.streams,
+            "ttft_p50_s": self._pct(self._ttft, 50),
+            "ttft_p95_s": self._pct(self._ttft, 95),
+            "total_p50_s": self._pct(self._total, 50),
+            "total_p95_s": self._pct(self._total, 95),
+        }
+
+stream_metrics = StreamMetrics()
+
+# ==============================================================================
+# Batch Queries
+# ==============================================================================
+# Evaluators that send many questions would otherwise pay one HTTP round trip
+# and one serial crew run per question. A batch runs its queries concurrently
+# (bounded by its parallelism) through the same cache/coalescing/admission
+# path as /query, so duplicate questions inside a batch share a single crew run.
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "100"))
+BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", str(MAX_IN_FLIGHT)))
+
+async def run_batch_item(index: int, item: QueryRequest, slots: asyncio.Semaphore) -> BatchItemResult:
+    """Answer one batch item; failures are reported on the item, not raised"""
+    async with slots:
+        start = time.perf_counter()
+        try:
+            response, _ = await cached_query(item)
+            return BatchItemResult(
+                index=index,
+                question=item.question,
+                ok=True,
+                answer=response.answer,
+                processing_time=time.perf_counter() - start,
+                queue_wait_time=response.queue_wait_time
+            )
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            return BatchItemResult(
+                index=index,
+                question=item.question,
+                ok=False,
+                error=error,
+                processing_time=time.perf_counter() - start
+            )
+
+# ==============================================================================
+# Outbound HTTP Client
+# ==============================================================================
+# One application-lifetime httpx client for every outbound call (A2A messages,
+# registry fetches). Its per-host keep-alive pools mean a hop to another agent
+# reuses an open connection instead of paying a new TCP+TLS handshake, and with
+# HTTP/2 concurrent messages to the same agent share one connection. At startup
+# it pre-connects to the agents we talk to most.
+
+HTTP2_ENABLED = H2_AVAILABLE and os.getenv("HTTP2", "true").lower() == "true"
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_PRECONNECT = os.getenv("HTTP_PRECONNECT", "")  # comma-separated agent ids or URLs
+HTTP_PRECONNECT_MAX = int(os.getenv("HTTP_PRECONNECT_MAX", "8"))
+
+class HttpClientManager:
+    """Shared pooled httpx client, tracking connection reuse and handshake time"""
+
+    def __init__(self, http2: bool, max_connections: int, max_keepalive: int, keepalive_expiry: float):
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+        self.connections = 0
+        self.handshake_seconds = 0.0
+        self.hosts: Dict[str, int] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=30.0)
+        return self._client
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        handshake: Dict[str, float] = {}
+
+        async def trace(event: str, info: Dict[str, Any]):
+            # httpcore only emits connect events when it opens a new connection
+            if event == "connection.connect_tcp.started":
+                handshake["start"] = time.perf_counter()
+            elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                handshake["end"] = time.perf_counter()
+
+        extensions = {**kwargs.pop("extensions", {}), "trace": trace}
+        try:
+            return await self.client.request(method, url, extensions=extensions, **kwargs)
+        finally:
+            host = httpx.URL(url).host
+            self.requests += 1
+            self.hosts[host] = self.hosts.get(host, 0) + 1
+            if "start" in handshake:
+                self.connections += 1
+                self.handshake_seconds += handshake.get("end", handshake["start"]) - handshake["start"]
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def preconnect(self, urls: list[str]) -> int:
+        """Open pooled connections to each URL's host (via /health); returns hosts reached"""
+        origins = {str(httpx.URL(url).copy_with(path="/health", query=None, fragment=None)) for url in urls}
+        results = await asyncio.gather(
+            *(self.get(origin, timeout=5.0) for origin in origins),
+            return_exceptions=True
+        )
+        return sum(1 for result in results if not isinstance(result, Exception))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        reused = self.requests - self.connections
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "requests": self.requests,
+            "new_connections": self.connections,
+            "reuse_rate": round(reused / self.requests, 3) if self.requests else 0.0,
+            "avg_handshake_ms": round(self.handshake_seconds / self.connections * 1000, 1) if self.connections else 0.0,
+            "top_hosts": dict(sorted(self.hosts.items(), key=lambda item: -item[1])[:10]),
+        }
+
+http_clients = HttpClientManager(HTTP2_ENABLED, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY)
+
+def preconnect_targets() -> list[str]:
+    """Agents to pre-connect to: HTTP_PRECONNECT, or the first known agents"""
+    names = [name.strip() for name in HTTP_PRECONNECT.split(",") if name.strip()]
+    if not names:
+        names = list(KNOWN_AGENTS)[:HTTP_PRECONNECT_MAX]
+    return [KNOWN_AGENTS.get(name, name) for name in names if name in KNOWN_AGENTS or name.startswith("http")]
+
+# ==============================================================================
+# Endpoint Resolver (AgentFacts "load" policy)
+# ==============================================================================
+# Agents can list several endpoints (static replicas plus an adaptive_resolver
+# URL). The resolver tracks an EWMA of observed latency and our own in-flight
+# count per endpoint, and picks the one with the lowest expected completion
+# time. Endpoints of agents that publish GET /load (ours do) also contribute
+# their queue estimate - hints are refreshed in the background, never on the
+# request path. Unseen endpoints start at an optimistic LOAD_PRIOR_LATENCY so
+# new replicas get tried.
+
+LOAD_EWMA_ALPHA = float(os.getenv("LOAD_EWMA_ALPHA", "0.3"))
+LOAD_PRIOR_LATENCY = float(os.getenv("LOAD_PRIOR_LATENCY", "2.0"))
+LOAD_HINT_TTL = float(os.getenv("LOAD_HINT_TTL", "5"))
+LOAD_FAILURE_PENALTY = float(os.getenv("LOAD_FAILURE_PENALTY", "10"))
+
+def a2a_url(url: str) -> str:
+    """Endpoint URL with the /a2a suffix"""
+    return url if url.endswith("/a2a") else url.rstrip("/") + "/a2a"
+
+class EndpointResolver:
+    """Chooses among an agent's endpoints by expected completion time"""
+
+    def __init__(self, alpha: float, prior_latency: float, hint_ttl: float, failure_penalty: float):
+        self.alpha = alpha
+        self.prior_latency = prior_latency
+        self.hint_ttl = hint_ttl
+        self.failure_penalty = failure_penalty
+        self.endpoints: Dict[str, Dict[str, Any]] = {}
+        self._hint_tasks: Dict[str, asyncio.Task] = {}
+        self.choices = 0
+        self.hint_fetches = 0
+
+    def _endpoint(self, url: str) -> Dict[str, Any]:
+        return self.endpoints.setdefault(url, {
+            "ewma": None, "in_flight": 0, "requests": 0, "failures": 0,
+            "hint": None, "hint_at": 0.0, "hint_supported": True,
+            "samples": deque(maxlen=200),
+        })
+
+    @staticmethod
+    def candidates(endpoints: Dict[str, Any]) -> list[str]:
+        """Every /a2a URL listed in an AgentFacts "endpoints" block"""
+        urls = list(endpoints.get("static", []))
+        resolver = endpoints.get("adaptive_resolver") or {}
+        if resolver.get("url"):
+            urls.append(resolver["url"])
+        return list(dict.fromkeys(a2a_url(url) for url in urls if url))
+
+    def expected_time(self, url: str) -> float:
+        """Expected seconds until a new request to url completes"""
+        endpoint = self._endpoint(url)
+        hint = endpoint["hint"] if time.time() - endpoint["hint_at"] < self.hint_ttl else None
+        latency = endpoint["ewma"]
+        if latency is None:
+            latency = hint["avg_service_s"] if hint else self.prior_latency
+        capacity = max(1, hint["capacity"]) if hint else 1
+        remote_wait = hint["expected_wait_s"] if hint else 0.0
+        return latency * (1 + endpoint["in_flight"] / capacity) + remote_wait
+
+    def alternates(self, endpoints: Dict[str, Any], chosen: str) -> list[str]:
+        """The agent's other endpoints, best first (hedging targets)"""
+        others = [url for url in self.candidates(endpoints) if url != chosen]
+        return sorted(others, key=self.expected_time)
+
+    def latency_percentile(self, url: Optional[str], pct: float, min_samples: int) -> Optional[float]:
+        """Observed latency percentile of one endpoint (or all, if url is None)"""
+        if url is not None:
+            samples = list(self._endpoint(url)["samples"])
+        else:
+            samples = [sample for endpoint in self.endpoints.values() for sample in endpoint["samples"]]
+        if len(samples) < min_samples:
+            return None
+        return float(np.percentile(samples, pct))
+
+    def choose(self, endpoints: Dict[str, Any]) -> Optional[str]:
+        """The best endpoint of an agent, or None if it lists none"""
+        urls = self.candidates(endpoints)
+        if len(urls) <= 1:
+            return urls[0] if urls else None
+        self.choices += 1
+        for url in urls:
+            self._refresh_hint(url)
+        # Random tie-break spreads load across equally good replicas
+        return min(urls, key=lambda url: (self.expected_time(url), random.random()))
+
+    def _refresh_hint(self, url: str):
+        endpoint = self._endpoint(url)
+        max_age = self.hint_ttl if endpoint["hint_supported"] else 60 * self.hint_ttl
+        task = self._hint_tasks.get(url)
+        if time.time() - endpoint["hint_at"] < max_age or (task and not task.done()):
+            return
+        self._hint_tasks[url] = asyncio.create_task(self._fetch_hint(url))
+
+    async def _fetch_hint(self, url: str):
+        endpoint = self._endpoint(url)
+        load_url = str(httpx.URL(url).copy_with(path="/load", query=None, fragment=None))
+        self.hint_fetches += 1
+        try:
+            response = await http_clients.get(load_url, timeout=2.0)
+            response.raise_for_status()
+            hint = response.json()
+            endpoint["hint"] = {
+                "capacity": int(hint.get("capacity", 1)),
+                "avg_service_s": float(hint.get("avg_service_s", self.prior_latency)),
+                "expected_wait_s": float(hint.get("expected_wait_s", 0.0)),
+            }
+            endpoint["hint_supported"] = True
+        except Exception:
+            # No /load (or unreachable) - fall back to our own measurements
+            endpoint["hint"] = None
+            endpoint["hint_supported"] = False
+        endpoint["hint_at"] = time.time()
+
+    def started(self, url: str):
+        self._endpoint(url)["in_flight"] += 1
+
+    def finished(self, url: str, elapsed: float, ok: bool):
+        endpoint = self._endpoint(url)
+        endpoint["in_flight"] -= 1
+        endpoint["requests"] += 1
+        if ok:
+            endpoint["samples"].append(elapsed)
+        else:
+            endpoint["failures"] += 1
+            elapsed += self.failure_penalty
+        endpoint["ewma"] = elapsed if endpoint["ewma"] is None else (
+            (1 - self.alpha) * endpoint["ewma"] + self.alpha * elapsed
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        busiest = sorted(self.endpoints.items(), key=lambda item: -item[1]["requests"])[:20]
+        return {
+            "choices": self.choices,
+            "hint_fetches": self.hint_fetches,
+            "endpoints": {
+                url: {
+                    "ewma_s": round(endpoint["ewma"], 3) if endpoint["ewma"] is not None else None,
+                    "p95_s": round(p95, 3) if (p95 := self.latency_percentile(url, 95, 1)) is not None else None,
+                    "in_flight": endpoint["in_flight"],
+                    "requests": endpoint["requests"],
+                    "failures": endpoint["failures"],
+                    "load_hint": endpoint["hint"],
+                    "expected_s": round(self.expected_time(url), 3),
+                }
+                for url, endpoint in busiest
+            },
+        }
+
+endpoint_resolver = EndpointResolver(LOAD_EWMA_ALPHA, LOAD_PRIOR_LATENCY, LOAD_HINT_TTL, LOAD_FAILURE_PENALTY)
+
+# ==============================================================================
+# Hedged A2A Requests
+# ==============================================================================
+# A few agents occasionally stall for tens of seconds, and those stalls set our
+# p99. With HEDGE_A2A on, if the first endpoint hasn't answered by its observed
+# p95 latency, the same message also goes to the agent's next-best endpoint
+# (or the same URL again, which Railway may route to another replica). The
+# first good answer wins and the other request is cancelled. HEDGE_BUDGET caps
+# hedges as a fraction of requests so a slow network can't double our traffic.
+
+HEDGE_A2A = os.getenv("HEDGE_A2A", "false").lower() == "true"
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.1"))
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1.0"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+class HedgePolicy:
+    """Runs a request with an optional hedge, within a hedge-rate budget"""
+
+    def __init__(self, enabled: bool, budget: float, percentile: float, min_delay: float, min_samples: int):
+        self.enabled = enabled
+        self.budget = budget
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.over_budget = 0
+        self.latencies: deque = deque(maxlen=1000)
+
+    def delay(self, url: str) -> Optional[float]:
+        """Seconds to wait before hedging: the endpoint's p95 (or the global p95 while it has few samples)"""
+        observed = endpoint_resolver.latency_percentile(url, self.percentile, self.min_samples)
+        if observed is None:
+            observed = endpoint_resolver.latency_percentile(None, self.percentile, self.min_samples)
+        return max(self.min_delay, observed) if observed is not None else None
+
+    def _within_budget(self) -> bool:
+        # One hedge of slack so the first stalls after startup can be hedged
+        return self.hedged + 1 <= self.budget * self.requests + 1
+
+    async def run(self, urls: list[str], send: Callable[[str], Awaitable[str]]) -> str:
+        """send(urls[0]), hedged to urls[1] (or urls[0] again) if it is slow; first good answer wins"""
+        self.requests += 1
+        start = time.perf_counter()
+        primary = asyncio.create_task(send(urls[0]))
+        tasks = [primary]
+        try:
+            delay = self.delay(urls[0]) if self.enabled else None
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done:
+                    if self._within_budget():
+                        self.hedged += 1
+                        tasks.append(asyncio.create_task(send(urls[1] if len(urls) > 1 else urls[0])))
+                    else:
+                        self.over_budget += 1
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.latencies.append(time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = list(self.latencies)
+        return {
+            "enabled": self.enabled,
+            "budget": self.budget,
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.requests, 3) if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "over_budget": self.over_budget,
+            "p50_s": round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+            "p99_s": round(float(np.percentile(latencies, 99)), 3) if latencies else None,
+        }
+
+hedging = HedgePolicy(HEDGE_A2A, HEDGE_BUDGET, HEDGE_PERCENTILE, HEDGE_MIN_DELAY, HEDGE_MIN_SAMPLES)
+
+# ==============================================================================
+# Circuit Breakers & Health Probing
+# ==============================================================================
+# When a known agent is down, every message to it used to wait out the full
+# request timeout. Each agent gets a circuit breaker:
+# - closed:    requests flow; the last BREAKER_WINDOW outcomes are tracked
+# - open:      too many errors/timeouts - requests fail immediately
+# - half-open: after BREAKER_OPEN_SECONDS one trial request is let through;
+#              success closes the circuit, failure re-opens it
+# A background prober also hits every agent's /health each
+# HEALTH_PROBE_INTERVAL seconds, so dead agents are caught (and revived
+# agents let back in) without a user message paying for it.
+
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "3"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "3"))
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an agent whose circuit is open"""
+
+class CircuitBreaker:
+    """closed / open / half-open breaker for one agent"""
+
+    def __init__(self, window: int, min_calls: int, error_rate: float, open_seconds: float):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.outcomes: deque = deque(maxlen=window)
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.fast_failures = 0
+        self.last_error: Optional[str] = None
+        self.healthy: Optional[bool] = None  # last /health probe result
+        self.probed_at: Optional[float] = None
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - time.time())
+
+    def check(self):
+        """Raise CircuitOpenError unless a request may go through now"""
+        if self.state == "open" and self.retry_in() == 0:
+            self.state = "half_open"
+        if self.state == "open" or (self.state == "half_open" and self.trial_in_flight):
+            self.fast_failures += 1
+            raise CircuitOpenError(f"circuit open after repeated failures (retry in {self.retry_in():.0f}s)")
+        if self.state == "half_open":
+            self.trial_in_flight = True
+
+    def record(self, ok: bool, error: Optional[str] = None):
+        if not ok:
+            self.last_error = error
+        if self.state == "half_open":
+            self.trial_in_flight = False
+            self._close() if ok else self._open()
+            return
+        self.outcomes.append(ok)
+        failures = self.outcomes.count(False)
+        if self.state == "closed" and len(self.outcomes) >= self.min_calls \
+                and failures / len(self.outcomes) >= self.error_rate:
+            self._open()
+
+    def abandon(self):
+        """The request was cancelled before it could tell us anything"""
+        self.trial_in_flight = False
+
+    def probed(self, healthy: bool, error: Optional[str] = None):
+        self.healthy = healthy
+        self.probed_at = time.time()
+        if not healthy:
+            self.record(False, error)
+        elif self.state == "open":
+            # Back up - let the next real request through as the trial
+            self.state = "half_open"
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.time()
+
+    def _close(self):
+        self.state = "closed"
+        self.outcomes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "healthy": self.healthy,
+            "probe_age_s": round(time.time() - self.probed_at, 1) if self.probed_at else None,
+            "error_rate": round(self.outcomes.count(False) / len(self.outcomes), 2) if self.outcomes else 0.0,
+            "retry_in_s": round(self.retry_in(), 1) if self.state == "open" else 0.0,
+            "fast_failures": self.fast_failures,
+            "last_error": self.last_error,
+        }
+
+class AgentHealthMonitor:
+    """Circuit breakers for KNOWN_AGENTS plus the background /health prober"""
+
+    def __init__(self, interval: float, timeout: float):
+        self.interval = interval
+        self.timeout = timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.probes = 0
+
+    def breaker(self, agent_id: str) -> CircuitBreaker:
+        if agent_id not in self.breakers:
+            self.breakers[agent_id] = CircuitBreaker(
+                BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_ERROR_RATE, BREAKER_OPEN_SECONDS
+            )
+        return self.breakers[agent_id]
+
+    @staticmethod
+    def is_failure(error: Exception) -> bool:
+        """Timeouts, connection errors and 5xx/429 count against an agent; other 4xx don't"""
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500 or error.response.status_code == 429
+        return isinstance(error, (httpx.HTTPError, asyncio.TimeoutError))
+
+    async def probe(self, agent_id: str, agent_url: str):
+        health_url = str(httpx.URL(agent_url).copy_with(path="/health", query=None, fragment=None))
+        try:
+            response = await http_clients.get(health_url, timeout=self.timeout)
+            response.raise_for_status()
+            self.breaker(agent_id).probed(True)
+        except Exception as e:
+            self.breaker(agent_id).probed(False, f"health probe: {str(e) or type(e).__name__}")
+        self.probes += 1
+
+    async def probe_all(self):
+        semaphore = asyncio.Semaphore(16)
+
+        async def bounded(agent_id: str, agent_url: str):
+            async with semaphore:
+                await self.probe(agent_id, agent_url)
+
+        await asyncio.gather(*(bounded(agent_id, url) for agent_id, url in list(KNOWN_AGENTS.items())))
+
+    async def _probe_loop(self):
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._probe_loop())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def health(self) -> Dict[str, Any]:
+        return {agent_id: self.breaker(agent_id).stats() for agent_id in KNOWN_AGENTS}
+
+    def stats(self) -> Dict[str, Any]:
+        states = [breaker.state for breaker in self.breakers.values()]
+        return {
+            "closed": states.count("closed"),
+            "open": states.count("open"),
+            "half_open": states.count("half_open"),
+            "fast_failures": sum(breaker.fast_failures for breaker in self.breakers.values()),
+            "probes": self.probes,
+            "probe_interval_s": self.interval,
+        }
+
+agent_health = AgentHealthMonitor(HEALTH_PROBE_INTERVAL, HEALTH_PROBE_TIMEOUT)
+
+# ==============================================================================
+# Registry Helper Functions
+# ==============================================================================
+
+# Registry sync: boot from the last saved snapshot (no waiting on the
+# registry), then refresh in the background every REGISTRY_SYNC_INTERVAL
+# seconds with conditional requests (ETag / If-Modified-Since). If the
+# registry supports deltas, set REGISTRY_DELTA_PARAM (e.g. "updated_since")
+# and only changed entries are fetched. Each refresh builds a new mapping and
+# rebinds KNOWN_AGENTS in one step, so readers never see a half-updated dict.
+REGISTRY_SYNC_INTERVAL = int(os.getenv("REGISTRY_SYNC_INTERVAL", "60"))
+REGISTRY_SNAPSHOT_PATH = os.getenv("REGISTRY_SNAPSHOT_PATH", os.path.join(DATA_DIR, "registry.json"))
+REGISTRY_DELTA_PARAM = os.getenv("REGISTRY_DELTA_PARAM", "")
+
+# Built-in agents and agents added via POST /agents/register survive
+# registry refreshes
+SEED_AGENTS = dict(KNOWN_AGENTS)
+REGISTERED_AGENTS: Dict[str, str] = {}
+
+def registry_entry(agent: Dict[str, Any]) -> tuple[Optional[str], str]:
+    """(username, A2A URL) of a registry entry; username is None if unusable"""
+    # Support both old (username/url) and new (agent_id/endpoint) formats
+    username = agent.get("agent_id") or agent.get("username")
+    url = agent.get("endpoint") or agent.get("url", "")
+    
+    # Skip if no username or if it's this agent
+    if not username or username == MY_AGENT_USERNAME:
+        return None, url
+    
+    # Ensure URL ends with /a2a
+    if not url.endswith("/a2a"):
+        url = url.rstrip("/") + "/a2a"
+    return username, url
+
+class RegistrySync:
+    """Background synchronizer between the central registry and KNOWN_AGENTS"""
+
+    def __init__(self, url: str, interval: int, snapshot_path: str):
+        self.url = url
+        self.interval = interval
+        self.snapshot_path = snapshot_path
+        self.agents: Dict[str, str] = {}  # registry view (without manual registrations)
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.synced_at: Optional[float] = None
+        self.syncs = 0
+        self.not_modified = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def load_snapshot(self) -> bool:
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.agents = snapshot.get("agents", {})
+        self.etag = snapshot.get("etag")
+        self.last_modified = snapshot.get("last_modified")
+        self.synced_at = snapshot.get("synced_at")
+        self._publish()
+        return True
+
+    def _save_snapshot(self):
+        if os.path.dirname(self.snapshot_path):
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "agents": self.agents,
+                "etag": self.etag,
+                "last_modified": self.last_modified,
+                "synced_at": self.synced_at,
+            }, f)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _publish(self):
+        global KNOWN_AGENTS
+        KNOWN_AGENTS = {**SEED_AGENTS, **self.agents, **REGISTERED_AGENTS}
+
+    async def sync(self) -> bool:
+        """One conditional (or delta) fetch; KNOWN_AGENTS is swapped only on success"""
+        headers = {}
+        params = {}
+        if self.agents and self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.agents and self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        delta = bool(REGISTRY_DELTA_PARAM and self.agents and self.synced_at)
+        if delta:
+            params[REGISTRY_DELTA_PARAM] = datetime.fromtimestamp(self.synced_at).isoformat()
+        try:
+            started_at = time.time()
+            response = await http_clients.get(self.url, headers=headers, params=params, timeout=10.0)
+            if response.status_code == 304:
+                self.not_modified += 1
+            else:
+                response.raise_for_status()
+                data = response.json()
                 
-                # Skip if no username or if it's this agent
-                if not username or username == MY_AGENT_USERNAME:
-                    continue
+                # Handle both old and new API formats
+                entries = data.get("agents", []) if isinstance(data, dict) else data
                 
-                # Ensure URL ends with /a2a
-                if not url.endswith("/a2a"):
-                    url = url.rstrip("/") + "/a2a"
+                agents = dict(self.agents) if delta else {}
+                for agent in entries:
+                    username, url = registry_entry(agent)
+                    if not username:
+                        continue
+                    if agent.get("deleted") or agent.get("status") == "deleted":
+                        agents.pop(username, None)
+                    else:
+                        agents[username] = url
                 
-                KNOWN_AGENTS[username] = url
-                print(f"   ✅ Registered: @{username} -> {url}")
-            
+                added = agents.keys() - self.agents.keys()
+                removed = self.agents.keys() - agents.keys()
+                if added or removed:
+                    print(f"📥 Registry sync: {len(agents)} agents (+{len(added)} / -{len(removed)})")
+                self.agents = agents
+                self.etag = response.headers.get("ETag")
+                self.last_modified = response.headers.get("Last-Modified")
+                self.syncs += 1
+                self._publish()
+            self.synced_at = started_at
+            self.last_error = None
+            await asyncio.to_thread(self._save_snapshot)
             return True
-    except Exception as e:
-        print(f"⚠️ Failed to fetch agents from registry: {str(e)}")
-        return False
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            print(f"⚠️ Failed to sync agents from registry (keeping {len(KNOWN_AGENTS)}): {str(e)}")
+            return False
+
+    async def _sync_loop(self):
+        while True:
+            await self.sync()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._sync_loop())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "agents": len(KNOWN_AGENTS),
+            "from_registry": len(self.agents),
+            "registered_here": len(REGISTERED_AGENTS),
+            "age_seconds": round(time.time() - self.synced_at, 1) if self.synced_at else None,
+            "interval": self.interval,
+            "syncs": self.syncs,
+            "not_modified": self.not_modified,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+registry_sync = RegistrySync(REGISTRY_URL, REGISTRY_SYNC_INTERVAL, REGISTRY_SNAPSHOT_PATH)
+
+async def fetch_agents_from_registry():
+    """
+    Fetch registered agents from the central registry (one sync)
+    Updates KNOWN_AGENTS with username -> A2A endpoint mappings
+    """
+    return await registry_sync.sync()
 
 # ==============================================================================
 # A2A Helper Functions
 # ==============================================================================
 
+async def post_a2a(agent_url: str, message: str, conversation_id: str, timeout: float = 30.0) -> str:
+    """POST one A2A message to a URL and return the reply text, raising on any failure"""
+    start = time.perf_counter()
+    ok = False
+    cancelled = False
+    endpoint_resolver.started(agent_url)
+    try:
+        response = await http_clients.post(
+            agent_url,
+            json={
+                "content": {
+                    "text": message,
+                    "type": "text"
+                },
+                "role": "user",
+                "conversation_id": conversation_id
+            },
+            timeout=timeout
+        )
+        response.raise_for_status()
+        data = response.json()
+        ok = True
+        return data.get("content", {}).get("text", str(data))
+    except asyncio.CancelledError:
+        # Lost a hedge race - not a failure, and its latency is a useful lower bound
+        cancelled = True
+        raise
+    finally:
+        endpoint_resolver.finished(agent_url, time.perf_counter() - start, ok or cancelled)
+
+async def request_agent(agent_id: str, message: str, conversation_id: str, timeout: float = 30.0) -> str:
+    """
+    Send an A2A message and return the reply text, raising on any failure
+    
+    Raises:
+        KeyError: agent_id is not a known agent
+        CircuitOpenError: the agent's circuit is open (fails immediately)
+        httpx.HTTPError: the request failed or timed out
+    """
+    agent_url = KNOWN_AGENTS[agent_id]
+    breaker = agent_health.breaker(agent_id)
+    breaker.check()
+    ok = None
+    try:
+        text = await hedging.run([agent_url], lambda url: post_a2a(url, message, conversation_id, timeout))
+        ok = True
+        return text
+    except Exception as e:
+        ok = not agent_health.is_failure(e)
+        breaker.last_error = str(e) or type(e).__name__
+        raise
+    finally:
+        if ok is None:
+            breaker.abandon()
+        else:
+            breaker.record(ok, breaker.last_error)
+
 async def send_message_to_agent(agent_id: str, message: str, conversation_id: str) -> str:
     """
     Send a message to another agent via A2A protocol
@@ -381,25 +2093,11 @@ async def send_message_to_agent(agent_id: str, message: str, conversation_id: st
     if agent_id not in KNOWN_AGENTS:
         return f"❌ Agent '{agent_id}' not found. Known agents: {list(KNOWN_AGENTS.keys())}"
     
-    agent_url = KNOWN_AGENTS[agent_id]
-    
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                agent_url,
-                json={
-                    "content": {
-                        "text": message,
-                        "type": "text"
-                    },
-                    "role": "user",
-                    "conversation_id": conversation_id
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data.get("content", {}).get("text", str(data))
+        return await request_agent(agent_id, message, conversation_id)
     
+    except CircuitOpenError as e:
+        return f"❌ Agent '{agent_id}' is unavailable: {str(e)}"
     except httpx.TimeoutException:
         return f"❌ Timeout connecting to agent '{agent_id}'"
     except httpx.HTTPError as e:
@@ -445,42 +2143,407 @@ def parse_a2a_request(message: str) -> tuple[Optional[str], str]:
     
     return target_agent, clean_message
 
+def parse_a2a_targets(message: str) -> tuple[list[str], str]:
+    """
+    Like parse_a2a_request, but keeps every mentioned agent
+    
+    Returns:
+        Tuple of (unique agent_ids in mention order, message without the mentions)
+    """
+    targets = list(dict.fromkeys(extract_agent_mentions(message)))
+    clean_message = message
+    for target in targets:
+        clean_message = re.sub(r'@' + re.escape(target) + r'(?![\w-])\s*', '', clean_message)
+    return targets, clean_message.strip()
+
 # ==============================================================================
-# Search Helper Functions
+# A2A Fan-Out
 # ==============================================================================
+# A message mentioning several agents ("@weather @travel plan my weekend") is
+# sent to all of them at once, so the wall time is close to the slowest agent
+# rather than the sum. Each target gets FANOUT_TIMEOUT seconds and at most
+# FANOUT_CONCURRENCY requests are in flight. The replies are combined with:
+# - concatenate:   every reply, in mention order (default)
+# - first_success: the first agent to answer successfully (others cancelled)
+# - llm_merge:     one LLM-written answer combining the replies
+# The httpx timeout is what normally fires, so the target's circuit breaker
+# sees the timeout; the outer deadline only adds FANOUT_TIMEOUT_GRACE seconds
+# as a backstop (e.g. a hedged retry started late).
+
+FANOUT_STRATEGIES = ("concatenate", "first_success", "llm_merge")
+FANOUT_STRATEGY = os.getenv("FANOUT_STRATEGY", "concatenate")
+FANOUT_MAX_TARGETS = int(os.getenv("FANOUT_MAX_TARGETS", "8"))
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "4"))
+FANOUT_TIMEOUT = float(os.getenv("FANOUT_TIMEOUT", "30"))
+FANOUT_TIMEOUT_GRACE = float(os.getenv("FANOUT_TIMEOUT_GRACE", "2"))
+
+fanout_stats = {"requests": 0, "targets": 0, "failures": 0, "timeouts": 0,
+                "wall_seconds": 0.0, "sequential_seconds": 0.0}
+
+merge_llm = enable_completion_cache(
+    LLM(model="openai/gpt-4o-mini", temperature=0),
+    call_site="fanout_merge"
+)
 
-AGENTFACTS_DB_URL = "https://v0-agent-facts-database.vercel.app/api/agentfacts"
-
-async def fetch_agentfacts_from_db() -> list[Dict[str, Any]]:
+async def fan_out(targets: list[str], message: str, conversation_id: str, strategy: str) -> tuple[str, list[Dict[str, Any]]]:
     """
-    Fetch all agentfacts from the central database
+    Send a message to several agents concurrently and aggregate the replies
     
     Returns:
-        List of agentfacts dictionaries
+        Tuple of (aggregated text, per-target results)
     """
+    semaphore = asyncio.Semaphore(FANOUT_CONCURRENCY)
+    
+    async def one(agent_id: str) -> Dict[str, Any]:
+        async with semaphore:
+            start = time.perf_counter()
+            result: Dict[str, Any] = {"agent_id": agent_id, "ok": False}
+            try:
+                result["text"] = await asyncio.wait_for(
+                    request_agent(agent_id, message, conversation_id, timeout=FANOUT_TIMEOUT),
+                    FANOUT_TIMEOUT + FANOUT_TIMEOUT_GRACE
+                )
+                result["ok"] = True
+            except KeyError:
+                result["error"] = "unknown agent"
+            except (asyncio.TimeoutError, httpx.TimeoutException):
+                result["error"] = f"timed out after {FANOUT_TIMEOUT:.0f}s"
+                fanout_stats["timeouts"] += 1
+            except Exception as e:
+                result["error"] = str(e)
+            result["time"] = round(time.perf_counter() - start, 3)
+            if not result["ok"]:
+                fanout_stats["failures"] += 1
+            return result
+    
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(one(agent_id)) for agent_id in targets]
+    if strategy == "first_success":
+        results = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                results.append(result)
+                if result["ok"]:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+    else:
+        results = await asyncio.gather(*tasks)
+    
+    fanout_stats["requests"] += 1
+    fanout_stats["targets"] += len(targets)
+    fanout_stats["wall_seconds"] += time.perf_counter() - start
+    fanout_stats["sequential_seconds"] += sum(result["time"] for result in results)
+    
+    answers = [result for result in results if result["ok"]]
+    if not answers:
+        failures = "\n".join(f"- @{result['agent_id']}: {result['error']}" for result in results)
+        return f"❌ None of the mentioned agents answered:\n{failures}", results
+    
+    if strategy == "first_success":
+        return f"[Forwarded to @{answers[0]['agent_id']}]\n\n{answers[0]['text']}", results
+    
+    sections = []
+    for result in results:
+        body = result["text"] if result["ok"] else f"❌ {result['error']}"
+        sections.append(f"[@{result['agent_id']}]\n{body}")
+    concatenated = "\n\n".join(sections)
+    
+    if strategy == "llm_merge" and len(answers) > 1:
+        prompt = (
+            f"Several agents answered the same request.\n\nRequest: {message}\n\n"
+            f"Answers:\n\n{concatenated}\n\n"
+            "Write one combined answer. Keep every distinct fact, resolve overlaps, "
+            "point out disagreements, and credit agents as @agent-id where useful."
+        )
+        try:
+            merged = await asyncio.to_thread(merge_llm.call, prompt)
+            return f"[Merged from {', '.join('@' + a['agent_id'] for a in answers)}]\n\n{merged}", results
+        except Exception as e:
+            print(f"⚠️ Fan-out merge failed, concatenating: {str(e)}")
+    
+    return concatenated, results
+
+def fanout_metrics() -> Dict[str, Any]:
+    requests = fanout_stats["requests"]
+    return {
+        "requests": requests,
+        "avg_targets": round(fanout_stats["targets"] / requests, 2) if requests else 0.0,
+        "failures": fanout_stats["failures"],
+        "timeouts": fanout_stats["timeouts"],
+        "avg_wall_s": round(fanout_stats["wall_seconds"] / requests, 3) if requests else 0.0,
+        "avg_sequential_s": round(fanout_stats["sequential_seconds"] / requests, 3) if requests else 0.0,
+    }
+
+# ==============================================================================
+# Search Helper Functions
+# ==============================================================================
+
+AGENTFACTS_DB_URL = "https://v0-agent-facts-database.vercel.app/api/agentfacts"
+
+# /search routes from a local copy of the AgentFacts database. It is loaded at
+# startup and revalidated in the background (ETag / If-Modified-Since), so a
+# search never waits on the remote DB - and keeps working from the last good
+# copy (also saved to disk) when the DB is down.
+AGENTFACTS_REFRESH_INTERVAL = int(os.getenv("AGENTFACTS_REFRESH_INTERVAL", "300"))
+AGENTFACTS_SNAPSHOT_PATH = os.getenv("AGENTFACTS_SNAPSHOT_PATH", os.path.join(DATA_DIR, "agentfacts.json"))
+
+def parse_agentfacts(payload: Any) -> list[Dict[str, Any]]:
+    """Extract the agent list from an AgentFacts DB response"""
+    if isinstance(payload, list):
+        return payload
+    elif isinstance(payload, dict) and "agents" in payload:
+        return payload["agents"]
+    else:
+        return []
+
+class AgentFactsDirectory:
+    """Local, periodically revalidated copy of the AgentFacts database"""
+
+    def __init__(self, url: str, interval: int, snapshot_path: str):
+        self.url = url
+        self.interval = interval
+        self.snapshot_path = snapshot_path
+        self.agents: list[Dict[str, Any]] = []
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.loaded_at: Optional[float] = None  # last successful fetch or 304
+        self.last_error: Optional[str] = None
+        self.refreshes = 0
+        self.not_modified = 0
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Optional[asyncio.Task] = None
+        self.on_update: Optional[Callable[[list[Dict[str, Any]]], Awaitable[None]]] = None
+        self._refresh_lock = asyncio.Lock()
+        self._load_snapshot()
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            self.agents = snapshot.get("agents", [])
+            self.etag = snapshot.get("etag")
+            self.last_modified = snapshot.get("last_modified")
+            self.loaded_at = snapshot.get("loaded_at")
+        except (OSError, ValueError):
+            pass
+
+    def _save_snapshot(self):
+        tmp_path = self.snapshot_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "agents": self.agents,
+                    "etag": self.etag,
+                    "last_modified": self.last_modified,
+                    "loaded_at": self.loaded_at,
+                }, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"⚠️ Failed to save agentfacts snapshot: {str(e)}")
+
+    async def refresh(self) -> bool:
+        """Revalidate against the DB; on any failure the current copy is kept"""
+        async with self._refresh_lock:
+            headers = {}
+            if self.agents and self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.agents and self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+            try:
+                response = await http_clients.get(self.url, headers=headers, timeout=10.0)
+                if response.status_code == 304:
+                    self.not_modified += 1
+                else:
+                    response.raise_for_status()
+                    agents = parse_agentfacts(response.json())
+                    if not agents and self.agents:
+                        raise ValueError("database returned no agents")
+                    self.agents = agents
+                    self.etag = response.headers.get("ETag")
+                    self.last_modified = response.headers.get("Last-Modified")
+                    self.refreshes += 1
+                self.loaded_at = time.time()
+                self.last_error = None
+                await asyncio.to_thread(self._save_snapshot)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"⚠️ Failed to refresh agentfacts directory (serving {len(self.agents)} cached): {str(e)}")
+                return False
+        if self.on_update:
+            await self.on_update(self.agents)
+        return True
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.refresh()
+
+    def start(self):
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def request_refresh(self):
+        """Kick off a refresh without waiting for it"""
+        if not self._refresh_lock.locked():
+            self._pending = asyncio.create_task(self.refresh())
+
+    def age(self) -> Optional[float]:
+        return time.time() - self.loaded_at if self.loaded_at else None
+
+    def stats(self) -> Dict[str, Any]:
+        age = self.age()
+        return {
+            "agents": len(self.agents),
+            "age_seconds": round(age, 1) if age is not None else None,
+            "stale": age is None or age > 2 * self.interval,
+            "refresh_interval": self.interval,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "refreshes": self.refreshes,
+            "not_modified": self.not_modified,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+agentfacts_directory = AgentFactsDirectory(AGENTFACTS_DB_URL, AGENTFACTS_REFRESH_INTERVAL, AGENTFACTS_SNAPSHOT_PATH)
+
+# ==============================================================================
+# Lexical Prefilter (BM25)
+# ==============================================================================
+# Before the LLM picks an agent, a BM25 inverted index over labels,
+# descriptions and skill ids narrows the directory to the top BM25_TOP_K
+# candidates - the prompt stays the same size however large the directory
+# gets. A sample of searches (BM25_RECALL_SAMPLE) also runs the full-directory
+# LLM selection in the background to measure how often the prefilter kept the
+# agent the LLM would have picked.
+
+BM25_TOP_K = int(os.getenv("BM25_TOP_K", "10"))
+BM25_RECALL_SAMPLE = float(os.getenv("BM25_RECALL_SAMPLE", "0.05"))
+
+BM25_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "for", "from", "i", "in", "is",
+    "it", "me", "my", "of", "on", "or", "please", "that", "the", "this", "to", "with", "you",
+}
+
+def bm25_tokens(text: str) -> list[str]:
+    """Lowercase word tokens (skill ids like send_email split into words)"""
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in BM25_STOPWORDS]
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring over agentfacts"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.agents: list[Dict[str, Any]] = []
+        self.source: Optional[list] = None
+        self.postings: Dict[str, list[tuple[int, int]]] = {}  # term -> [(doc, term frequency)]
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.avg_length = 0.0
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.recall_checks = 0
+        self.recall_hits = 0
+
+    @staticmethod
+    def document(agent: Dict[str, Any]) -> str:
+        skills = [skill.get("id", "") if isinstance(skill, dict) else str(skill) for skill in agent.get("skills", [])]
+        return " ".join([str(agent.get("label", "")), str(agent.get("description", "")), *skills])
+
+    def build(self, agents: list[Dict[str, Any]]):
+        """Index an agent list (blocking; skipped if already indexed)"""
+        with self._lock:
+            if agents is self.source:
+                return
+            postings: Dict[str, list[tuple[int, int]]] = {}
+            lengths = []
+            for doc, agent in enumerate(agents):
+                tokens = bm25_tokens(self.document(agent))
+                lengths.append(len(tokens))
+                counts: Dict[str, int] = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for token, count in counts.items():
+                    postings.setdefault(token, []).append((doc, count))
+            self.agents = list(agents)
+            self.postings = postings
+            self.doc_lengths = np.asarray(lengths, dtype=np.float32)
+            self.avg_length = float(self.doc_lengths.mean()) if lengths else 0.0
+            self.source = agents
+
+    def top_k(self, query: str, k: int) -> list[Dict[str, Any]]:
+        """The k best-scoring agents (zero-score agents fill the list when few terms match)"""
+        self.queries += 1
+        agents, postings, lengths = self.agents, self.postings, self.doc_lengths
+        n = len(agents)
+        scores = np.zeros(n, dtype=np.float32)
+        norms = self.k1 * (1 - self.b + self.b * lengths / (self.avg_length or 1.0))
+        for term in set(bm25_tokens(query)):
+            docs = postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            rows = np.fromiter((doc for doc, _ in docs), dtype=np.int64, count=len(docs))
+            tf = np.fromiter((count for _, count in docs), dtype=np.float32, count=len(docs))
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + norms[rows])
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [agents[i] for i in top]
+
+    def record_recall(self, hit: bool):
+        self.recall_checks += 1
+        self.recall_hits += hit
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "agents": len(self.agents),
+            "terms": len(self.postings),
+            "top_k": BM25_TOP_K,
+            "queries": self.queries,
+            "recall_checks": self.recall_checks,
+            "recall": round(self.recall_hits / self.recall_checks, 3) if self.recall_checks else None,
+        }
+
+bm25_index = BM25Index()
+
+async def check_prefilter_recall(query: str, agentfacts: list[Dict[str, Any]], candidates: list[Dict[str, Any]]):
+    """Run the full-directory LLM selection and record whether the prefilter kept its pick"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(AGENTFACTS_DB_URL)
-            response.raise_for_status()
-            agents = response.json()
-            
-            if isinstance(agents, list):
-                return agents
-            elif isinstance(agents, dict) and "agents" in agents:
-                return agents["agents"]
-            else:
-                return []
+        full_pick = await select_best_agent(query, agentfacts, prefilter=False)
+        if full_pick is None:
+            return
+        candidate_ids = {agent.get("id") for agent in candidates}
+        bm25_index.record_recall(full_pick.get("id") in candidate_ids)
     except Exception as e:
-        print(f"⚠️ Failed to fetch agentfacts from database: {str(e)}")
-        return []
+        print(f"⚠️ Prefilter recall check failed: {str(e)}")
+
+_recall_tasks: set = set()
 
-async def select_best_agent(query: str, agentfacts: list[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+# Router LLM - created once. Its completions are cached on disk: the same query
+# against the same agent list produces the same prompt, so repeats skip the LLM.
+selection_llm = enable_completion_cache(
+    LLM(model="openai/gpt-4o-mini", temperature=0.3),
+    call_site="select_best_agent",
+    cacheable=True
+)
+
+async def select_best_agent(query: str, agentfacts: list[Dict[str, Any]], prefilter: bool = True) -> Optional[Dict[str, Any]]:
     """
     Use LLM to select the best agent for a given query
     
     Args:
         query: User's query (e.g., "send an email")
         agentfacts: List of agentfacts from the database
+        prefilter: Narrow to the BM25 top-k before asking the LLM
     
     Returns:
         Selected agentfacts dictionary, or None if no suitable agent found
@@ -488,6 +2551,16 @@ async def select_best_agent(query: str, agentfacts: list[Dict[str, Any]]) -> Opt
     if not agentfacts:
         return None
     
+    # Only the BM25 top-k go into the prompt
+    if prefilter and len(agentfacts) > BM25_TOP_K:
+        await asyncio.to_thread(bm25_index.build, agentfacts)
+        candidates = bm25_index.top_k(query, BM25_TOP_K)
+        if random.random() < BM25_RECALL_SAMPLE:
+            task = asyncio.create_task(check_prefilter_recall(query, agentfacts, candidates))
+            _recall_tasks.add(task)
+            task.add_done_callback(_recall_tasks.discard)
+        agentfacts = candidates
+    
     # Create a summary of available agents for the LLM
     agents_summary = []
     for agent in agentfacts:
@@ -527,9 +2600,8 @@ If no agent is suitable, respond with:
 """
     
     try:
-        # Use the existing LLM to get the selection
-        selection_llm = LLM(model="openai/gpt-4o-mini", temperature=0.3)
-        response = selection_llm.call(prompt)
+        # Blocking LLM call - keep it off the event loop
+        response = await asyncio.to_thread(selection_llm.call, prompt)
         
         # Parse the response
         # Try to extract JSON from the response
@@ -556,16 +2628,182 @@ If no agent is suitable, respond with:
         
     except Exception as e:
         print(f"⚠️ Error selecting agent with LLM: {str(e)}")
-        # Fallback: simple keyword matching
-        query_lower = query.lower()
-        for agent in agentfacts:
-            description = agent.get("description", "").lower()
-            label = agent.get("label", "").lower()
-            if query_lower in description or query_lower in label:
-                return agent
+        # Fallback: best lexical match, if any query term matches at all
+        # (a throwaway index - agentfacts is at most BM25_TOP_K agents here)
+        index = BM25Index()
+        index.build(agentfacts)
+        best = index.top_k(query, 1)
+        if best and set(bm25_tokens(query)) & set(bm25_tokens(BM25Index.document(best[0]))):
+            return best[0]
         return None
 
-async def send_a2a_to_url(agent_url: str, message: str, conversation_id: str) -> str:
+# ==============================================================================
+# Vector Router
+# ==============================================================================
+# select_best_agent puts every agent into one prompt, so its latency and token
+# cost grow with the directory. The vector router embeds each agent's label,
+# description and skills once (re-embedding only agents that changed), keeps
+# them in one float32 matrix and routes a query with a single matrix-vector
+# product. Only low-confidence matches - best score under ROUTER_MIN_SCORE, or
+# too close to the runner-up - go to the LLM, and then only with the top
+# ROUTER_FALLBACK_K candidates in the prompt.
+
+VECTOR_ROUTER_ENABLED = os.getenv("VECTOR_ROUTER", "true").lower() == "true"
+ROUTER_MIN_SCORE = float(os.getenv("ROUTER_MIN_SCORE", "0.45"))
+ROUTER_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", "0.03"))
+ROUTER_FALLBACK_K = int(os.getenv("ROUTER_FALLBACK_K", "8"))
+
+def agent_document(agent: Dict[str, Any]) -> str:
+    """Text embedded for an agent: label, description and skills"""
+    skills = []
+    for skill in agent.get("skills", []):
+        if isinstance(skill, dict):
+            skills.append(" ".join(str(skill.get(field, "")) for field in ("id", "description")).strip())
+        else:
+            skills.append(str(skill))
+    return "\n".join([
+        str(agent.get("label", "")),
+        str(agent.get("description", "")),
+        "Skills: " + ", ".join(skill for skill in skills if skill),
+    ])
+
+class VectorRouter:
+    """Nearest-agent lookup over a matrix of agent embeddings"""
+
+    def __init__(self, min_score: float, min_margin: float, fallback_k: int):
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.fallback_k = fallback_k
+        self.agents: list[Dict[str, Any]] = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.source: Optional[list] = None  # agent list the matrix was built from
+        self._vectors: Dict[str, np.ndarray] = {}  # document hash -> embedding
+        self._build_lock = threading.Lock()
+        self.pending: Optional[asyncio.Task] = None
+        self.builds = 0
+        self.embedded = 0
+        self.last_build_seconds = 0.0
+        self.routed = 0
+        self.fallbacks = 0
+        self.route_seconds = 0.0
+
+    def load(self, agents: list[Dict[str, Any]], matrix: np.ndarray, source: Optional[list] = None):
+        """Swap in a new agent list and its (n, dim) unit-vector matrix"""
+        self.agents, self.matrix, self.source = agents, np.ascontiguousarray(matrix, dtype=np.float32), source
+
+    def build(self, agents: list[Dict[str, Any]]):
+        """Embed agents (reusing vectors of unchanged ones) and swap the matrix in (blocking)"""
+        with self._build_lock:
+            if agents is self.source:
+                return
+            start = time.perf_counter()
+            documents = [agent_document(agent) for agent in agents]
+            hashes = [hashlib.sha256(document.encode()).hexdigest() for document in documents]
+            missing = [i for i, digest in enumerate(hashes) if digest not in self._vectors]
+            if missing:
+                vectors = embed_texts([documents[i] for i in missing])
+                for i, vector in zip(missing, vectors):
+                    self._vectors[hashes[i]] = vector
+                self.embedded += len(missing)
+            # Forget embeddings of agents that left the directory
+            self._vectors = {digest: self._vectors[digest] for digest in hashes}
+            matrix = np.stack([self._vectors[digest] for digest in hashes]) if hashes else np.zeros((0, 0), dtype=np.float32)
+            self.load(list(agents), matrix, source=agents)
+            self.builds += 1
+            self.last_build_seconds = time.perf_counter() - start
+
+    def building(self) -> bool:
+        return self._build_lock.locked() or (self.pending is not None and not self.pending.done())
+
+    def ready_for(self, agents: list[Dict[str, Any]]) -> bool:
+        return VECTOR_ROUTER_ENABLED and self.source is agents and len(self.agents) > 0
+
+    def route(self, vector: np.ndarray) -> tuple[Optional[Dict[str, Any]], list[tuple[Dict[str, Any], float]]]:
+        """
+        Score every agent against a unit query vector
+
+        Returns:
+            (agent, candidates) - agent is the confident match or None, and
+            candidates are the top fallback_k (agent, score) pairs, best first
+        """
+        start = time.perf_counter()
+        agents, matrix = self.agents, self.matrix
+        scores = matrix @ vector
+        k = min(self.fallback_k, len(agents))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        candidates = [(agents[i], float(scores[i])) for i in top]
+        best = candidates[0][1]
+        runner_up = candidates[1][1] if len(candidates) > 1 else -1.0
+        confident = best >= self.min_score and best - runner_up >= self.min_margin
+        self.routed += 1
+        self.route_seconds += time.perf_counter() - start
+        if not confident:
+            self.fallbacks += 1
+        return (candidates[0][0] if confident else None), candidates
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": VECTOR_ROUTER_ENABLED,
+            "agents": len(self.agents),
+            "dim": int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0,
+            "matrix_bytes": int(self.matrix.nbytes),
+            "builds": self.builds,
+            "embedded": self.embedded,
+            "last_build_seconds": round(self.last_build_seconds, 2),
+            "routed": self.routed,
+            "llm_fallbacks": self.fallbacks,
+            "fallback_rate": round(self.fallbacks / self.routed, 3) if self.routed else 0.0,
+            "avg_route_ms": round(self.route_seconds / self.routed * 1000, 3) if self.routed else 0.0,
+            "min_score": self.min_score,
+            "min_margin": self.min_margin,
+        }
+
+vector_router = VectorRouter(ROUTER_MIN_SCORE, ROUTER_MIN_MARGIN, ROUTER_FALLBACK_K)
+
+async def rebuild_vector_router(agents: list[Dict[str, Any]]):
+    """Re-embed the directory in the background; the old matrix serves until the swap"""
+    if not VECTOR_ROUTER_ENABLED:
+        return
+    try:
+        await asyncio.to_thread(vector_router.build, agents)
+    except Exception as e:
+        print(f"⚠️ Vector router build failed (LLM routing only): {str(e)}")
+
+async def index_agentfacts(agents: list[Dict[str, Any]]):
+    """Directory update hook - rebuild the BM25 index now and the vector router in the background"""
+    await asyncio.to_thread(bm25_index.build, agents)
+    # Embedding the directory can take a while (or fail); until the new matrix
+    # is in, route_query keeps using the LLM over the BM25 top-k
+    if VECTOR_ROUTER_ENABLED and not vector_router.building():
+        vector_router.pending = asyncio.create_task(rebuild_vector_router(agents))
+
+async def route_query(query: str, agentfacts: list[Dict[str, Any]]) -> tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Pick the agent for a query: vector match when confident, LLM otherwise
+
+    Returns:
+        (selected agent or None, routing info for the response)
+    """
+    if vector_router.ready_for(agentfacts):
+        try:
+            vector = await asyncio.to_thread(embed_text, query)
+            agent, candidates = vector_router.route(vector)
+            info = {"method": "vector", "score": round(candidates[0][1], 4)}
+            if agent:
+                return agent, info
+            # Low confidence - let the LLM choose among the nearest candidates
+            selected = await select_best_agent(query, [candidate for candidate, _ in candidates])
+            return selected, {**info, "method": "llm_rerank", "candidates": len(candidates)}
+        except Exception as e:
+            embedding_stats["failures"] += 1
+            print(f"⚠️ Vector routing failed, using LLM: {str(e)}")
+    elif VECTOR_ROUTER_ENABLED and agentfacts is not vector_router.source and not vector_router.building():
+        # Directory changed since the last build (or the build failed) - catch up in the background
+        vector_router.pending = asyncio.create_task(rebuild_vector_router(agentfacts))
+    return await select_best_agent(query, agentfacts), {"method": "llm"}
+
+async def send_a2a_to_url(agent_url: str, message: str, conversation_id: str, alternates: Optional[list[str]] = None) -> str:
     """
     Send an A2A message directly to an agent URL
     
@@ -573,26 +2811,16 @@ async def send_a2a_to_url(agent_url: str, message: str, conversation_id: str) ->
         agent_url: Full URL to the agent's A2A endpoint
         message: Message to send
         conversation_id: Conversation tracking ID
+        alternates: The agent's other endpoints, used for hedged requests
     
     Returns:
         Response from the agent
     """
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                agent_url,
-                json={
-                    "content": {
-                        "text": message,
-                        "type": "text"
-                    },
-                    "role": "user",
-                    "conversation_id": conversation_id
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data.get("content", {}).get("text", str(data))
+        return await hedging.run(
+            [agent_url, *(alternates or [])],
+            lambda url: post_a2a(url, message, conversation_id)
+        )
     
     except httpx.TimeoutException:
         return f"Timeout connecting to agent at {agent_url}"
@@ -673,10 +2901,10 @@ def generate_agent_facts() -> Dict[str, Any]:
             "modalities": [
                 "text"
             ],
-            # 🔵 Real-time streaming support
-            "streaming": False,
-            # 🔵 Batch processing support
-            "batch": False,
+            # 🔵 Real-time streaming support (POST /query/stream)
+            "streaming": STREAMING_ENABLED,
+            # 🔵 Batch processing support (POST /query/batch)
+            "batch": True,
             # 🟢 Authentication methods (maps to AgentCard.securitySchemes & security)
             "authentication": {
                 "methods": [
@@ -784,7 +3012,12 @@ async def root():
         "known_agents": list(KNOWN_AGENTS.keys()),
         "endpoints": {
             "health": "GET /health",
+            "metrics": "GET /metrics",
+            "load": "GET /load",
             "query": "POST /query",
+            "query_stream": "POST /query/stream (Server-Sent Events)",
+            "query_batch": "POST /query/batch (Many queries, answered concurrently)",
+            "jobs": "POST /jobs, GET /jobs/{job_id} (Async long-running queries)",
             "a2a": "POST /a2a",
             "search": "POST /search (Auto-find and route to suitable agent)",
             "agentfacts": "GET /agentfacts",
@@ -803,6 +3036,36 @@ async def health_check():
         a2a_enabled=True
     )
 
+@app.get("/metrics")
+async def get_metrics():
+    """Runtime metrics - crew executor queue depth and crew pool usage"""
+    return {
+        "executor": crew_executor.stats(),
+        "crew_pool": crew_pool.stats(),
+        "admission": admission.stats(),
+        "coalescing": single_flight.stats(),
+        "http_client": http_clients.stats(),
+        "circuit_breakers": agent_health.stats(),
+        "registry": registry_sync.stats(),
+        "fanout": fanout_metrics(),
+        "endpoints": endpoint_resolver.stats(),
+        "hedging": hedging.stats(),
+        "response_cache": response_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "llm_cache": get_completion_cache().stats(),
+        "tool_cache": get_tool_cache().stats(),
+        "agentfacts_directory": agentfacts_directory.stats(),
+        "vector_router": vector_router.stats(),
+        "bm25_prefilter": bm25_index.stats(),
+        "jobs": job_runner.stats(),
+        "streaming": stream_metrics.stats(),
+    }
+
+@app.get("/load")
+async def get_load():
+    """Load hint for the AgentFacts "load" policy - lets callers pick the least busy replica"""
+    return admission.load_hint()
+
 @app.get("/agents")
 async def list_agents():
     """List known agents for A2A communication"""
@@ -811,6 +3074,7 @@ async def list_agents():
         "my_agent_name": MY_AGENT_NAME,
         "my_agent_username": MY_AGENT_USERNAME,
         "known_agents": KNOWN_AGENTS,
+        "health": agent_health.health(),
         "usage": "Send messages using @agent-id syntax in the /a2a endpoint"
     }
 
@@ -837,59 +3101,203 @@ async def get_agent_facts():
     """
     return generate_agent_facts()
 
+async def run_query(request: QueryRequest) -> QueryResponse:
+    """Wait for an admission slot, then answer the question with a pooled crew"""
+    async with admission.admit() as queue_wait:
+        start_time = datetime.now()
+        
+        try:
+            # Execute a pooled crew (memory already attached) on the executor
+            result = await crew_executor.run(crew_pool.kickoff, {"question": request.question})
+            
+            # Calculate processing time
+            end_time = datetime.now()
+            processing_time = (end_time - start_time).total_seconds()
+            
+            return QueryResponse(
+                answer=str(result.raw),
+                timestamp=end_time.isoformat(),
+                processing_time=processing_time,
+                queue_wait_time=queue_wait
+            )
+            
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error processing query: {str(e)}"
+            )
+
 @app.post("/query", response_model=QueryResponse)
-async def query_agent(request: QueryRequest):
+async def query_agent(request: QueryRequest, response: Response, cache_control: Optional[str] = Header(None)):
     """
     Query the agent (original endpoint from Day 3)
     
     This is the standard query endpoint - no A2A routing.
     For A2A communication, use the /a2a endpoint instead.
     """
-    start_time = datetime.now()
+    # Cached answers return in milliseconds; misses go through coalescing + the crew
+    result, cache_status = await cached_query(request, cache_control)
+    response.headers["X-Cache"] = cache_status
+    return result
+
+@app.post("/query/stream")
+async def query_agent_stream(request: QueryRequest):
+    """
+    Query the agent and stream the answer as Server-Sent Events
     
-    try:
-        # Create task for this query
-        task = Task(
-            description=f"""
-            Answer the following question: {request.question}
-            
-            Use your memory to recall relevant context.
-            Use your tools when you need external information or calculations.
-            Provide accurate, helpful responses.
-            """,
-            expected_output="A clear, context-aware answer using memory and tools as needed",
-            agent=my_agent_twin,
-        )
-        
-        # Create crew with memory enabled
-        crew = Crew(
-            agents=[my_agent_twin],
-            tasks=[task],
-            memory=True,
-            verbose=False,
+    Events:
+        start         - {"queue_wait_time": ...}
+        token         - {"text": "..."} LLM output as it is generated
+        tool_started  - {"tool": "..."}
+        tool_finished - {"tool": "..."}
+        final_answer  - {"answer": "...", "processing_time": ..., "time_to_first_token": ...}
+        error         - {"detail": "..."}
+    
+    Example:
+        curl -N -X POST http://localhost:8000/query/stream \\
+          -H "Content-Type: application/json" \\
+          -d '{"question": "What is 50 * 50?"}'
+    """
+    # Take the admission slot before the response starts so overload is still a 429
+    admit = admission.admit()
+    queue_wait = await admit.__aenter__()
+    
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    start = time.perf_counter()
+    
+    def sink(kind: str, data: Dict[str, Any]):
+        loop.call_soon_threadsafe(events.put_nowait, (kind, data))
+    
+    async def run_crew():
+        # Runs to completion even if the client disconnects - the worker is busy anyway
+        try:
+            result = await crew_executor.run(kickoff_with_sink, request.question, sink)
+            events.put_nowait(("final_answer", {"answer": str(result.raw)}))
+        except Exception as e:
+            events.put_nowait(("error", {"detail": f"Error processing query: {str(e)}"}))
+        finally:
+            await admit.__aexit__(None, None, None)
+    
+    # Keep a reference so the running task isn't garbage collected
+    crew_task = asyncio.create_task(run_crew())
+    _stream_tasks.add(crew_task)
+    crew_task.add_done_callback(_stream_tasks.discard)
+    
+    async def event_stream():
+        first_token_at = None
+        yield sse_event("start", {"queue_wait_time": queue_wait})
+        while True:
+            kind, data = await events.get()
+            if kind == "token" and first_token_at is None:
+                first_token_at = time.perf_counter() - start
+            if kind in ("final_answer", "error"):
+                total = time.perf_counter() - start
+                stream_metrics.record(first_token_at, total)
+                if kind == "final_answer":
+                    data = {**data, "processing_time": total, "time_to_first_token": first_token_at}
+                yield sse_event(kind, data)
+                break
+            yield sse_event(kind, data)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_agent_batch(request: BatchQueryRequest):
+    """
+    Answer a list of queries concurrently
+    
+    Results come back in request order, each with its own timing. A failing
+    query doesn't fail the batch - it is reported with ok=false and an error.
+    
+    With "stream": true the response is Server-Sent Events instead: one
+    "result" event per query as soon as it completes (use "index" to order
+    them), then a "done" event with the summary.
+    
+    Example:
+        {"queries": [{"question": "What is 2+2?"}, {"question": "What is my hometown?"}], "parallelism": 4}
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one query")
+    if len(request.queries) > BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.queries)} queries (max {BATCH_MAX_SIZE})"
         )
-        
-        # Execute the crew
-        result = crew.kickoff()
-        
-        # Calculate processing time
-        end_time = datetime.now()
-        processing_time = (end_time - start_time).total_seconds()
-        
-        return QueryResponse(
-            answer=str(result.raw),
-            timestamp=end_time.isoformat(),
-            processing_time=processing_time
+    
+    parallelism = min(request.parallelism or BATCH_MAX_PARALLELISM, BATCH_MAX_PARALLELISM)
+    slots = asyncio.Semaphore(max(1, parallelism))
+    start = time.perf_counter()
+    tasks = [
+        asyncio.create_task(run_batch_item(index, item, slots))
+        for index, item in enumerate(request.queries)
+    ]
+    
+    def summary(results: list[BatchItemResult]) -> BatchQueryResponse:
+        succeeded = sum(1 for result in results if result.ok)
+        return BatchQueryResponse(
+            results=sorted(results, key=lambda result: result.index),
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+            timestamp=datetime.now().isoformat(),
+            processing_time=time.perf_counter() - start
         )
-        
-    except Exception as e:
+    
+    if not request.stream:
+        return summary(await asyncio.gather(*tasks))
+    
+    async def event_stream():
+        results = []
+        for finished in asyncio.as_completed(tasks):
+            result = await finished
+            results.append(result)
+            yield sse_event("result", result.model_dump())
+        done = summary(results).model_dump()
+        del done["results"]
+        yield sse_event("done", done)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(request: JobRequest):
+    """
+    Submit a long-running question as an async job
+    
+    Returns immediately with a job id. Poll GET /jobs/{job_id} for the answer,
+    or pass callback_url to have the finished job POSTed to you.
+    
+    Example:
+        {"question": "Research the latest CrewAI release", "idempotency_key": "abc-123"}
+    """
+    job, created = job_store.create(request)
+    if created and not job_runner.submit(job["job_id"]):
+        # Not accepted - drop the row so a retry with the same key can succeed
+        job_store.delete(job["job_id"])
         raise HTTPException(
-            status_code=500,
-            detail=f"Error processing query: {str(e)}"
+            status_code=429,
+            detail="Job queue is full, please retry later",
+            headers={"Retry-After": "30"}
         )
+    return job_to_response(job)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Get the status (and answer, once finished) of an async job"""
+    job = job_store.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job_to_response(job)
 
 @app.post("/a2a", response_model=A2AResponse)
-async def a2a_endpoint(message: A2AMessage):
+async def a2a_endpoint(message: A2AMessage, queue_wait: float = Depends(admit_request)):
     """
     A2A (Agent-to-Agent) Communication Endpoint
     
@@ -910,6 +3318,10 @@ async def a2a_endpoint(message: A2AMessage):
         2. Look up agent URL from registry
         3. Forward message to that agent
         4. Return their response
+    
+    Mentioning several agents ("@weather-bot @travel-bot Plan my weekend")
+    sends the message to all of them concurrently; "fanout_strategy" picks how
+    the replies are combined (concatenate, first_success or llm_merge).
     """
     
     try:
@@ -919,8 +3331,9 @@ async def a2a_endpoint(message: A2AMessage):
         # Log incoming A2A message
         a2a_logger.info(f"INCOMING | conversation_id={conversation_id} | message={text_content}")
         
-        # Check if this message is routing to another agent
-        target_agent, clean_message = parse_a2a_request(text_content)
+        # Check if this message is routing to other agents (parsed once, used by both paths)
+        targets, clean_message = parse_a2a_targets(text_content)
+        target_agent = targets[0] if targets else None
         
         if not target_agent:
             # NO @agent-id found - this is an ERROR!
@@ -942,6 +3355,39 @@ async def a2a_endpoint(message: A2AMessage):
                 detail=error_msg
             )
         
+        # Several @mentions - send to all of them concurrently
+        if len(targets) > 1:
+            strategy = message.fanout_strategy or FANOUT_STRATEGY
+            if strategy not in FANOUT_STRATEGIES:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unknown fanout_strategy '{strategy}'. Use one of: {', '.join(FANOUT_STRATEGIES)}"
+                )
+            if len(targets) > FANOUT_MAX_TARGETS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Too many @mentions ({len(targets)}); the limit is {FANOUT_MAX_TARGETS}"
+                )
+            
+            print(f"🔀 Fanning out to {len(targets)} agents: {', '.join(targets)} ({strategy})")
+            a2a_logger.info(f"FANOUT | conversation_id={conversation_id} | targets={','.join(targets)} | strategy={strategy} | message={clean_message}")
+            
+            response_text, results = await fan_out(targets, clean_message, conversation_id, strategy)
+            
+            a2a_logger.info(f"FANOUT_DONE | conversation_id={conversation_id} | ok={sum(r['ok'] for r in results)}/{len(targets)}")
+            
+            return A2AResponse(
+                content={
+                    "text": response_text,
+                    "type": "text"
+                },
+                role="assistant",
+                conversation_id=conversation_id,
+                timestamp=datetime.now().isoformat(),
+                agent_id=MY_AGENT_ID,
+                fanout=[{key: value for key, value in result.items() if key != "text"} for result in results]
+            )
+        
         # Route to target agent
         print(f"🔀 Routing message to agent: {target_agent}")
         a2a_logger.info(f"ROUTING | conversation_id={conversation_id} | target={target_agent} | message={clean_message}")
@@ -987,6 +3433,7 @@ async def register_agent(agent_id: str, agent_url: str):
         agent_id: The agent's unique ID
         agent_url: The agent's A2A endpoint URL (e.g., http://agent.com/a2a)
     """
+    REGISTERED_AGENTS[agent_id] = agent_url
     KNOWN_AGENTS[agent_id] = agent_url
     return {
         "message": f"✅ Agent '{agent_id}' registered successfully",
@@ -1001,35 +3448,36 @@ async def search_and_route(request: SearchRequest):
     Search endpoint - automatically finds and routes to suitable agent
     
     This endpoint:
-    1. Fetches all available agents from the agentfacts database
-    2. Uses an LLM to select the best agent for the query
+    1. Reads available agents from the local agentfacts directory
+    2. Selects the best agent (vector router, LLM when not confident)
     3. Sends an A2A message to the selected agent
     4. Returns the agent's response
     
     Example:
         {"query": "send an email", "conversation_id": "conv-123"}
     
-    The LLM will analyze the query and select the most suitable agent
-    from the database, then route the message to that agent.
+    Confident embedding matches are routed directly; otherwise the LLM picks
+    among the closest candidates. The response's "routing" field says which.
     """
     start_time = datetime.now()
     
     try:
-        # Step 1: Fetch all agentfacts from database
-        print(f"🔍 Fetching agentfacts from database...")
-        agentfacts = await fetch_agentfacts_from_db()
+        # Step 1: Read agentfacts from the local directory (refreshed in the background)
+        agentfacts = agentfacts_directory.agents
         
         if not agentfacts:
+            agentfacts_directory.request_refresh()
             raise HTTPException(
                 status_code=503,
-                detail="No agents available in the database"
+                detail="No agents available in the database",
+                headers={"Retry-After": "10"}
             )
         
-        print(f"📥 Found {len(agentfacts)} agents in database")
+        print(f"📥 Found {len(agentfacts)} agents in directory (age: {agentfacts_directory.age():.0f}s)")
         
         # Step 2: Use LLM to select the best agent
         print(f"🤖 Selecting best agent for query: '{request.query}'")
-        selected_agent = await select_best_agent(request.query, agentfacts)
+        selected_agent, routing = await route_query(request.query, agentfacts)
         
         if not selected_agent:
             raise HTTPException(
@@ -1039,17 +3487,10 @@ async def search_and_route(request: SearchRequest):
         
         print(f"✅ Selected agent: {selected_agent.get('label', 'Unknown')}")
         
-        # Step 3: Extract the agent's endpoint URL
+        # Step 3: Pick the agent's endpoint (least expected completion time
+        # across its static and adaptive endpoints)
         endpoints = selected_agent.get("endpoints", {})
-        agent_url = None
-        
-        # Try static endpoints first
-        static_endpoints = endpoints.get("static", [])
-        if static_endpoints:
-            agent_url = static_endpoints[0]
-        # Try adaptive resolver
-        elif "adaptive_resolver" in endpoints:
-            agent_url = endpoints["adaptive_resolver"].get("url")
+        agent_url = endpoint_resolver.choose(endpoints)
         
         if not agent_url:
             raise HTTPException(
@@ -1057,14 +3498,13 @@ async def search_and_route(request: SearchRequest):
                 detail=f"Selected agent '{selected_agent.get('label')}' has no valid endpoint"
             )
         
-        # Ensure URL ends with /a2a
-        if not agent_url.endswith("/a2a"):
-            agent_url = agent_url.rstrip("/") + "/a2a"
-        
         print(f"🔀 Routing to: {agent_url}")
         
         # Step 4: Send A2A message to the selected agent
-        agent_response = await send_a2a_to_url(agent_url, request.query, request.conversation_id)
+        agent_response = await send_a2a_to_url(
+            agent_url, request.query, request.conversation_id,
+            alternates=endpoint_resolver.alternates(endpoints, agent_url)
+        )
         
         # Calculate processing time
         end_time = datetime.now()
@@ -1079,7 +3519,8 @@ async def search_and_route(request: SearchRequest):
             },
             agent_response=agent_response,
             timestamp=end_time.isoformat(),
-            processing_time=processing_time
+            processing_time=processing_time,
+            routing=routing
         )
         
     except HTTPException:
@@ -1106,12 +3547,44 @@ async def startup_event():
     print(f"✅ Model: {llm.model}")
     print("✅ Memory: Enabled (4 types)")
     print(f"✅ Tools: {len(available_tools)} tools loaded")
+    print(f"✅ Crew Workers: {CREW_WORKERS}")
     print("✅ A2A: Enabled (NANDA-style)")
     
-    # Fetch agents from central registry
-    print(f"\n🔍 Fetching agents from registry: {REGISTRY_URL}")
-    await fetch_agents_from_registry()
-    print(f"✅ Known Agents: {len(KNOWN_AGENTS)}")
+    # Pre-build pooled crews so the first requests skip memory setup
+    await asyncio.to_thread(crew_pool.warm_up, CREW_POOL_WARM)
+    print(f"✅ Crew Pool: {crew_pool.created}/{CREW_POOL_SIZE} crews warm")
+    
+    # Resume unfinished jobs and start the job workers
+    job_runner.start()
+    print(f"✅ Job Workers: {JOB_WORKERS} (db: {JOBS_DB_PATH})")
+    
+    # Known agents: last snapshot now, registry refreshes in the background
+    if registry_sync.load_snapshot():
+        print(f"✅ Known Agents: {len(KNOWN_AGENTS)} (snapshot)")
+    registry_sync.start()
+    print(f"🔍 Syncing agents from registry every {REGISTRY_SYNC_INTERVAL}s: {REGISTRY_URL}")
+    
+    # Warm pooled connections to the agents we message most (in the background)
+    targets = preconnect_targets()
+    if targets:
+        asyncio.create_task(http_clients.preconnect(targets))
+        print(f"✅ Pre-connecting: {len(targets)} agents (HTTP/2: {HTTP2_ENABLED})")
+    
+    # Probe known agents' /health in the background (feeds the circuit breakers)
+    agent_health.start()
+    print(f"✅ Health Probing: every {HEALTH_PROBE_INTERVAL:.0f}s")
+    
+    # AgentFacts directory for /search: last snapshot now, the DB is revalidated
+    # in the background (the BM25 index and vector router are rebuilt whenever it changes)
+    agentfacts_directory.on_update = index_agentfacts
+    if agentfacts_directory.agents:
+        await index_agentfacts(agentfacts_directory.agents)
+    agentfacts_directory.request_refresh()
+    agentfacts_directory.start()
+    print(f"✅ AgentFacts Directory: {len(agentfacts_directory.agents)} agents (snapshot), "
+          f"refreshing every {AGENTFACTS_REFRESH_INTERVAL}s")
+    if VECTOR_ROUTER_ENABLED:
+        print("✅ Vector Router: embedding the directory in the background (BM25 + LLM routing until ready)")
     
     print("\n📚 Documentation: http://localhost:8000/docs")
     print("🤖 A2A Endpoint: http://localhost:8000/a2a")
@@ -1120,6 +3593,16 @@ async def startup_event():
         print(f"🌐 Public URL: {PUBLIC_URL}")
     print("="*70 + "\n")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Run when the API stops"""
+    job_runner.stop()
+    agentfacts_directory.stop()
+    registry_sync.stop()
+    agent_health.stop()
+    crew_executor.shutdown()
+    await http_clients.close()
+
 # ==============================================================================
 # Run Instructions
 # ==============================================================================
@@ -1155,6 +3638,26 @@ RAILWAY DEPLOYMENT:
     - AGENT_ID (optional, default: "personal-agent-twin")
     - AGENT_NAME (optional, default: "Personal Agent Twin")
     - SERPER_API_KEY (optional, for web search)
+    - CREW_WORKERS (optional, default: 4 - concurrent crew runs)
+    - CREW_POOL_SIZE / CREW_POOL_WARM (optional - pre-built crews)
+    - MAX_IN_FLIGHT / MAX_QUEUE (optional - admission control, 429 when full)
+    - JOB_WORKERS / JOB_QUEUE_SIZE / JOBS_DB_PATH (optional - async job API)
+    - QUERY_STREAMING (optional, default: true - enables POST /query/stream)
+    - BATCH_MAX_SIZE / BATCH_MAX_PARALLELISM (optional - POST /query/batch limits)
+    - RESPONSE_CACHE_TTL / RESPONSE_CACHE_SIZE (optional - /query response cache)
+    - RESPONSE_CACHE_DB (optional - SQLite file so cached answers survive restarts)
+    - SEMANTIC_CACHE / SEMANTIC_CACHE_THRESHOLD / SEMANTIC_CACHE_SIZE (optional - paraphrase cache)
+    - LLM_CACHE / LLM_CACHE_DB / LLM_CACHE_MAX_BYTES (optional - LLM completion cache)
+    - TOOL_CACHE / TOOL_CACHE_SIZE / TOOL_CACHE_DB / TOOL_CACHE_TTLS (optional - tool result cache)
+    - AGENTFACTS_REFRESH_INTERVAL (optional, default: 300 - /search directory refresh)
+    - VECTOR_ROUTER / ROUTER_MIN_SCORE / ROUTER_MIN_MARGIN (optional - /search embedding router)
+    - BM25_TOP_K / BM25_RECALL_SAMPLE (optional - LLM agent selection prefilter)
+    - HTTP2 / HTTP_MAX_CONNECTIONS / HTTP_PRECONNECT (optional - shared outbound HTTP client)
+    - FANOUT_STRATEGY / FANOUT_CONCURRENCY / FANOUT_TIMEOUT (optional - multi-@mention /a2a)
+    - LOAD_EWMA_ALPHA / LOAD_PRIOR_LATENCY / LOAD_HINT_TTL (optional - load-aware endpoint choice)
+    - HEDGE_A2A / HEDGE_BUDGET / HEDGE_PERCENTILE (optional - hedged A2A requests)
+    - BREAKER_ERROR_RATE / BREAKER_OPEN_SECONDS / HEALTH_PROBE_INTERVAL (optional - per-agent circuit breakers)
+    - REGISTRY_SYNC_INTERVAL / REGISTRY_DELTA_PARAM (optional - background registry sync)
 """
 
 if __name__ == "__main__":